@@ -0,0 +1,92 @@
+"""Compare batched APA label generation with the previous per-label version.
+
+Formats the labels of a synthetic bibliography (see ``bench_apa_names.py``)
+with ``APALabelStyle.format_labels`` and with the implementation it replaced,
+which normalized every surname again and counted the labels afterwards.
+Apart from the disambiguation suffixes the new version adds, the labels are
+checked to be identical.
+
+Usage::
+
+    python benchmarks/bench_apa_labels.py [--entries 10000 50000] [--repeat 3]
+"""
+import argparse
+import re
+import time
+import unicodedata
+from collections import Counter
+
+from pybtex.database import parse_string
+
+from bench_apa_names import make_bib
+from teachbooks.plugins.pybtex.labels import apa
+
+NONALNUM = re.compile(r'[^A-Za-z0-9 \-]+', re.UNICODE)
+
+
+def strip_nonalnum_previous(parts):
+    s = "".join(parts)
+    s = "".join(c for c in unicodedata.normalize('NFD', s) if not unicodedata.combining(c))
+    return NONALNUM.sub("", s)
+
+
+class PreviousLabelStyle(apa.APALabelStyle):
+    """Implementation of format_labels before batching"""
+
+    def format_labels(self, sorted_entries):
+        labels = [self.format_label(entry) for entry in sorted_entries]
+        count = Counter(labels)
+        counted = Counter()
+        for label in labels:
+            if count[label] == 1:
+                yield label
+            else:
+                yield label
+
+    def format_author_or_editor_names(self, persons):
+        if len(persons) == 1:
+            return strip_nonalnum_previous(persons[0].last_names)
+        elif len(persons) == 2:
+            return "{} & {}".format(strip_nonalnum_previous(persons[0].last_names),
+                                    strip_nonalnum_previous(persons[1].last_names))
+        else:
+            return "{} et al.".format(strip_nonalnum_previous(persons[0].last_names))
+
+
+def best_of(style, repeat: int, entries) -> tuple[float, list[str]]:
+    times = []
+    for _ in range(repeat):
+        # Start every repetition with an empty surname cache
+        apa._surname.cache_clear()
+        start = time.perf_counter()
+        labels = list(style.format_labels(entries))
+        times.append(time.perf_counter() - start)
+    return min(times), labels
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--authors", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} {'previous':>14} {'batched':>14} {'speedup':>8} {'suffixed':>9}")
+    for n in args.entries:
+        source = make_bib(n, args.authors)
+        # Accented surnames exercise the Unicode normalization
+        source = source.replace("Bakker", "Bäcker").replace("Visser", "Vißer")
+        entries = list(parse_string(source, "bibtex").entries.values())
+        entries.sort(key=lambda entry: apa.APALabelStyle().format_label(entry))
+
+        t_previous, previous = best_of(PreviousLabelStyle(), args.repeat, entries)
+        t_batched, batched = best_of(apa.APALabelStyle(), args.repeat, entries)
+        assert all(new == old or re.fullmatch(re.escape(old) + r"-?[a-z]+", new)
+                   for old, new in zip(previous, batched))
+        suffixed = sum(new != old for old, new in zip(previous, batched))
+        print(f"{n:>8} {n / t_previous:>8.0f} lbl/s {n / t_batched:>8.0f} lbl/s "
+              f"{t_previous / t_batched:>7.2f}x {suffixed:>9}")
+
+
+if __name__ == "__main__":
+    main()
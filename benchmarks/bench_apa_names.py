@@ -0,0 +1,97 @@
+"""Time APA reference formatting with and without the formatted-name cache.
+
+Generates a synthetic ``.bib`` file in which a pool of authors and editors
+appear in many entries, formats it with the ``apa`` pybtex style, and compares
+``teachbooks.plugins.pybtex.formatting.apa.name_cache`` against a disabled
+cache. Both renderings are checked to be identical.
+
+Usage::
+
+    python benchmarks/bench_apa_names.py [--entries 10000] [--authors 500] [--repeat 3]
+"""
+import argparse
+import random
+import time
+
+from pybtex.database import parse_string
+from pybtex.plugin import find_plugin
+
+from teachbooks.plugins.pybtex.formatting import apa
+
+FIRST = ["Anna", "Bram", "Chen", "Daan", "Eva", "Femke", "Gert", "Hanna", "Ines", "Joost"]
+LAST = ["de Vries", "Jansen", "van den Berg", "Bakker", "Visser", "Smit", "Meijer",
+        "de Boer", "Mulder", "de Groot", "Bos", "Vos", "Peters", "Hendriks"]
+TYPES = ["article", "book", "inbook", "inproceedings", "techreport", "misc"]
+
+
+def make_bib(entries: int, authors: int, seed: int = 0) -> str:
+    """Synthetic BibTeX source with ``entries`` entries drawn from ``authors`` people"""
+    rng = random.Random(seed)
+    people = [f"{LAST[i % len(LAST)]}{i // len(LAST) or ''}, "
+              f"{rng.choice(FIRST)} {rng.choice(FIRST)[0]}." for i in range(authors)]
+    lines = []
+    for n in range(entries):
+        kind = TYPES[n % len(TYPES)]
+        names = " and ".join(rng.sample(people, rng.choice([1, 1, 2, 3, 5, 9])))
+        editors = " and ".join(rng.sample(people, 2))
+        lines.append(
+            f"@{kind}{{key{n},\n"
+            f"  author = {{{names}}},\n"
+            f"  editor = {{{editors}}},\n"
+            f"  title = {{Synthetic study number {n}}},\n"
+            f"  booktitle = {{Proceedings {n % 50}}},\n"
+            f"  journal = {{Journal of Benchmarks}},\n"
+            f"  institution = {{TU Delft}},\n"
+            f"  publisher = {{TeachBooks Press}},\n"
+            f"  volume = {{{n % 40 + 1}}},\n"
+            f"  pages = {{{n % 300 + 1}--{n % 300 + 12}}},\n"
+            f"  year = {{{1990 + n % 35}}},\n"
+            f"}}\n")
+    return "".join(lines)
+
+
+def render(bib_data) -> list[str]:
+    # render_as() looks the backend up for every entry, which dominates the time
+    backend = find_plugin("pybtex.backends", "html")()
+    style = apa.APAStyle()
+    return [entry.text.render(backend) for entry in style.format_bibliography(bib_data)]
+
+
+def best_of(cache: "apa.NameCache", repeat: int, bib_data) -> tuple[float, list[str]]:
+    times = []
+    for _ in range(repeat):
+        cache.clear()
+        apa.name_cache = cache
+        start = time.perf_counter()
+        output = render(bib_data)
+        times.append(time.perf_counter() - start)
+    return min(times), output
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--authors", type=int, default=500,
+                        help="Number of distinct people in the bibliography")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bib_data = parse_string(make_bib(args.entries, args.authors), "bibtex")
+    original = apa.name_cache
+    # Format every entry on every repetition
+    apa.reference_cache = apa.ReferenceCache(maxsize=0)
+    try:
+        t_plain, plain = best_of(apa.NameCache(maxsize=0), args.repeat, bib_data)
+        cache = apa.NameCache()
+        t_cached, cached = best_of(cache, args.repeat, bib_data)
+    finally:
+        apa.name_cache = original
+    assert plain == cached
+
+    print(f"{'entries':>8} {'uncached':>10} {'cached':>10} {'speedup':>8} {'hit rate':>9}")
+    print(f"{args.entries:>8} {t_plain:>9.3f}s {t_cached:>9.3f}s {t_plain / t_cached:>7.2f}x "
+          f"{cache.hits / (cache.hits + cache.misses):>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Count per-entry template allocations of the APA style with and without reuse.
+
+Formats every entry of a synthetic bibliography (see ``bench_apa_names.py``)
+once with templates built per entry, as ``pybtex.style.formatting.BaseStyle``
+does, and once with the templates ``APAStyle`` reuses per entry type and
+variant. For each entry type it reports the template nodes created, the
+peak memory traced by ``tracemalloc`` and the time (measured without
+tracing) per entry. Both renderings are checked to be identical.
+
+Usage::
+
+    python benchmarks/bench_apa_templates.py [--entries 2000]
+"""
+import argparse
+import time
+import tracemalloc
+from collections import defaultdict
+
+import pybtex.style.template
+from pybtex.database import parse_string
+from pybtex.plugin import find_plugin
+from pybtex.style.formatting import BaseStyle
+
+from bench_apa_names import make_bib
+from teachbooks.plugins.pybtex.formatting import apa
+
+
+class NodeCounter:
+    """Count the template nodes created while active"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._init = pybtex.style.template.Node.__init__
+
+    def __enter__(self):
+        counter = self
+        original = self._init
+
+        def __init__(node, *args, **kwargs):
+            counter.count += 1
+            original(node, *args, **kwargs)
+
+        pybtex.style.template.Node.__init__ = __init__
+        return self
+
+    def __exit__(self, *exc):
+        pybtex.style.template.Node.__init__ = self._init
+
+
+def measure(format_entry, entries) -> tuple[dict, list[str]]:
+    """Per entry type: [entries, nodes, peak bytes, seconds]; and the rendered entries"""
+    backend = find_plugin("pybtex.backends", "html")()
+    stats = defaultdict(lambda: [0, 0, 0, 0.0])
+    output = []
+    for entry in entries:
+        start = time.perf_counter()
+        format_entry("label", entry)
+        seconds = time.perf_counter() - start
+
+        tracemalloc.start()
+        with NodeCounter() as nodes:
+            formatted = format_entry("label", entry)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        row = stats[entry.type]
+        row[0] += 1
+        row[1] += nodes.count
+        row[2] += peak
+        row[3] += seconds
+        output.append(formatted.text.render(backend))
+    return stats, output
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--authors", type=int, default=500)
+    args = parser.parse_args()
+
+    entries = list(parse_string(make_bib(args.entries, args.authors), "bibtex").entries.values())
+    # Format every entry on every call
+    apa.reference_cache = apa.ReferenceCache(maxsize=0)
+    style = apa.APAStyle()
+    # Warm the name cache and the reused templates, so only steady state is measured
+    for entry in entries:
+        style.format_entry("label", entry)
+
+    built, built_output = measure(lambda label, entry: BaseStyle.format_entry(style, label, entry),
+                                  entries)
+    reused, reused_output = measure(style.format_entry, entries)
+    assert built_output == reused_output
+
+    print(f"{'type':<14} {'nodes/entry':>18} {'peak KiB/entry':>18} {'µs/entry':>16}")
+    print(f"{'':<14} {'built':>8} {'reused':>9} {'built':>8} {'reused':>9} {'built':>7} {'reused':>8}")
+    for kind in sorted(built):
+        n, b_nodes, b_peak, b_time = built[kind]
+        _, r_nodes, r_peak, r_time = reused[kind]
+        print(f"{kind:<14} {b_nodes / n:>8.0f} {r_nodes / n:>9.0f} {b_peak / n / 1024:>8.1f} "
+              f"{r_peak / n / 1024:>9.1f} {b_time / n * 1e6:>7.0f} {r_time / n * 1e6:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compare the streaming REMOVE-FROM-RELEASE scanner with the previous regex.
+
+Generates synthetic ``_toc.yml`` files of increasing size and times
+``teachbooks.release.clean_yaml`` against the ``re.sub`` implementation it
+replaced. Both outputs are checked to be identical.
+
+Usage::
+
+    python benchmarks/bench_clean_yaml.py [--sizes 1 4 16] [--repeat 3]
+"""
+import argparse
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from teachbooks.release import clean_yaml
+
+REGEX = re.compile(
+    r"# START REMOVE-FROM-(PUBLISH|RELEASE)(.|\n)*?# END REMOVE-FROM-(PUBLISH|RELEASE)"
+)
+
+
+def clean_yaml_regex(path_source: Path, path_output: Path) -> None:
+    """Implementation of clean_yaml before the streaming scanner"""
+    with open(path_source, mode="r", encoding="utf8") as f:
+        yaml_source = f.read()
+    yaml_output = REGEX.sub("", yaml_source)
+    with open(path_output, mode="w", encoding="utf8") as f:
+        f.write(yaml_output)
+
+
+def make_toc(path: Path, size_mb: float, section_lines: int) -> None:
+    """Write a synthetic _toc.yml of roughly size_mb megabytes"""
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    chapter = 0
+    with open(path, mode="w", encoding="utf8") as f:
+        written += f.write("format: jb-book\nroot: index\nparts:\n  - caption: Generated\n    chapters:\n")
+        while written < target:
+            chapter += 1
+            written += f.write(f"    - file: chapter_{chapter}/intro\n      sections:\n")
+            for page in range(section_lines):
+                written += f.write(f"      - file: chapter_{chapter}/page_{page}\n")
+            if chapter % 3 == 0:
+                written += f.write("      # START REMOVE-FROM-RELEASE\n")
+                for page in range(section_lines):
+                    written += f.write(f"      - file: chapter_{chapter}/draft_{page}\n")
+                written += f.write("      # END REMOVE-FROM-RELEASE\n")
+
+
+def best_of(func, repeat: int, *args) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16],
+                        help="Sizes of the generated _toc.yml files in MB")
+    parser.add_argument("--section-lines", type=int, default=20,
+                        help="Number of pages per generated section")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'regex':>10} {'stream':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        source = tmp / "_toc.yml"
+        for size in args.sizes:
+            make_toc(source, size, args.section_lines)
+            t_regex = best_of(clean_yaml_regex, args.repeat, source, tmp / "regex.yml")
+            # Remove the output so every repetition writes the full file
+            t_stream = best_of(
+                lambda: (tmp.joinpath("stream.yml").unlink(missing_ok=True),
+                         clean_yaml(source, tmp / "stream.yml")),
+                args.repeat)
+            assert tmp.joinpath("regex.yml").read_text(encoding="utf8") \
+                == tmp.joinpath("stream.yml").read_text(encoding="utf8")
+            print(f"{size:>6.1f}MB {t_regex:>9.3f}s {t_stream:>9.3f}s {t_regex / t_stream:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
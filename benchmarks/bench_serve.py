@@ -0,0 +1,93 @@
+"""Load test the webserver backends of teachbooks serve.
+
+Creates a synthetic book page with many static assets, starts each backend
+through ``teachbooks.serve.Server`` and fetches the page plus all assets from
+a number of concurrent clients, like browsers loading the book. Each client
+reuses its connection when the server allows it.
+
+Usage::
+
+    python benchmarks/bench_serve.py [--clients 16] [--duration 5] [--assets 80]
+"""
+import argparse
+import http.client
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from teachbooks.serve import Server, BACKENDS
+
+
+def make_site(path: Path, assets: int) -> list[str]:
+    """Write an HTML page referencing ``assets`` files of mixed sizes"""
+    path.joinpath("_static").mkdir(parents=True)
+    urls = []
+    for i in range(assets):
+        name = f"_static/asset_{i}.js"
+        path.joinpath(name).write_bytes(b"/* asset */\n" * (100 * (i % 20 + 1)))
+        urls.append("/" + name)
+    scripts = "\n".join(f'<script src="{url}"></script>' for url in urls)
+    path.joinpath("index.html").write_text(
+        f"<html><head>{scripts}</head><body><p>Page</p></body></html>", encoding="utf8")
+    return ["/index.html"] + urls
+
+
+def run_client(port: int, urls: list[str], deadline: float, counts: list[int]) -> None:
+    conn = http.client.HTTPConnection("localhost", port, timeout=10)
+    done = 0
+    try:
+        while time.monotonic() < deadline:
+            for url in urls:
+                conn.request("GET", url)
+                response = conn.getresponse()
+                response.read()
+                if response.will_close:
+                    conn.close()
+                done += 1
+    finally:
+        conn.close()
+        counts.append(done)
+
+
+def load_test(port: int, urls: list[str], clients: int, duration: float) -> float:
+    counts = []
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=run_client, args=(port, urls, deadline, counts))
+               for _ in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.monotonic() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--assets", type=int, default=80)
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp())
+    try:
+        site = tmp / "html"
+        urls = make_site(site, args.assets)
+        print(f"{'backend':>12} {'requests/s':>12}")
+        for backend in BACKENDS:
+            server = Server(servedir=site, workdir=tmp / backend, backend=backend,
+                            stdout=0)
+            server.start()
+            try:
+                rps = load_test(server.port, urls, args.clients, args.duration)
+            finally:
+                server.stop()
+            print(f"{backend:>12} {rps:>12.0f}")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stderr, redirect_stdout
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Generator, Iterator
+
+from teachbooks import TEACHBOOKS_WORK_DIR
+from teachbooks.watch import IGNORE_DIRS, snapshot
+
+#: Per-book log of the last batch build, in the book's work directory
+LOGFILE = "build.log"
+#: Strategy and input digest of the last successful batch build
+STATEFILE = "batch.json"
+
+
+@dataclass
+class BookResult:
+    """Outcome of building one book with :func:`build_books`."""
+    path: Path
+    #: "built", "skipped" or "failed"
+    status: str
+    seconds: float = 0.0
+    #: Size of the ``_build`` directory in bytes, if built
+    size: int | None = None
+    error: str | None = None
+    log: Path | None = None
+
+
+def discover_books(root: Path | str) -> list[Path]:
+    """Find the books below a directory.
+
+    A book is a directory with a ``_config.yml`` and a ``_toc.yml``. Hidden
+    directories, build output and the inside of books are not searched.
+
+    Parameters
+    ----------
+    root : Path | str
+        Directory to search; may itself be a book.
+
+    Returns
+    -------
+    list[Path]
+        Book directories, sorted.
+    """
+    books = []
+    for directory, dirs, files in os.walk(root):
+        if "_config.yml" in files and "_toc.yml" in files:
+            books.append(Path(directory))
+            dirs.clear()
+        else:
+            dirs[:] = [name for name in dirs
+                       if not name.startswith(".") and name not in IGNORE_DIRS]
+    return sorted(books)
+
+
+def input_digest(path_source: Path | str) -> str:
+    """Digest of the names and contents of the source files of a book.
+
+    Covers the files seen by :func:`teachbooks.watch.snapshot`, so hidden
+    directories and build output do not count. Content rather than
+    modification times is hashed, so fresh checkouts of unchanged books match.
+    """
+    from teachbooks.release import _hash_file
+
+    path_source = Path(path_source)
+    digest = hashlib.sha256()
+    for path in sorted(snapshot(path_source)):
+        digest.update(path.encode("utf8") + b"\0")
+        digest.update((_hash_file(path_source / path) or "").encode("ascii") + b"\0")
+    return digest.hexdigest()
+
+
+def build_books(books: list[Path],
+                release: bool = False,
+                max_workers: int | None = None,
+                force: bool = False) -> Iterator[BookResult]:
+    """Build books in a pool of processes.
+
+    Each book is pre-processed and built as by ``teachbooks build``, with its
+    output written to ``.teachbooks/build.log`` in the book. A failing book
+    does not affect the others, not even if it kills its worker process: the
+    books that did not finish are built again in a new pool, and those that
+    were being built when the worker died are built one at a time to find the
+    culprit. Books whose sources did not change since
+    their last successful batch build, if that used the same strategy and
+    its output is still there, are skipped; :func:`teachbooks.build.build_book`
+    and ``teachbooks clean`` forget the last batch build of a book.
+
+    Parameters
+    ----------
+    books : list[Path]
+        Book directories, see :func:`discover_books`.
+    release : bool, optional
+        Pre-process with the release strategy, by default False.
+    max_workers : int | None, optional
+        Number of processes, by default one per available CPU.
+    force : bool, optional
+        Build books even if they did not change, by default False.
+
+    Yields
+    ------
+    BookResult
+        Outcome per book, in order of completion.
+    """
+    from teachbooks.build import _available_cpus
+
+    strategy = "release" if release else "draft"
+    todo = []
+    for book in books:
+        digest = input_digest(book)
+        if not force and _last_build(book) == {"strategy": strategy, "digest": digest} \
+                and (book / "_build" / "html").is_dir():
+            yield BookResult(book, "skipped")
+        else:
+            todo.append((book, digest))
+    if not todo:
+        return
+
+    max_workers = min(max_workers or _available_cpus(), len(todo))
+    suspects = []
+    while todo:
+        unfinished, running = yield from _build_in_pool(todo, release, strategy, max_workers)
+        # Books running when a worker died; all unfinished ones if none started
+        running = running or unfinished
+        suspects.extend(running)
+        todo = [item for item in unfinished if item not in running]
+
+    for book, digest in suspects:
+        if len(suspects) > 1:
+            unfinished, _ = yield from _build_in_pool([(book, digest)], release, strategy, 1)
+            if not unfinished:
+                continue
+        yield BookResult(book, "failed", error="build process died",
+                         log=_work_dir(book) / LOGFILE)
+
+
+def _build_in_pool(todo: list[tuple[Path, str]],
+                   release: bool,
+                   strategy: str,
+                   max_workers: int,
+                   ) -> Generator[BookResult, None, tuple[list, list]]:
+    """Build books in one pool until they are done or a worker dies.
+
+    Yields the result of each finished book and returns the books that did
+    not finish, and those among them that were being built.
+    """
+    started = multiprocessing.SimpleQueue()
+    finished = set()
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=_init_worker, initargs=(started,)) as pool:
+        futures = {pool.submit(_build_book, book, release): (book, digest)
+                   for book, digest in todo}
+        for future in as_completed(futures):
+            exception = future.exception()
+            if isinstance(exception, BrokenProcessPool):
+                continue
+            book, digest = futures[future]
+            if exception is not None:
+                # For instance a work directory that cannot be written
+                result = BookResult(book, "failed",
+                                    error=f"{type(exception).__name__}: {exception}")
+            else:
+                result = future.result()
+            finished.add(book)
+            if result.status == "built":
+                _save_build(book, strategy, digest)
+            yield result
+
+    unfinished = [item for item in todo if item[0] not in finished]
+    running = set()
+    while not started.empty():
+        running.add(started.get())
+    return unfinished, [item for item in unfinished if str(item[0]) in running]
+
+
+#: Queue of the books started by the workers of a pool
+_started = None
+
+
+def _init_worker(started) -> None:
+    global _started
+    _started = started
+
+
+def _build_book(book: Path, release: bool) -> BookResult:
+    """Build one book, logging to its work directory; runs in a worker process."""
+    from teachbooks.build import build_book, forget_book_modules
+
+    if _started is not None:
+        _started.put(str(book))
+    log = _work_dir(book) / LOGFILE
+    log.parent.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    with open(log, "w", encoding="utf8") as f, redirect_stdout(f), redirect_stderr(f):
+        try:
+            report = build_book(book, release=release)
+        except KeyboardInterrupt:
+            raise
+        except BaseException as exc:
+            # Jupyter Book reports failed builds with SystemExit
+            error = f"{type(exc).__name__}: {exc}"
+            print(error)
+            return BookResult(book, "failed", time.perf_counter() - start, error=error, log=log)
+        finally:
+            # Workers build several books; do not reuse one book's extensions
+            forget_book_modules(book)
+    return BookResult(book, "built", time.perf_counter() - start, size=report.total, log=log)
+
+
+def forget_batch_build(book: Path | str) -> None:
+    """Build the book in the next batch even if its sources did not change.
+
+    Called whenever the book's output is replaced or removed other than by
+    :func:`build_books`.
+    """
+    try:
+        (_work_dir(Path(book)) / STATEFILE).unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+def _work_dir(book: Path) -> Path:
+    return book / TEACHBOOKS_WORK_DIR
+
+
+def _last_build(book: Path) -> dict | None:
+    try:
+        with open(_work_dir(book) / STATEFILE, encoding="utf8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_build(book: Path, strategy: str, digest: str) -> None:
+    with open(_work_dir(book) / STATEFILE, "w", encoding="utf8") as f:
+        json.dump({"strategy": strategy, "digest": digest}, f, indent=2)
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Sequence
+
+#: Cache location in the book's work directory
+CACHE_DIR = "cache/bibliography"
+#: Formatted references, in the book's work directory
+REFERENCES_FILE = "cache/references.pickle"
+#: Changes whenever the layout of cache entries changes
+CACHE_VERSION = 1
+#: Number of cached bibliographies kept; older ones are removed
+MAX_ENTRIES = 8
+
+
+class BibliographyCache:
+    """Parsed BibTeX files, keyed on their contents and the pybtex version.
+
+    An entry holds the ``BibliographyData`` parsed from a list of ``.bib``
+    files, and the keys each file contributed, pickled. Loading it is much
+    cheaper than parsing the files again. Entries are written atomically;
+    only the :data:`MAX_ENTRIES` most recently written ones are kept.
+    """
+
+    def __init__(self, directory: Path | str) -> None:
+        self.directory = Path(directory)
+
+    def key(self, paths: Sequence[Path], encoding: str) -> str | None:
+        """Cache key of parsing ``paths`` with ``encoding``, or None if a file
+        cannot be read."""
+        import pybtex
+
+        digest = hashlib.sha256(f"{CACHE_VERSION}\0{pybtex.__version__}\0{encoding}".encode("utf8"))
+        for path in paths:
+            try:
+                with open(path, "rb") as f:
+                    content = hashlib.sha256(f.read()).hexdigest()
+            except OSError:
+                return None
+            digest.update(f"\0{os.fspath(path)}\0{content}".encode("utf8"))
+        return digest.hexdigest()
+
+    def load(self, key: str):
+        """The ``(keys per file, BibliographyData)`` stored as ``key``, or None."""
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+    def save(self, key: str, file_keys: list[list[str]], data) -> None:
+        """Store the keys per file and the parsed ``BibliographyData``."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((file_keys, data), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._prune()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pickle"
+
+    def _prune(self) -> None:
+        entries = sorted(self.directory.glob("*.pickle"),
+                         key=lambda path: path.stat().st_mtime, reverse=True)
+        for path in entries[MAX_ENTRIES:]:
+            path.unlink(missing_ok=True)
+
+
+@contextmanager
+def bibliography_cache(directory: Path | str) -> Iterator[None]:
+    """Serve BibTeX parsing of Jupyter Book builds in this context from a
+    :class:`BibliographyCache`.
+
+    sphinxcontrib-bibtex keeps parsed files in the Sphinx environment, which
+    is discarded whenever the configuration changes, for instance between
+    draft and release builds. Like :func:`teachbooks.build.sphinx_jobs` swaps
+    the Sphinx application, this swaps its ``parse_bibdata`` for one that
+    looks the files up in the cache first. Files with BibTeX errors are not
+    cached, so their warnings are reported on every build.
+    """
+    try:
+        import sphinxcontrib.bibtex.bibfile as bibfile
+    except ImportError:
+        yield
+        return
+
+    cache = BibliographyCache(directory)
+    original = bibfile.parse_bibdata
+
+    def parse_bibdata(bibfilenames, encoding):
+        key = cache.key(bibfilenames, encoding)
+        cached = cache.load(key) if key is not None else None
+        if cached is not None and len(cached[0]) == len(bibfilenames):
+            file_keys, data = cached
+            bibfile.logger.info(f"loaded {len(data.entries)} bibtex entries from the "
+                                f"TeachBooks cache")
+            return bibfile.BibData(
+                encoding=encoding,
+                bibfiles={filename: bibfile.BibFile(mtime=bibfile.get_mtime(filename),
+                                                    keys=dict.fromkeys(keys))
+                          for filename, keys in zip(bibfilenames, file_keys)},
+                data=data)
+
+        with _count_warnings() as warnings:
+            bibdata = original(bibfilenames, encoding)
+        if key is not None and not warnings:
+            cache.save(key, [list(bibdata.bibfiles[filename].keys) for filename in bibfilenames],
+                       bibdata.data)
+        return bibdata
+
+    bibfile.parse_bibdata = parse_bibdata
+    try:
+        yield
+    finally:
+        bibfile.parse_bibdata = original
+
+
+@contextmanager
+def reference_cache(path: Path | str) -> Iterator[None]:
+    """Keep the references formatted by the ``apa`` pybtex style in this
+    context in a file.
+
+    The references saved in ``path`` are loaded into
+    :data:`teachbooks.plugins.pybtex.formatting.apa.reference_cache` first, so
+    entries that did not change are not formatted again; the cache is written
+    back if references were added.
+    """
+    try:
+        from teachbooks.plugins.pybtex.formatting import apa
+    except ImportError:
+        yield
+        return
+
+    cache = apa.reference_cache
+    cache.load(path)
+    try:
+        yield
+    finally:
+        if cache.changed:
+            cache.save(path)
+
+
+@contextmanager
+def _count_warnings() -> Iterator[list]:
+    """Collect the warnings pybtex and sphinxcontrib-bibtex report in this context."""
+    import pybtex.errors
+    import sphinxcontrib.bibtex.bibfile as bibfile
+
+    warnings = []
+    warning = bibfile.logger.warning
+
+    def on_warning(*args, **kwargs):
+        warnings.append(args)
+        return warning(*args, **kwargs)
+
+    # pybtex only records that it printed a warning in non-strict mode
+    error_code, pybtex.errors.error_code = pybtex.errors.error_code, 0
+    bibfile.logger.warning = on_warning
+    try:
+        yield warnings
+    finally:
+        del bibfile.logger.warning
+        if pybtex.errors.error_code:
+            warnings.append(("pybtex",))
+        pybtex.errors.error_code = max(error_code, pybtex.errors.error_code)
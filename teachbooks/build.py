@@ -0,0 +1,338 @@
+import os
+import sys
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable, Iterator, Sequence
+
+import click
+
+from teachbooks import TEACHBOOKS_WORK_DIR
+from teachbooks.profile import BuildProfile
+from teachbooks.size import SizeReport
+
+# Rough peak memory of one Sphinx worker process for a large book
+MEMORY_PER_JOB = 512 * 1024 * 1024
+
+
+def build_book(path_source: Path | str,
+               release: bool = False,
+               process_only: bool = False,
+               args: Sequence[str] = (),
+               jobs: int | None = None,
+               precompress: bool = False,
+               echo: Callable[[str], None] = print,
+               profile: BuildProfile | None = None,
+               notebook_jobs: int | None = None,
+               notebook_timeout: float | None = None,
+               notebook_memory: int | None = None,
+               execution_cache: bool = True) -> SizeReport | None:
+    """Pre-process a book and run the Jupyter Book build.
+
+    This is the pipeline behind ``teachbooks build``. Notebooks executed by
+    the build, parsed BibTeX files and formatted references are cached in the
+    book's work directory, see :func:`teachbooks.execute.execution_cache`,
+    :func:`teachbooks.bibliography.bibliography_cache` and
+    :func:`teachbooks.bibliography.reference_cache`; draft and release builds
+    share the caches.
+
+    Parameters
+    ----------
+    path_source : Path | str
+        Book directory.
+    release : bool, optional
+        Pre-process with the release strategy, by default False.
+    process_only : bool, optional
+        Only pre-process, do not build, by default False.
+    args : Sequence[str], optional
+        Extra arguments for ``jupyter-book build``.
+    jobs : int | None, optional
+        Number of Sphinx workers, see :func:`sphinx_jobs`. By default the
+        Sphinx default is used.
+    precompress : bool, optional
+        Write compressed copies of text files in ``_build/html`` after the
+        build, see :func:`teachbooks.compress.precompress`. By default False.
+    echo : Callable[[str], None], optional
+        Function used to report progress, by default print.
+    profile : BuildProfile | None, optional
+        Collects the time of each step and of each document Sphinx reads and
+        writes, see :class:`teachbooks.profile.BuildProfile`. By default
+        nothing is timed.
+    notebook_jobs : int | None, optional
+        Execute the notebooks in the table of contents with this many kernels
+        before the Jupyter Book build, see
+        :func:`teachbooks.execute.execute_notebooks`. By default notebooks are
+        executed one by one during the build.
+    notebook_timeout : float | None, optional
+        Seconds each notebook may run when pre-executing, by default no limit.
+    notebook_memory : int | None, optional
+        Bytes of memory each kernel may use when pre-executing, by default no
+        limit.
+    execution_cache : bool, optional
+        Restore the outputs of unchanged notebooks from the execution cache,
+        by default True. Without it every notebook runs as Jupyter Book is
+        configured to, and ``notebook_jobs`` is ignored.
+
+    Returns
+    -------
+    SizeReport | None
+        Size of the ``_build`` directory, or None if only pre-processing.
+
+    Raises
+    ------
+    ReleaseMarkerError
+        If REMOVE-FROM-RELEASE markers in the configuration are malformed.
+    """
+    phase = profile.phase if profile is not None else lambda name: nullcontext()
+    with phase("import"):
+        from jupyter_book.cli.main import build as jupyter_book_build
+    from teachbooks import bibliography, execute
+    from teachbooks.batch import forget_batch_build
+    from teachbooks.release import make_release, copy_ext
+    from teachbooks.size import scan_size
+
+    path_src_folder = Path(path_source).absolute()
+    if release:
+        with phase("make_release"):
+            path_conf, path_toc = make_release(path_src_folder)
+        path_ext = path_src_folder / "_ext"
+        if path_ext.exists():
+            echo(click.style("copying _ext/ directory to support APA in release [TEMPORARY FEATURE]", fg="yellow"))
+            with phase("copy_ext"):
+                copy_ext(path_src_folder)
+    else:
+        path_conf = path_src_folder / "_config.yml"
+        path_toc = path_src_folder / "_toc.yml"
+
+    if process_only:
+        return None
+
+    # The output will no longer be that of the last batch build
+    forget_batch_build(path_src_folder)
+
+    all_args = [str(path_src_folder)]
+    if path_conf and path_conf.exists():
+        all_args.extend(["--config", str(path_conf)])
+    if path_toc and path_toc.exists():
+        all_args.extend(["--toc", str(path_toc)])
+    all_args.extend(args)
+
+    path_work = path_src_folder / TEACHBOOKS_WORK_DIR
+    path_cache = path_work / execute.CACHE_DIR
+    if notebook_jobs is not None and not execution_cache:
+        echo(click.style("notebooks are not pre-executed without the execution cache", fg="yellow"))
+    elif notebook_jobs is not None:
+        with phase("execute"):
+            _pre_execute(path_src_folder, path_conf, path_toc, path_cache,
+                         notebook_jobs, notebook_timeout, notebook_memory, echo)
+
+    if jobs is not None:
+        echo(f"building with {jobs} Sphinx worker(s)")
+    cache_context = (execute.execution_cache(path_cache) if execution_cache
+                     else nullcontext(execute.CacheStats()))
+    with sphinx_jobs(jobs, echo=echo) if jobs is not None else nullcontext(), \
+            profile.track_documents() if profile is not None else nullcontext(), \
+            cache_context as cached, \
+            bibliography.bibliography_cache(path_work / bibliography.CACHE_DIR), \
+            bibliography.reference_cache(path_work / bibliography.REFERENCES_FILE), \
+            phase("jupyter_book"):
+        jupyter_book_build.main(args=all_args, standalone_mode=False)
+    if cached.hits or cached.executed:
+        echo(f"notebook execution cache: {cached.hits} restored, {cached.executed} executed")
+
+    known_sizes = {}
+    path_html = path_src_folder / "_build" / "html"
+    if precompress and path_html.is_dir():
+        from teachbooks.compress import precompress as precompress_html
+
+        with phase("precompress"):
+            result = precompress_html(path_html)
+        echo(f"precompressed {result.compressed} file(s), {result.skipped} up to date or skipped")
+        known_sizes = {"html/" + path: size for path, size in result.sizes.items()}
+
+    with phase("size_scan"):
+        return scan_size(path_src_folder / "_build", known_sizes=known_sizes)
+
+
+def _pre_execute(path_source: Path,
+                 path_conf: Path | None,
+                 path_toc: Path | None,
+                 path_cache: Path,
+                 jobs: int,
+                 timeout: float | None,
+                 memory: int | None,
+                 echo: Callable[[str], None]) -> None:
+    """Execute the notebooks of a book into the execution cache, honouring the
+    ``execute`` settings of its configuration."""
+    import time
+
+    import yaml
+    from teachbooks.execute import execute_notebooks, toc_notebooks
+
+    settings = {}
+    if path_conf and path_conf.exists():
+        with open(path_conf, encoding="utf8") as f:
+            settings = (yaml.safe_load(f) or {}).get("execute") or {}
+    mode = settings.get("execute_notebooks", "auto")
+    if mode != "auto":
+        echo(f"not pre-executing notebooks, execute_notebooks is {mode!r} instead of 'auto'")
+        return
+
+    notebooks = toc_notebooks(path_source, path_toc if path_toc and path_toc.exists() else None,
+                              settings.get("exclude_patterns", ()))
+    echo(f"pre-executing {len(notebooks)} notebook(s) with {jobs} kernel(s)")
+    start = time.perf_counter()
+    results = []
+    for result in execute_notebooks(notebooks, path_cache,
+                                    max_workers=jobs,
+                                    timeout=timeout,
+                                    memory_limit=memory,
+                                    cell_timeout=settings.get("timeout", 30),
+                                    allow_errors=settings.get("allow_errors", False),
+                                    in_temp=settings.get("run_in_temp", False)):
+        results.append(result)
+        if result.status == "failed":
+            echo(click.style(f"notebook {result.path.relative_to(path_source)} failed: {result.error}",
+                             fg="red"))
+
+    counts = {status: sum(result.status == status for result in results)
+              for status in ("executed", "cached", "skipped", "failed")}
+    echo(", ".join(f"{count} {status}" for status, count in counts.items())
+         + f" in {time.perf_counter() - start:.1f}s")
+    slowest = sorted((result for result in results if result.seconds),
+                     key=lambda result: -result.seconds)[:5]
+    if slowest:
+        echo("slowest notebooks: " + ", ".join(
+            f"{result.path.relative_to(path_source)} ({result.seconds:.1f}s)" for result in slowest))
+
+
+def forget_book_modules(path_source: Path | str) -> None:
+    """Drop modules imported from a book, such as its ``_ext`` extensions.
+
+    For processes that build more than once: the next build imports the
+    current version of the book's modules instead of reusing stale ones.
+    """
+    prefix = os.path.join(os.path.abspath(path_source), "")
+    for name, module in list(sys.modules.items()):
+        file = getattr(module, "__file__", None)
+        if file and os.path.abspath(file).startswith(prefix):
+            del sys.modules[name]
+
+
+def resolve_jobs(jobs: str | int) -> int:
+    """Turn a ``--jobs`` value into a number of Sphinx workers.
+
+    Parameters
+    ----------
+    jobs : str | int
+        Number of workers, or "auto" to size the pool from the CPUs available
+        to this process and the available memory.
+
+    Returns
+    -------
+    int
+        Number of workers, at least 1.
+
+    Raises
+    ------
+    ValueError
+        If jobs is not "auto" or a positive integer.
+    """
+    if jobs == "auto":
+        return max(1, min(_available_cpus(), _available_memory() // MEMORY_PER_JOB))
+    try:
+        n = int(jobs)
+    except (TypeError, ValueError):
+        raise ValueError(f"expected 'auto' or a positive integer, got {jobs!r}") from None
+    if n < 1:
+        raise ValueError(f"expected 'auto' or a positive integer, got {jobs!r}")
+    return n
+
+
+def parallel_unsafe_extensions(app, typ: str | None = None) -> list[str]:
+    """List the extensions of a Sphinx application that prevent a parallel build.
+
+    Sphinx treats extensions that do not declare ``parallel_read_safe`` as unsafe
+    for reading, and extensions declaring ``parallel_write_safe = False`` as unsafe
+    for writing.
+
+    Parameters
+    ----------
+    app : sphinx.application.Sphinx
+        Sphinx application with its extensions loaded.
+    typ : str | None, optional
+        "read" or "write" to only list the extensions unsafe for that phase, by
+        default those unsafe for either.
+    """
+    return sorted(
+        name for name, ext in app.extensions.items()
+        if (typ != "write" and ext.parallel_read_safe is not True)
+        or (typ != "read" and ext.parallel_write_safe is False)
+    )
+
+
+@contextmanager
+def sphinx_jobs(jobs: int,
+                echo: Callable[[str], None] = print) -> Iterator[None]:
+    """Run Jupyter Book builds in this context with ``jobs`` Sphinx workers.
+
+    Jupyter Book does not expose the Sphinx ``parallel`` argument on its command
+    line, so the Sphinx application it creates is swapped for one with the
+    requested number of workers. If a loaded extension is not safe for parallel
+    reading, the build falls back to serial; if extensions are only unsafe for
+    parallel writing, documents are still read in parallel and written
+    serially. The offending extensions are reported.
+
+    Parameters
+    ----------
+    jobs : int
+        Number of Sphinx workers.
+    echo : Callable[[str], None], optional
+        Function used to report a fallback to serial, by default print.
+    """
+    import jupyter_book.sphinx as jb_sphinx
+
+    original = jb_sphinx.Sphinx
+
+    class ParallelSphinx(original):
+        serial_write = False
+
+        def __init__(self, *args, **kwargs):
+            kwargs["parallel"] = jobs
+            super().__init__(*args, **kwargs)
+            if self.parallel > 1:
+                read_unsafe = parallel_unsafe_extensions(self, "read")
+                write_unsafe = parallel_unsafe_extensions(self, "write")
+                if read_unsafe:
+                    echo(f"building serially instead of with {jobs} jobs; "
+                         f"extensions not parallel safe: {', '.join(parallel_unsafe_extensions(self))}")
+                    self.parallel = 1
+                elif write_unsafe:
+                    echo(f"reading with {jobs} jobs but writing serially; "
+                         f"extensions not parallel write safe: {', '.join(write_unsafe)}")
+                    self.serial_write = True
+
+        def is_parallel_allowed(self, typ: str) -> bool:
+            # Sphinx warns about each unsafe extension, which fails -W builds
+            if typ == "write" and self.serial_write:
+                return False
+            return super().is_parallel_allowed(typ)
+
+    jb_sphinx.Sphinx = ParallelSphinx
+    try:
+        yield
+    finally:
+        jb_sphinx.Sphinx = original
+
+
+def _available_cpus() -> int:
+    """Number of CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _available_memory() -> int:
+    """Available virtual memory in bytes."""
+    import psutil
+
+    return psutil.virtual_memory().available
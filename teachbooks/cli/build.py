@@ -0,0 +1,195 @@
+import click
+from pathlib import Path
+
+from teachbooks.cli.utils import echo_info, check_server, stdout_size_report, stdout_profile
+
+
+def validate_jobs(ctx, param, value):
+    """Convert the --jobs option to a number of workers."""
+    from teachbooks.build import resolve_jobs
+
+    if value is None:
+        return None
+    try:
+        return resolve_jobs(value)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc)) from exc
+
+@click.command(context_settings=dict(
+    ignore_unknown_options=True,
+    allow_extra_args=True,
+))
+@click.argument("path-source", type=click.Path(exists=True, file_okay=True))
+@click.option("--release", is_flag=True, help="Build book with release strategy")
+@click.option("--publish", is_flag=True, help="--public is deprecated. Use --release instead.")
+@click.option("--process-only", is_flag=True, help="Only pre-process content")
+@click.option("--jobs", default=None, callback=validate_jobs,
+              help="Number of parallel Sphinx workers, or 'auto' to use the available cores and memory")
+@click.option("--size-report", is_flag=True, help="Report build size per directory and the largest files")
+@click.option("--watch", is_flag=True, help="Keep running and rebuild when the book changes")
+@click.option("--precompress", is_flag=True, help="Write gzip/brotli copies of HTML, JS, CSS, SVG and JSON files")
+@click.option("--no-daemon", is_flag=True, help="Build in this process even if a build daemon is running")
+@click.option("--profile", is_flag=True,
+              help="Time each build step and document; report in .teachbooks/profile/")
+@click.option("--profiler", type=click.Choice(["cprofile", "pyinstrument"]), default=None,
+              help="Also record call stacks with this profiler (implies --profile)")
+@click.option("--notebook-jobs", default=None, callback=validate_jobs,
+              help="Execute notebooks with this many kernels before building, or 'auto'")
+@click.option("--notebook-timeout", type=click.FloatRange(min=0, min_open=True), default=None,
+              help="Seconds each pre-executed notebook may run")
+@click.option("--notebook-memory", type=click.IntRange(min=1), default=None,
+              help="Memory limit in MB of each pre-executing kernel")
+@click.option("--no-execution-cache", is_flag=True,
+              help="Execute notebooks instead of restoring unchanged ones from .teachbooks/cache/")
+@click.pass_context
+def build(ctx, path_source, publish, release, process_only, jobs, size_report, watch, precompress, no_daemon,
+          profile, profiler, notebook_jobs, notebook_timeout, notebook_memory, no_execution_cache):
+    """Pre-process book contents and run Jupyter Book build command"""
+    from contextlib import nullcontext
+
+    from teachbooks import daemon
+    from teachbooks.release import ReleaseMarkerError
+    from teachbooks.size import format_size
+
+    profile = profile or profiler is not None
+    if profile:
+        # Timings are collected in this process
+        no_daemon = True
+    if profiler == "pyinstrument":
+        try:
+            import pyinstrument
+        except ImportError:
+            raise click.ClickException("--profiler pyinstrument requires the pyinstrument package.")
+
+    if not no_daemon and daemon.is_running():
+        echo_info("building in the running build daemon")
+        build_book = daemon.build_book
+    else:
+        from teachbooks.build import build_book
+
+    if publish:
+        click.secho("Warning: --publish is deprecated, use --release instead",
+                    fg="yellow",
+                    err=True)
+
+    strategy = "release" if release or publish else "draft"
+    echo_info(f"running build with strategy '{strategy}'")
+
+    def run():
+        from teachbooks.profile import BuildProfile, PROFILE_DIR, capture_calls, report_path
+        from teachbooks import TEACHBOOKS_WORK_DIR
+
+        build_profile = BuildProfile() if profile else None
+        profile_dir = Path(path_source) / TEACHBOOKS_WORK_DIR / PROFILE_DIR
+        options = {}
+        if build_profile is not None:
+            # Profiled builds never go to the daemon, which cannot time them
+            options["profile"] = build_profile
+            # Call stacks are written next to the report, with the same name
+            report_file = report_path(profile_dir)
+        built = False
+        try:
+            with capture_calls(profiler, report_file.with_suffix("")) if profiler else nullcontext():
+                report = build_book(path_source,
+                                    release=release or publish,
+                                    process_only=process_only,
+                                    args=ctx.args,
+                                    jobs=jobs,
+                                    precompress=precompress,
+                                    echo=echo_info,
+                                    notebook_jobs=notebook_jobs,
+                                    notebook_timeout=notebook_timeout,
+                                    notebook_memory=notebook_memory * 1024 * 1024
+                                    if notebook_memory is not None else None,
+                                    execution_cache=not no_execution_cache,
+                                    **options)
+            built = True
+        except (ReleaseMarkerError, daemon.DaemonError) as exc:
+            raise click.ClickException(str(exc.args[0])) from exc
+        finally:
+            if build_profile is not None and not built:
+                # Failed builds keep their call stacks, but get no report
+                report_file.unlink(missing_ok=True)
+
+        if build_profile is not None:
+            stdout_profile(build_profile, build_profile.save(profile_dir, report_file))
+
+        if report is not None:
+            # Report build size
+            echo_info(f"Build complete. Total size: {format_size(report.total)}")
+            if size_report:
+                stdout_size_report(report)
+
+            check_server()
+
+    if not watch:
+        run()
+        return
+
+    from teachbooks.build import forget_book_modules
+    from teachbooks.watch import watch_book
+
+    def rebuild():
+        # Import the current version of edited _ext/ modules
+        forget_book_modules(path_source)
+        # Keep watching when a build fails
+        try:
+            run()
+        except click.ClickException as exc:
+            echo_info(click.style(f"build failed: {exc.format_message()}", fg="red"))
+        except (Exception, SystemExit) as exc:
+            echo_info(click.style(f"build failed: {exc!r}", fg="red"))
+
+    def on_change(changes):
+        echo_info(f"{len(changes)} change(s) detected, rebuilding: "
+                  + ", ".join(sorted(changes)[:5])
+                  + (", ..." if len(changes) > 5 else ""))
+        rebuild()
+
+    rebuild()
+    echo_info(f"watching {path_source} for changes, press Ctrl+C to stop.")
+    try:
+        watch_book(path_source, on_change)
+    except KeyboardInterrupt:
+        echo_info("stopped watching.")
+
+
+@click.command(name="build-all")
+@click.argument("root", type=click.Path(exists=True, file_okay=False))
+@click.option("--release", is_flag=True, help="Build books with release strategy")
+@click.option("--workers", type=click.IntRange(min=1), default=None,
+              help="Number of books built at the same time, by default one per core")
+@click.option("--force", is_flag=True, help="Also build books whose sources did not change")
+def build_all(root, release, workers, force):
+    """Build all books below a directory in parallel.
+
+    Books are directories with a _config.yml and a _toc.yml. The output of
+    each build goes to .teachbooks/build.log in the book.
+    """
+    import time
+
+    from teachbooks.batch import discover_books, build_books
+    from teachbooks.size import format_size
+
+    books = discover_books(root)
+    if not books:
+        raise click.ClickException(f"no books (_config.yml and _toc.yml) found in {root}")
+    strategy = "release" if release else "draft"
+    echo_info(f"found {len(books)} book(s), building with strategy '{strategy}'")
+
+    start = time.perf_counter()
+    counts = {"built": 0, "skipped": 0, "failed": 0}
+    colors = {"built": "green", "skipped": "yellow", "failed": "red"}
+    for result in build_books(books, release=release, max_workers=workers, force=force):
+        counts[result.status] += 1
+        size = format_size(result.size) if result.size is not None else ""
+        line = (click.style(f"{result.status:<8}", fg=colors[result.status])
+                + f"{result.seconds:>7.1f}s {size:>10}  {result.path}")
+        if result.status == "failed":
+            line += f"\n{'':>30}{result.error} (log: {result.log})"
+        print('            ' + line)
+
+    echo_info(f"{counts['built']} built, {counts['skipped']} skipped, {counts['failed']} failed "
+              f"in {time.perf_counter() - start:.1f}s")
+    if counts["failed"]:
+        raise click.exceptions.Exit(1)
@@ -0,0 +1,36 @@
+import click
+import shutil
+from pathlib import Path
+
+from teachbooks.cli.utils import echo_info
+
+
+@click.command()
+@click.argument("path-source", type=click.Path(exists=True, file_okay=True))
+def clean(path_source):
+    """Stop teachbooks server, remove TeachBooks caches and run Jupyter Book clean command."""
+    from jupyter_book.cli.main import clean as jupyter_book_clean
+    from teachbooks.batch import forget_batch_build
+    from teachbooks.serve import Server, ServerError
+
+    workdir = Path(path_source) / ".teachbooks" / "server"
+
+    # Check if a server is running and stop it if so
+    try:
+        server = Server.load(workdir)
+        if server.is_running:
+            echo_info("Stopping running server before cleaning...")
+            server.stop()
+            echo_info("Server stopped.")
+    except ServerError:
+        echo_info("No running server found.")
+
+    # Now proceed with cleaning
+    cachedir = Path(path_source) / ".teachbooks" / "cache"
+    if cachedir.is_dir():
+        echo_info(f"Removing caches in {cachedir}...")
+        shutil.rmtree(cachedir, ignore_errors=True)
+    forget_batch_build(path_source)
+    echo_info(f"Cleaning build artifacts in {path_source}...")
+    jupyter_book_clean.main([str(path_source)])
+    echo_info("Clean complete.")
@@ -0,0 +1,52 @@
+import click
+
+from teachbooks.cli.utils import echo_info
+
+
+@click.group()
+def daemon():
+    """Keep Jupyter Book loaded in the background to speed up builds.
+
+    While the daemon runs, `teachbooks build` sends builds to it.
+    """
+    pass
+
+@daemon.command()
+def start():
+    """Start the build daemon in the background."""
+    from teachbooks import daemon as build_daemon
+
+    if not build_daemon.available():
+        raise click.ClickException("the build daemon needs Unix sockets, which this platform lacks.")
+    echo_info("starting build daemon, loading Jupyter Book...")
+    try:
+        pid = build_daemon.start()
+    except build_daemon.DaemonError as exc:
+        raise click.ClickException(str(exc))
+    echo_info(click.style(f"build daemon running (pid {pid}) on: {build_daemon.socket_path()}", fg="green"))
+
+@daemon.command()
+def stop():
+    """Stop the build daemon."""
+    from teachbooks import daemon as build_daemon
+
+    try:
+        build_daemon.stop()
+        echo_info("build daemon stopped.")
+    except build_daemon.DaemonError:
+        echo_info("no build daemon found.")
+
+@daemon.command()
+def status():
+    """Show whether the build daemon runs and how many builds it did."""
+    from teachbooks import daemon as build_daemon
+
+    try:
+        info = build_daemon.status()
+    except build_daemon.DaemonError:
+        echo_info("no build daemon found.")
+        return
+    echo_info(click.style(f"build daemon running (pid {info['pid']}), "
+                          f"{info['builds']} build(s) done.", fg="green"))
+    if info.get("building"):
+        echo_info(f"building {info['building']}")
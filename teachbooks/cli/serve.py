@@ -0,0 +1,208 @@
+import click
+from pathlib import Path
+
+from teachbooks.cli.utils import echo_info, stdout_summary
+
+
+@click.group(invoke_without_command=True)
+# @click.argument("path-source", type=click.Path(exists=True, file_okay=True))
+# @click.option("--test", is_flag=True, help="Build book with release strategy")
+@click.option('-v', '--verbose', count=True)
+@click.option("--livereload", is_flag=True, help="Reload pages in the browser when they are rebuilt")
+@click.option("--backend", type=click.Choice(["teachbooks", "http.server"]), default="teachbooks",
+              help="Webserver to run; 'teachbooks' serves concurrent keep-alive connections")
+@click.option("--max-connections", type=click.IntRange(min=1), default=None,
+              help="Concurrent connections for the 'teachbooks' backend")
+@click.pass_context
+def serve(ctx, verbose, livereload, backend, max_connections):
+    """Start a web server to interact with the book locally.
+    
+    If serve dir path not provided, default is `./book/_build/html`.
+    Checks to see if server is already running.
+    """
+    from teachbooks.serve import Server
+    from teachbooks import SERVER_WORK_DIR, BOOK_SERVE_DIR
+
+    if verbose > 0:
+        echo_info(f"serve command invoked.")
+
+    if ctx.invoked_subcommand is None:
+
+        try:
+            server = Server.load(Path(SERVER_WORK_DIR))
+            if verbose > 0:
+                echo_info(f" server already exists")
+            
+            stdout_summary(server)
+        except:
+            if verbose > 0:
+                echo_info(f"no server found, creating a new one.")
+
+            dir = Path(BOOK_SERVE_DIR)
+
+            if not dir.exists():
+                echo_info(click.style("default directory not found: ", fg="yellow") + f"{dir}")
+                dir = Path(".")
+                print('            '
+                      +click.style("serving current directory: ", fg="yellow") + f"{dir}")
+                print('            '
+                      +click.style("specify a directory with: 'teachbooks serve path <path>'", fg="yellow"))
+                
+            serve_path(dir, verbose, livereload, backend, max_connections)
+
+@serve.command()
+@click.option('-v', '--verbose', count=True)
+@click.option("--livereload", is_flag=True, help="Reload pages in the browser when they are rebuilt")
+@click.option("--backend", type=click.Choice(["teachbooks", "http.server"]), default="teachbooks",
+              help="Webserver to run; 'teachbooks' serves concurrent keep-alive connections")
+@click.option("--max-connections", type=click.IntRange(min=1), default=None,
+              help="Concurrent connections for the 'teachbooks' backend")
+@click.argument("path-source",
+                type=click.Path(exists=True, file_okay=True))
+def path(path_source, verbose, livereload, backend, max_connections, no_build=False):
+    """Specify relative path of directory to serve."""
+    from teachbooks.serve import Server
+    from teachbooks import BUILD_DIR, SERVER_WORK_DIR
+    
+    if verbose > 0:
+        print(f"desired serve directory: {dir}")
+
+    dir_with_build = Path(path_source).joinpath(BUILD_DIR)
+    if dir_with_build.exists():
+        dir = dir_with_build
+        echo_info(f"_build/html available and appended to path.")
+    else:
+        dir = Path(path_source)
+
+    echo_info(f"attempting to serve this directory: {dir}")
+    try:
+        server = Server.load(Path(SERVER_WORK_DIR))
+        options = (livereload, "teachbooks" if livereload else backend, max_connections)
+        if server.servedir == dir and server.options == options:
+            print('            '
+                  +f"  ---> already serving this directory.")
+            stdout_summary(server)
+        elif server.options == options and server.backend == "teachbooks" and server.is_running:
+            print('            '
+                  +f"  ---> already serving a different directory.")
+            print('            '
+                  +f"  ---> updating server directory without restarting...")
+            server.set_servedir(dir)
+            stdout_summary(server)
+        else:
+            print('            '
+                  +f"  ---> already serving a different directory.")
+            print('            '
+                  +f"  ---> restarting server...")
+            # Keep the books mounted under URL prefixes
+            mounts = server.mounts
+            server.stop()
+            serve_path(dir, verbose, livereload, backend, max_connections)
+            if mounts and options[1] == "teachbooks":
+                server = Server.load(Path(SERVER_WORK_DIR))
+                for prefix, directory in mounts.items():
+                    if directory.is_dir():
+                        server.mount(prefix, directory)
+    except:
+        if verbose > 0:
+            echo_info(f"no server found, creating a new one.")
+        serve_path(dir, verbose, livereload, backend, max_connections)
+
+@serve.command()
+@click.option("--prefix", default=None,
+              help="URL prefix to serve the book under, by default the name of its directory")
+@click.argument("path-source",
+                type=click.Path(exists=True, file_okay=False))
+def add(path_source, prefix):
+    """Serve another book under a URL prefix, without restarting the server."""
+    from teachbooks.serve import Server, ServerError
+    from teachbooks import BUILD_DIR, BOOK_SERVE_DIR, SERVER_WORK_DIR
+
+    dir_with_build = Path(path_source).joinpath(BUILD_DIR)
+    dir = dir_with_build if dir_with_build.exists() else Path(path_source)
+    if prefix is None:
+        prefix = Path(path_source).absolute().name
+
+    try:
+        server = Server.load(Path(SERVER_WORK_DIR))
+    except ServerError:
+        echo_info(f"no server found, creating a new one.")
+        root = Path(BOOK_SERVE_DIR) if Path(BOOK_SERVE_DIR).exists() else Path(".")
+        serve_path(root, 0)
+        server = Server.load(Path(SERVER_WORK_DIR))
+
+    if server.options[1] != "teachbooks":
+        raise click.ClickException("serving several books requires the 'teachbooks' backend; "
+                                   "restart with 'teachbooks serve --backend teachbooks'.")
+    try:
+        prefix = server.mount(prefix, dir)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    if not server.is_running:
+        server.start()
+    echo_info(click.style(f"serving {dir} at: {server.url}/{prefix}/", fg="green"))
+
+@serve.command()
+@click.argument("prefix")
+def remove(prefix):
+    """Stop serving the book under a URL prefix."""
+    from teachbooks.serve import Server, ServerError
+    from teachbooks import SERVER_WORK_DIR
+
+    try:
+        server = Server.load(Path(SERVER_WORK_DIR))
+        server.unmount(prefix)
+    except ServerError:
+        raise click.ClickException("no server found.")
+    except KeyError:
+        raise click.ClickException(f"no book served under /{prefix.strip('/')}/")
+    echo_info(f"removed /{prefix.strip('/')}/")
+
+@serve.command(name="list")
+def list_mounts():
+    """List the served directory and the books served under URL prefixes."""
+    from teachbooks.serve import Server, ServerError
+    from teachbooks import SERVER_WORK_DIR
+
+    try:
+        server = Server.load(Path(SERVER_WORK_DIR))
+    except ServerError:
+        echo_info(f"no server found.")
+        return
+    stdout_summary(server)
+    print('            '
+          +f"{server.url}/  {server.servedir}")
+    for prefix, directory in sorted(server.mounts.items()):
+        print('            '
+              +f"{server.url}/{prefix}/  {directory}")
+
+@serve.command()
+def stop():
+    """Stop the webserver."""
+    from teachbooks.serve import Server
+    from teachbooks import SERVER_WORK_DIR
+    try:
+        server = Server.load(Path(SERVER_WORK_DIR))
+        server.stop()
+        echo_info(f"server stopped.")
+    except:
+        echo_info(f"no server found.")
+
+
+def serve_path(dir: str,
+               verbose: int,
+               livereload: bool = False,
+               backend: str = "teachbooks",
+               max_connections: int | None = None) -> None:
+    """Start web server with specific path and verbosity."""
+    from teachbooks.serve import Server
+    from teachbooks import SERVER_WORK_DIR
+
+    server = Server(servedir=Path(dir),
+                    workdir=Path(SERVER_WORK_DIR),
+                    stdout=verbose,
+                    livereload=livereload,
+                    backend=backend,
+                    max_connections=max_connections)
+    server.start(options=["--all"])
+    stdout_summary(server)
@@ -0,0 +1,55 @@
+import click
+from pathlib import Path
+
+
+def check_server():
+    """Check if webserver is running and print status."""
+    from teachbooks.serve import Server
+    from teachbooks import SERVER_WORK_DIR
+    try:
+        server = Server.load(Path(SERVER_WORK_DIR))
+        stdout_summary(server)
+    except:
+        echo_info(f"Use `teachbooks serve` to start a local server.")
+        
+
+def echo_info(message: str) -> None:
+    """Wrapper for writing to stdout."""
+    prefix = click.style("TeachBooks: ", fg="cyan", bold=True)
+    click.echo(prefix + message)
+
+def stdout_size_report(report) -> None:
+    """Print build size per directory and the largest files."""
+    from teachbooks.size import format_size
+
+    for name, size in sorted(report.directories.items(), key=lambda item: -item[1]):
+        print('            '
+              +f"{format_size(size):>10}  {name}/")
+    print('            '
+          +"largest files:")
+    for size, name in report.largest:
+        print('            '
+              +f"{format_size(size):>10}  {name}")
+
+def stdout_profile(profile, report) -> None:
+    """Print the time per build step and the slowest documents."""
+    total = sum(profile.phases.values()) or 1.0
+    echo_info(f"build profile written to {report}")
+    for name, seconds in profile.phases.items():
+        print('            '
+              +f"{name:<16}{seconds:>8.2f}s {100 * seconds / total:>5.1f}%")
+    slowest = profile.slowest_documents()
+    if slowest:
+        print('            '
+              +f"{'slowest documents':<40}{'read':>8} {'write':>8}")
+        for name, read, write in slowest:
+            print('            '
+                  +f"{name:<40}{read:>7.2f}s {write:>7.2f}s")
+
+def stdout_summary(server) -> None:
+    """Print summary of server status."""
+    echo_info(click.style(f"server running on: {server.url}", fg="green"))
+    print('            '
+          +click.style(f"serving directory: {server.servedir}", fg="green"))
+    print("            "
+          +"To stop server, run: 'teachbooks serve stop'")
@@ -0,0 +1,144 @@
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # optional dependency, see the "compress" extra
+    brotli = None
+
+#: File types that are worth compressing
+SUFFIXES = (".html", ".js", ".css", ".svg", ".json")
+#: Files smaller than this are not compressed
+MIN_SIZE = 256
+#: Suffix of the precompressed sibling per Content-Encoding, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+@dataclass
+class CompressResult:
+    """Files handled by :func:`precompress`."""
+    compressed: int = 0
+    skipped: int = 0
+    #: Sizes of the written files, keyed on posix paths relative to the directory
+    sizes: dict[str, int] = field(default_factory=dict)
+
+
+def available_encodings() -> list[str]:
+    """Content-Encodings that can be generated in this environment."""
+    return [encoding for encoding in ENCODINGS
+            if encoding != "br" or brotli is not None]
+
+
+def precompress(directory: Path | str,
+                encodings: list[str] | None = None,
+                max_workers: int | None = None) -> CompressResult:
+    """Write compressed siblings of the text files in a build directory.
+
+    For every HTML, JS, CSS, SVG and JSON file a ``.gz`` (and, if the optional
+    ``brotli`` package is installed, a ``.br``) file is written next to it, so a
+    webserver can send it directly to clients that accept the encoding. Files
+    whose compressed copy is up to date (see :func:`is_fresh`) are skipped, as
+    are compressed copies that would not be smaller. Files are compressed in a
+    thread pool; zlib and brotli release the GIL while compressing.
+
+    Parameters
+    ----------
+    directory : Path | str
+        Directory to process, usually ``_build/html``.
+    encodings : list[str] | None, optional
+        Content-Encodings to generate, by default :func:`available_encodings`.
+    max_workers : int | None, optional
+        Number of threads, by default one per CPU.
+
+    Returns
+    -------
+    CompressResult
+        Number of compressed and skipped files, and the sizes of the written
+        files.
+    """
+    directory = Path(directory)
+    encodings = available_encodings() if encodings is None else encodings
+    for encoding in encodings:
+        if encoding not in available_encodings():
+            raise ValueError(f"Content-Encoding {encoding!r} is not available")
+
+    tasks = []
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith(SUFFIXES):
+                path = Path(root, file)
+                tasks.extend((path, encoding) for encoding in encodings)
+
+    result = CompressResult()
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        for path, size in pool.map(lambda task: _compress_file(*task), tasks):
+            if size is None:
+                result.skipped += 1
+            else:
+                result.compressed += 1
+                result.sizes[path.relative_to(directory).as_posix()] = size
+    return result
+
+
+def is_fresh(source: os.stat_result, compressed: os.stat_result) -> bool:
+    """Whether a compressed copy was made from the current version of its source.
+
+    Compressed copies get the modification time of their source. A newer copy
+    is not enough: Sphinx copies static files with their original times, so a
+    changed file can be older than the copy made from its previous version.
+    """
+    return compressed.st_mtime_ns == source.st_mtime_ns
+
+
+def _compress_file(path: Path, encoding: str) -> tuple[Path, int | None]:
+    """Compress one file; returns the output path and its size, or None if skipped."""
+    output = path.with_name(path.name + ENCODINGS[encoding])
+    try:
+        src_stat = path.stat()
+        if src_stat.st_size < MIN_SIZE:
+            return output, None
+        if is_fresh(src_stat, output.stat()):
+            return output, None
+    except FileNotFoundError:
+        pass
+
+    data = path.read_bytes()
+    if encoding == "br":
+        compressed = brotli.compress(data, mode=brotli.MODE_TEXT)
+    else:
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+
+    if len(compressed) >= len(data):
+        output.unlink(missing_ok=True)
+        return output, None
+    output.write_bytes(compressed)
+    os.utime(output, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+    return output, len(compressed)
+
+
+def negotiate(accept_encoding: str | None) -> list[str]:
+    """Parse an Accept-Encoding header into usable encodings, preferred first.
+
+    Only encodings in :data:`ENCODINGS` are returned; ``q=0`` excludes one.
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+
+    def quality(encoding):
+        return accepted.get(encoding, accepted.get("*", 0.0))
+
+    usable = [encoding for encoding in ENCODINGS if quality(encoding) > 0]
+    # Stable sort keeps br before gzip for equal quality
+    return sorted(usable, key=quality, reverse=True)
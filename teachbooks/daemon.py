@@ -0,0 +1,503 @@
+"""Build daemon keeping Jupyter Book and Sphinx loaded between builds.
+
+Run ``python -m teachbooks.daemon`` (or ``teachbooks daemon start``) to start
+it. ``teachbooks build`` sends its builds to the daemon while it runs, which
+saves importing Jupyter Book, Sphinx and their extensions on every build.
+
+Clients talk to the daemon over a Unix socket, one request per connection.
+A request is a JSON object on one line; the daemon answers with JSON lines,
+ending with a ``result`` or an ``error``::
+
+    -> {"command": "build", "path_source": "/books/a", ...}
+    <- {"echo": "running build with strategy 'draft'"}
+    <- {"output": "Running Sphinx v7.2.6\\n"}
+    <- {"result": {"total": 1234, ...}}
+
+Builds run one at a time, in the daemon's process; other requests, such as
+``status``, are answered while a build runs.
+"""
+import argparse
+import dataclasses
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from subprocess import DEVNULL, PIPE, Popen
+from typing import Callable, Sequence
+
+from teachbooks.size import SizeReport
+
+#: Environment variable overriding the location of the daemon's socket
+SOCKET_ENV = "TEACHBOOKS_DAEMON_SOCKET"
+#: Seconds to wait for the answer to requests other than builds
+REQUEST_TIMEOUT = 10.0
+
+# Imported when the daemon starts, so the first build is fast as well
+WARM_MODULES = (
+    "jupyter_book.cli.main",
+    "jupyter_book.sphinx",
+    "sphinx.builders.html",
+    "myst_nb",
+    "sphinx_book_theme",
+)
+
+
+class DaemonError(Exception):
+    """The daemon cannot be reached, or failed to handle a request."""
+    pass
+
+
+def available() -> bool:
+    """Whether this platform supports the daemon (it needs Unix sockets)."""
+    return hasattr(socket, "AF_UNIX")
+
+
+def socket_path() -> Path:
+    """Location of the daemon's socket.
+
+    ``$TEACHBOOKS_DAEMON_SOCKET`` if set, otherwise ``teachbooks-<uid>/daemon.sock``
+    in ``$XDG_RUNTIME_DIR`` or the temporary directory.
+    """
+    if SOCKET_ENV in os.environ:
+        return Path(os.environ[SOCKET_ENV])
+    return _runtime_dir() / "daemon.sock"
+
+
+def _runtime_dir() -> Path:
+    """Default directory of the daemon's socket, private to the user."""
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    if hasattr(os, "getuid"):
+        return Path(base) / f"teachbooks-{os.getuid()}"
+    import getpass
+
+    return Path(base) / f"teachbooks-{getpass.getuser()}"
+
+
+def _prepare_directory(path: Path) -> None:
+    """Create the directory of a socket.
+
+    The default directory lives in a shared location, such as ``/tmp``, where
+    another user could have created it first: it must be owned by this user
+    and not accessible to others.
+
+    Raises
+    ------
+    DaemonError
+        If the default directory belongs to another user or is accessible to
+        others.
+    """
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if path.parent != _runtime_dir():
+        return
+    st = path.parent.stat()
+    if st.st_uid != os.getuid():
+        raise DaemonError(f"{path.parent} is owned by another user")
+    if st.st_mode & 0o077:
+        raise DaemonError(f"{path.parent} is accessible to other users; "
+                          f"restrict it with 'chmod 700 {path.parent}'")
+
+
+def request(message: dict,
+            on_event: Callable[[dict], None] | None = None,
+            path: Path | str | None = None,
+            timeout: float | None = None):
+    """Send a request to the daemon and wait for its result.
+
+    Parameters
+    ----------
+    message : dict
+        Request, with at least a "command".
+    on_event : Callable[[dict], None] | None, optional
+        Called with every event the daemon sends before the result.
+    path : Path | str | None, optional
+        Socket of the daemon, by default :func:`socket_path`.
+    timeout : float | None, optional
+        Seconds to wait for connecting and for each event, by default no
+        limit.
+
+    Returns
+    -------
+    Any
+        The result sent by the daemon.
+
+    Raises
+    ------
+    DaemonError
+        If no daemon is listening, it did not answer in time, or the request
+        failed. For failed builds ``args`` holds the message and the name of
+        the exception type.
+    """
+    if not available():
+        raise DaemonError("The build daemon needs Unix sockets")
+    path = Path(path or socket_path())
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(os.fspath(path))
+    except OSError as exc:
+        sock.close()
+        raise DaemonError(f"No build daemon listening on {path}") from exc
+
+    with sock, sock.makefile("rwb") as f:
+        try:
+            f.write(json.dumps(message).encode("utf8") + b"\n")
+            f.flush()
+            for line in f:
+                event = json.loads(line)
+                if "result" in event:
+                    return event["result"]
+                if "error" in event:
+                    raise DaemonError(event["error"], event.get("type"))
+                if on_event is not None:
+                    on_event(event)
+        except TimeoutError as exc:
+            raise DaemonError(f"The build daemon did not answer within {timeout} seconds") from exc
+        except OSError as exc:
+            raise DaemonError(f"Lost the connection to the build daemon: {exc}") from exc
+    raise DaemonError("The build daemon closed the connection")
+
+
+def is_running(path: Path | str | None = None) -> bool:
+    """Whether a daemon is listening on the socket.
+
+    Always False on platforms without Unix sockets, see :func:`available`.
+    """
+    if not available():
+        return False
+    try:
+        request({"command": "status"}, path=path, timeout=REQUEST_TIMEOUT)
+    except DaemonError:
+        return False
+    return True
+
+
+def build_book(path_source: Path | str,
+               release: bool = False,
+               process_only: bool = False,
+               args: Sequence[str] = (),
+               jobs: int | None = None,
+               precompress: bool = False,
+               echo: Callable[[str], None] = print,
+               path: Path | str | None = None,
+               notebook_jobs: int | None = None,
+               notebook_timeout: float | None = None,
+               notebook_memory: int | None = None,
+               execution_cache: bool = True) -> SizeReport | None:
+    """Run :func:`teachbooks.build.build_book` in the daemon.
+
+    Takes the same arguments; ``path`` is the daemon's socket. Progress is
+    passed to ``echo`` and the build output is written to ``sys.stdout``.
+
+    Raises
+    ------
+    ReleaseMarkerError
+        If REMOVE-FROM-RELEASE markers in the configuration are malformed.
+    DaemonError
+        If the daemon cannot be reached or the build failed.
+    """
+    from teachbooks.release import ReleaseMarkerError
+
+    def on_event(event):
+        if "echo" in event:
+            echo(event["echo"])
+        elif "output" in event:
+            sys.stdout.write(event["output"])
+            sys.stdout.flush()
+
+    message = {
+        "command": "build",
+        "path_source": str(Path(path_source).absolute()),
+        "cwd": os.getcwd(),
+        "release": release,
+        "process_only": process_only,
+        "args": list(args),
+        "jobs": jobs,
+        "precompress": precompress,
+        "notebook_jobs": notebook_jobs,
+        "notebook_timeout": notebook_timeout,
+        "notebook_memory": notebook_memory,
+        "execution_cache": execution_cache,
+    }
+    try:
+        result = request(message, on_event, path)
+    except DaemonError as exc:
+        if exc.args[1:] == ("ReleaseMarkerError",):
+            raise ReleaseMarkerError(exc.args[0]) from None
+        raise
+    if result is None:
+        return None
+    return SizeReport(total=result["total"],
+                      directories=result["directories"],
+                      largest=[tuple(item) for item in result["largest"]])
+
+
+def start(path: Path | str | None = None,
+          log: Path | str | None = None,
+          timeout: float = 120.0) -> int:
+    """Start a daemon in the background.
+
+    Returns once the daemon has loaded Jupyter Book and listens.
+
+    Parameters
+    ----------
+    path : Path | str | None, optional
+        Socket to listen on, by default :func:`socket_path`.
+    log : Path | str | None, optional
+        File for output of the daemon that is not sent to a client, by default
+        ``daemon.log`` next to the socket.
+    timeout : float, optional
+        Seconds to wait for the daemon to listen, by default 120.
+
+    Returns
+    -------
+    int
+        Process ID of the daemon.
+
+    Raises
+    ------
+    DaemonError
+        If a daemon is already running, or the new one did not start.
+    """
+    path = Path(path or socket_path())
+    log = Path(log or path.with_name("daemon.log"))
+    if is_running(path):
+        raise DaemonError(f"A build daemon is already listening on {path}")
+    _prepare_directory(path)
+
+    proc = Popen([sys.executable, "-u", "-m", "teachbooks.daemon",
+                  "--socket", str(path), "--log", str(log)],
+                 stdin=DEVNULL, stdout=PIPE, stderr=DEVNULL,
+                 start_new_session=True)
+    lines = []
+    reader = threading.Thread(target=lambda: lines.append(proc.stdout.readline()),
+                              daemon=True)
+    reader.start()
+    reader.join(timeout)
+    proc.stdout.close()
+    if not lines or not lines[0].startswith(b"Build daemon listening"):
+        if proc.poll() is None:
+            proc.terminate()
+        raise DaemonError(f"The build daemon did not start, see {log}")
+    return proc.pid
+
+
+def stop(path: Path | str | None = None) -> None:
+    """Ask the daemon to exit after the current build.
+
+    Raises
+    ------
+    DaemonError
+        If no daemon is listening.
+    """
+    request({"command": "stop"}, path=path, timeout=REQUEST_TIMEOUT)
+
+
+def status(path: Path | str | None = None) -> dict:
+    """Process ID, start time, number of builds and current build of the daemon.
+
+    Raises
+    ------
+    DaemonError
+        If no daemon is listening.
+    """
+    return request({"command": "status"}, path=path, timeout=REQUEST_TIMEOUT)
+
+
+def serve(path: Path | str | None = None,
+          warm: bool = True,
+          on_ready: Callable[[], None] | None = None) -> None:
+    """Run the daemon in this process until it is stopped.
+
+    Parameters
+    ----------
+    path : Path | str | None, optional
+        Socket to listen on, by default :func:`socket_path`.
+    warm : bool, optional
+        Import Jupyter Book, Sphinx and common extensions before listening, by
+        default True.
+    on_ready : Callable[[], None] | None, optional
+        Called once the daemon listens.
+
+    Raises
+    ------
+    DaemonError
+        If a daemon is already listening on the socket.
+    """
+    path = Path(path or socket_path())
+    if is_running(path):
+        raise DaemonError(f"A build daemon is already listening on {path}")
+    _prepare_directory(path)
+    # Left behind by a daemon that did not exit cleanly
+    path.unlink(missing_ok=True)
+
+    if warm:
+        _warm_up()
+    # Only this user may connect, from the moment the socket is bound
+    umask = os.umask(0o177)
+    try:
+        server = DaemonServer(os.fspath(path), _Handler)
+    finally:
+        os.umask(umask)
+    with server:
+        print(f"Build daemon listening on {path}", flush=True)
+        if on_ready is not None:
+            on_ready()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            path.unlink(missing_ok=True)
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server handling each request in a thread.
+
+    Builds change the working directory and redirect ``sys.stdout``, so they
+    hold :attr:`build_lock` and run one at a time.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.started = time.time()
+        self.builds = 0
+        #: Book being built, if any
+        self.building: str | None = None
+        self.build_lock = threading.Lock()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            message = json.loads(self.rfile.readline())
+        except ValueError:
+            self.send(error="Malformed request", type="ValueError")
+            return
+        command = message.get("command")
+        if command == "build":
+            self._build(message)
+        elif command == "status":
+            self.send(result={"pid": os.getpid(),
+                              "started": self.server.started,
+                              "builds": self.server.builds,
+                              "building": self.server.building})
+        elif command == "stop":
+            self.send(result=None)
+            # Closing the server waits for a running build
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self.send(error=f"Unknown command {command!r}", type="ValueError")
+
+    def send(self, **event) -> None:
+        """Send an event; a client that went away does not stop the build."""
+        try:
+            self.wfile.write(json.dumps(event).encode("utf8") + b"\n")
+            self.wfile.flush()
+        except OSError:
+            pass
+
+    def _build(self, message: dict) -> None:
+        from teachbooks.build import build_book, forget_book_modules
+
+        if not self.server.build_lock.acquire(blocking=False):
+            self.send(echo=f"waiting for the build of {self.server.building} to finish")
+            self.server.build_lock.acquire()
+        self.server.building = message["path_source"]
+        cwd = os.getcwd()
+        try:
+            os.chdir(message["cwd"])
+            with redirect_stdout(_EventStream(self.send, sys.stdout)), \
+                    redirect_stderr(_EventStream(self.send, sys.stderr)):
+                report = build_book(message["path_source"],
+                                    release=message["release"],
+                                    process_only=message["process_only"],
+                                    args=message["args"],
+                                    jobs=message["jobs"],
+                                    precompress=message["precompress"],
+                                    notebook_jobs=message.get("notebook_jobs"),
+                                    notebook_timeout=message.get("notebook_timeout"),
+                                    notebook_memory=message.get("notebook_memory"),
+                                    execution_cache=message.get("execution_cache", True),
+                                    echo=lambda text: self.send(echo=text))
+        except KeyboardInterrupt:
+            raise
+        except BaseException as exc:
+            # Jupyter Book reports failed builds with SystemExit
+            outcome = {"error": str(exc) or repr(exc), "type": type(exc).__name__}
+        else:
+            outcome = {"result": None if report is None else dataclasses.asdict(report)}
+        finally:
+            os.chdir(cwd)
+            forget_book_modules(message["path_source"])
+            self.server.builds += 1
+            self.server.building = None
+            self.server.build_lock.release()
+        # Only answer once the build is over, so the status reflects it
+        self.send(**outcome)
+
+
+class _EventStream(io.TextIOBase):
+    """Text stream sending everything the building thread writes to it as
+    "output" events.
+
+    Redirecting ``sys.stdout`` affects every thread, so output of the other
+    threads, such as those answering status requests, goes to ``stream``.
+    """
+
+    def __init__(self, send: Callable[..., None], stream) -> None:
+        self._send = send
+        self._stream = stream
+        self._thread = threading.get_ident()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if threading.get_ident() != self._thread:
+            return self._stream.write(text)
+        if isinstance(text, bytes):
+            # Some tools write encoded output to sys.stdout directly
+            text = text.decode("utf8", "replace")
+        if text:
+            self._send(output=text)
+        return len(text)
+
+
+def _warm_up() -> None:
+    import importlib
+
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m teachbooks.daemon",
+                                     description="Run the teachbooks build daemon.")
+    parser.add_argument("--socket", default=None, help="socket to listen on")
+    parser.add_argument("--log", default=None,
+                        help="redirect output to this file once listening")
+    args = parser.parse_args(argv)
+
+    def redirect_output():
+        # Started in the background: readiness went to stdout, the rest is logged
+        fd = os.open(args.log, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        os.close(fd)
+
+    serve(args.socket, on_ready=redirect_output if args.log else None)
+
+
+if __name__ == "__main__":
+    main()
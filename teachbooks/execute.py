@@ -0,0 +1,442 @@
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Iterator, Sequence
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+#: Cache location in the book's work directory
+CACHE_DIR = "cache/execution"
+#: Changes whenever the layout of cache entries changes
+CACHE_VERSION = 2
+#: Number of cached notebooks kept; the least recently used are removed
+MAX_ENTRIES = 1000
+
+# Quoted strings in code cells, which may name files the notebook reads
+_STRING = re.compile(r"""["']([^"'\n]+)["']""")
+
+
+@dataclass
+class CacheStats:
+    """Notebooks served from and added to an :class:`ExecutionCache`."""
+    hits: int = 0
+    executed: int = 0
+
+
+@dataclass
+class NotebookResult:
+    """Outcome of pre-executing one notebook with :func:`execute_notebooks`."""
+    path: Path
+    #: "executed", "cached", "skipped" (all outputs present) or "failed"
+    status: str
+    seconds: float = 0.0
+    error: str | None = None
+
+
+class ExecutionCache:
+    """Outputs of executed notebooks, keyed on their code and kernel environment.
+
+    The key of a notebook hashes the source of its code cells, its kernel and
+    language, a fingerprint of the Python environment (interpreter version and
+    installed distributions) and the contents of its :meth:`dependencies`.
+    Markdown edits therefore do not cause re-execution, while changing code,
+    editing a helper module next to the notebook or upgrading a package does.
+    Other files the notebook reads, for instance through a computed path, are
+    not part of the key; builds that depend on them should disable the cache
+    (``teachbooks build --no-execution-cache``).
+
+    Each entry is a JSON file, written atomically, so builds running at the
+    same time can share a cache. Only the :data:`MAX_ENTRIES` most recently
+    used entries are kept.
+    """
+
+    def __init__(self, directory: Path | str) -> None:
+        self.directory = Path(directory)
+        self.stats = CacheStats()
+        self._environment = None
+        self._digests = {}
+
+    def key(self, notebook, path: Path | str | None = None) -> str:
+        """Cache key of a notebook (an ``nbformat.NotebookNode``) stored at
+        ``path``; without a path its dependencies are not part of the key."""
+        kernelspec = notebook.metadata.get("kernelspec", {})
+        digest = hashlib.sha256()
+        digest.update(json.dumps([CACHE_VERSION,
+                                  kernelspec.get("name"),
+                                  kernelspec.get("language"),
+                                  self.environment]).encode("utf8"))
+        for cell in notebook.cells:
+            if cell.cell_type == "code":
+                digest.update(b"\0" + cell.source.encode("utf8"))
+        if path is not None:
+            directory = Path(path).parent
+            for dependency in self.dependencies(notebook, path):
+                name = dependency.relative_to(directory).as_posix()
+                digest.update(f"\0{name}\0{self._digest(dependency)}".encode("utf8"))
+        return digest.hexdigest()
+
+    def dependencies(self, notebook, path: Path | str) -> list[Path]:
+        """Local files a notebook probably depends on.
+
+        These are the Python modules and packages in the notebook's directory,
+        which it can import, and the files named by string literals in its
+        code cells, relative to that directory, such as ``"data/input.csv"``.
+        """
+        directory = Path(path).parent
+        files = set(directory.glob("*.py"))
+        for init in directory.glob("*/__init__.py"):
+            files.update(init.parent.rglob("*.py"))
+        for cell in notebook.cells:
+            if cell.cell_type != "code":
+                continue
+            for name in _STRING.findall(cell.source):
+                try:
+                    candidate = directory / name
+                    if candidate.is_file():
+                        files.add(candidate)
+                except (OSError, ValueError):
+                    # Not a possible file name
+                    continue
+        return sorted(files)
+
+    @property
+    def environment(self) -> str:
+        """Fingerprint of the Python environment that kernels run in."""
+        if self._environment is None:
+            from importlib import metadata
+
+            packages = sorted(f"{dist.metadata['Name']}=={dist.version}"
+                              for dist in metadata.distributions())
+            digest = hashlib.sha256(sys.version.encode("utf8"))
+            digest.update("\n".join(packages).encode("utf8"))
+            self._environment = digest.hexdigest()
+        return self._environment
+
+    def _digest(self, path: Path) -> str | None:
+        """Content digest of a file, remembered per version of the file."""
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        version = (path, st.st_mtime_ns, st.st_size)
+        if version not in self._digests:
+            from teachbooks.release import _hash_file
+
+            self._digests[version] = _hash_file(path)
+        return self._digests[version]
+
+    def load(self, key: str, notebook) -> float | None:
+        """Fill in the outputs of a notebook from the cache entry ``key``.
+
+        Returns
+        -------
+        float | None
+            Run time in seconds of the cached execution, or None (and the
+            notebook untouched) if it is not cached.
+        """
+        import nbformat
+
+        try:
+            with open(self._path(key), encoding="utf8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        cells = [cell for cell in notebook.cells if cell.cell_type == "code"]
+        if len(cells) != len(entry["cells"]):
+            return None
+        for cell, cached in zip(cells, entry["cells"]):
+            cell.outputs = [nbformat.from_dict(output) for output in cached["outputs"]]
+            cell.execution_count = cached["execution_count"]
+        try:
+            # Recently used entries are kept when pruning
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        self.stats.hits += 1
+        return entry["runtime"]
+
+    def save(self, key: str, notebook, runtime: float) -> None:
+        """Store the outputs of an executed notebook as entry ``key``.
+
+        Execution may add metadata to the notebook, so the key should be
+        computed beforehand.
+        """
+        entry = {
+            "runtime": runtime,
+            "cells": [{"outputs": cell.outputs, "execution_count": cell.execution_count}
+                      for cell in notebook.cells if cell.cell_type == "code"],
+        }
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf8") as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.stats.executed += 1
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _prune(self) -> None:
+        def mtime(path):
+            try:
+                return path.stat().st_mtime
+            except OSError:
+                return 0.0
+
+        entries = sorted(self.directory.glob("*/*.json"), key=mtime, reverse=True)
+        for path in entries[MAX_ENTRIES:]:
+            path.unlink(missing_ok=True)
+
+
+@contextmanager
+def execution_cache(directory: Path | str) -> Iterator[CacheStats]:
+    """Serve notebook executions of Jupyter Book builds in this context from
+    an :class:`ExecutionCache`.
+
+    MyST-NB executes notebooks in "auto" mode with its direct client, which
+    has no cache. Like :func:`teachbooks.build.sphinx_jobs` swaps the Sphinx
+    application, this swaps that client for one that looks notebooks up in
+    the cache first and stores successful executions. Other execution modes
+    are left alone.
+
+    Yields
+    ------
+    CacheStats
+        Counts of cached and executed notebooks, updated during the build.
+    """
+    try:
+        import myst_nb.core.execute as nb_execute
+    except ImportError:
+        yield CacheStats()
+        return
+
+    cache = ExecutionCache(directory)
+    original = nb_execute.NotebookClientDirect
+
+    class CachedNotebookClient(original):
+        def start_client(self):
+            if self.nb_config.execution_mode != "auto":
+                return super().start_client()
+
+            key = cache.key(self.notebook, self.path)
+            runtime = cache.load(key, self.notebook)
+            if runtime is not None:
+                self.logger.info("Restored notebook outputs from the TeachBooks execution cache")
+                self.exec_metadata = {
+                    "mtime": os.path.getmtime(cache._path(key)),
+                    "runtime": runtime,
+                    "method": "cache",
+                    "succeeded": True,
+                    "error": None,
+                    "traceback": None,
+                }
+                return
+
+            super().start_client()
+            if self.exec_metadata and self.exec_metadata["succeeded"]:
+                cache.save(key, self.notebook, self.exec_metadata["runtime"])
+
+    nb_execute.NotebookClientDirect = CachedNotebookClient
+    try:
+        yield cache.stats
+    finally:
+        nb_execute.NotebookClientDirect = original
+        if cache.stats.executed:
+            cache._prune()
+
+
+def toc_notebooks(path_source: Path | str,
+                  path_toc: Path | str | None = None,
+                  exclude_patterns: Sequence[str] = ()) -> list[Path]:
+    """Jupyter notebooks (``.ipynb``) listed in the table of contents of a book.
+
+    Parameters
+    ----------
+    path_source : Path | str
+        Book directory.
+    path_toc : Path | str | None, optional
+        Table of contents, by default ``_toc.yml`` in the book.
+    exclude_patterns : Sequence[str], optional
+        Leave out notebooks matching these patterns, as Jupyter Book's
+        ``execute.exclude_patterns`` does.
+
+    Returns
+    -------
+    list[Path]
+        Notebooks in the order of the table of contents. Glob entries and
+        MyST Markdown notebooks are not included.
+    """
+    import yaml
+
+    path_source = Path(path_source).absolute()
+    with open(path_toc or path_source / "_toc.yml", encoding="utf8") as f:
+        toc = yaml.safe_load(f)
+
+    def files(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key in ("root", "file") and isinstance(value, str):
+                    yield value
+                else:
+                    yield from files(value)
+        elif isinstance(node, list):
+            for item in node:
+                yield from files(item)
+
+    notebooks = []
+    for name in files(toc):
+        path = path_source / name
+        if path.suffix != ".ipynb":
+            path = path.with_name(path.name + ".ipynb")
+        if path.is_file() and path not in notebooks \
+                and not any(PurePosixPath(path.as_posix()).match(pattern)
+                            for pattern in exclude_patterns):
+            notebooks.append(path)
+    return notebooks
+
+
+def execute_notebooks(notebooks: Sequence[Path],
+                      cache_dir: Path | str,
+                      max_workers: int | None = None,
+                      timeout: float | None = None,
+                      memory_limit: int | None = None,
+                      cell_timeout: float | None = 30,
+                      allow_errors: bool = False,
+                      in_temp: bool = False) -> Iterator[NotebookResult]:
+    """Execute notebooks in a pool of processes and store their outputs in an
+    :class:`ExecutionCache`.
+
+    Each worker runs one kernel at a time. Notebooks whose outputs are all
+    present, or that are already cached, are not executed, as in MyST-NB's
+    "auto" mode; a later build with :func:`execution_cache` restores the
+    outputs instead of executing the notebooks again. Failed notebooks are not
+    cached, so the build executes them and reports the error.
+
+    Parameters
+    ----------
+    notebooks : Sequence[Path]
+        Notebook files, see :func:`toc_notebooks`.
+    cache_dir : Path | str
+        Directory of the :class:`ExecutionCache`.
+    max_workers : int | None, optional
+        Number of notebooks executed at the same time, by default one per
+        available CPU.
+    timeout : float | None, optional
+        Seconds a notebook may run in total, by default no limit.
+    memory_limit : int | None, optional
+        Bytes of address space per kernel (``RLIMIT_AS``; only on platforms
+        with the :mod:`resource` module), by default no limit.
+    cell_timeout : float | None, optional
+        Seconds a cell may run, by default 30 like Jupyter Book. None or a
+        negative value means no limit. Notebooks can override it in their
+        ``execution`` metadata.
+    allow_errors : bool, optional
+        Continue executing after a cell raised, by default False.
+    in_temp : bool, optional
+        Run kernels in a temporary directory instead of the notebook's, by
+        default False.
+
+    Yields
+    ------
+    NotebookResult
+        Outcome per notebook, in order of completion.
+    """
+    from teachbooks.build import _available_cpus
+
+    if not notebooks:
+        return
+    max_workers = min(max_workers or _available_cpus(), len(notebooks))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_execute_notebook, Path(notebook), Path(cache_dir), timeout,
+                               memory_limit, cell_timeout, allow_errors, in_temp): notebook
+                   for notebook in notebooks}
+        executed = False
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                result = NotebookResult(Path(futures[future]), "failed",
+                                        error="execution process died")
+            executed = executed or result.status == "executed"
+            yield result
+    if executed:
+        ExecutionCache(cache_dir)._prune()
+
+
+def _execute_notebook(path: Path,
+                      cache_dir: Path,
+                      timeout: float | None,
+                      memory_limit: int | None,
+                      cell_timeout: float | None,
+                      allow_errors: bool,
+                      in_temp: bool) -> NotebookResult:
+    """Execute one notebook into the cache; runs in a worker process."""
+    import nbformat
+    from nbclient import NotebookClient
+    from nbclient.exceptions import CellTimeoutError
+
+    nb = nbformat.read(path, as_version=4)
+    if all(cell.outputs for cell in nb.cells if cell.cell_type == "code"):
+        return NotebookResult(path, "skipped")
+    cache = ExecutionCache(cache_dir)
+    key = cache.key(nb, path)
+    if cache._path(key).is_file():
+        return NotebookResult(path, "cached")
+
+    # Notebook metadata overrides the configuration, as in MyST-NB
+    settings = nb.metadata.get("execution", {})
+    cell_timeout = settings.get("timeout", cell_timeout)
+    allow_errors = settings.get("allow_errors", allow_errors)
+    if cell_timeout is None or cell_timeout < 0:
+        cell_timeout = float("inf")
+    start = time.monotonic()
+    deadline = start + timeout if timeout is not None else float("inf")
+
+    def timeout_func(cell):
+        limit = min(cell_timeout, deadline - time.monotonic())
+        return None if limit == float("inf") else max(1, math.ceil(limit))
+
+    kernel_options = {}
+    if memory_limit is not None and resource is not None:
+        # Limits the kernel only, not this worker
+        kernel_options["preexec_fn"] = lambda: resource.setrlimit(
+            resource.RLIMIT_AS, (memory_limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+
+    client = NotebookClient(nb, timeout_func=timeout_func, allow_errors=allow_errors,
+                            record_timing=False)
+    with tempfile.TemporaryDirectory() if in_temp else nullcontext(str(path.parent)) as cwd:
+        client.resources = {"metadata": {"path": cwd}}
+        try:
+            client.execute(**kernel_options)
+        except Exception as exc:
+            seconds = time.monotonic() - start
+            # Errors raised in cells end with the exception, timeouts start with the reason
+            lines = str(exc).strip().splitlines() or [""]
+            if isinstance(exc, CellTimeoutError):
+                error = (f"timed out after {timeout:g}s" if time.monotonic() >= deadline
+                         else lines[0])
+            else:
+                error = f"{type(exc).__name__}: {lines[-1]}"
+            return NotebookResult(path, "failed", seconds, error=error)
+    seconds = time.monotonic() - start
+    cache.save(key, nb, seconds)
+    return NotebookResult(path, "executed", seconds)
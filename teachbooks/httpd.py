@@ -0,0 +1,644 @@
+"""Static file server used by :class:`teachbooks.serve.Server`.
+
+Run as ``python -m teachbooks.httpd PORT [--directory DIR] [--livereload]
+[--max-connections N] [--fd FD] [--mounts FILE]``. It can also be
+socket-activated by systemd.
+
+Compared to ``python -m http.server`` it keeps connections alive (HTTP/1.1),
+sends files with ``sendfile``, handles requests in a bounded thread pool,
+serves precompressed ``.br``/``.gz`` siblings (see :mod:`teachbooks.compress`)
+to clients that accept them and can serve further books under URL prefixes
+(see :class:`MountTable`).
+"""
+import argparse
+import datetime
+import email.utils
+import hashlib
+import io
+import json
+import os
+import queue
+import re
+import socket
+import threading
+import time
+import urllib.parse
+from functools import lru_cache, partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable
+
+from teachbooks.compress import ENCODINGS, is_fresh, negotiate
+from teachbooks.watch import snapshot, changed_paths
+
+LIVERELOAD_PATH = "/__teachbooks__/livereload"
+MAX_CONNECTIONS = 64
+#: First file descriptor passed by systemd socket activation
+SD_LISTEN_FDS_START = 3
+
+#: Query parameters used by Sphinx and its themes to version static assets
+HASH_PARAMETERS = {"v", "digest"}
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDATE = "no-cache"
+
+# Reloads the page when the page itself, or a stylesheet, script or image it
+# uses, changed.
+LIVERELOAD_SCRIPT = """<script>
+(function () {
+  var source = new EventSource("%s");
+  source.addEventListener("reload", function (event) {
+    var changed = JSON.parse(event.data).pages.map(function (page) { return "/" + page; });
+    var used = [location.pathname.replace(/\\/$/, "/index.html")];
+    document.querySelectorAll("link[href], script[src], img[src]").forEach(function (el) {
+      used.push(new URL(el.href || el.src, location.href).pathname);
+    });
+    used = used.map(decodeURIComponent);
+    if (changed.some(function (page) { return used.indexOf(page) >= 0; })) {
+      location.reload();
+    }
+  });
+})();
+</script>
+""" % LIVERELOAD_PATH
+
+_BODY_END = re.compile(rb"</body\s*>", re.IGNORECASE)
+
+
+class ChangeTracker:
+    """Track which files in a directory changed content and notify subscribers."""
+
+    def __init__(self, directory: Path | str, interval: float = 0.5) -> None:
+        """Construct ChangeTracker object
+
+        Parameters
+        ----------
+        directory : Path | str
+            Directory to track, usually the HTML output of a book.
+        interval : float, optional
+            Polling interval in seconds, by default 0.5.
+        """
+        self.directory = Path(directory)
+        self.interval = interval
+        # Filled by the first check, so hashing a large book does not delay startup
+        self._state = None
+        self._digests = {}
+        self._subscribers: list[queue.Queue] = []
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+
+    def subscribe(self) -> queue.Queue:
+        """Register a client; lists of changed pages are put on the returned queue."""
+        q = queue.Queue()
+        with self._lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self._lock:
+            self._subscribers.remove(q)
+
+    def check(self) -> list[str]:
+        """Poll the directory once and notify subscribers of changed pages.
+
+        The first call only records the current state. Files whose modification time changed but whose bytes did not (Sphinx
+        copies static assets on every build) are not reported.
+
+        Returns
+        -------
+        list[str]
+            Posix paths, relative to the directory, of files with new content.
+        """
+        with self._check_lock:
+            current = snapshot(self.directory)
+            if self._state is None:
+                self._state = current
+                self._digests = {path: self._digest(path) for path in current}
+                return []
+
+            changed = []
+            for path in sorted(changed_paths(self._state, current)):
+                digest = self._digest(path) if path in current else None
+                if digest != self._digests.get(path):
+                    changed.append(path)
+                if digest is None:
+                    self._digests.pop(path, None)
+                else:
+                    self._digests[path] = digest
+            self._state = current
+
+        self._notify(changed)
+        return changed
+
+    def retarget(self, directory: Path | str) -> None:
+        """Track another directory, such as the new root of a server.
+
+        Subscribers are notified of every file in the new directory, so pages
+        open at the same paths reload.
+        """
+        with self._check_lock:
+            self.directory = Path(directory)
+            self._state = snapshot(self.directory)
+            self._digests = {path: self._digest(path) for path in self._state}
+            changed = sorted(self._state)
+        self._notify(changed)
+
+    def run(self, directory: Callable[[], str | None] | None = None) -> None:
+        """Poll forever; meant to run in a daemon thread.
+
+        Parameters
+        ----------
+        directory : Callable[[], str | None] | None, optional
+            Called before each poll; when it returns a directory other than
+            the tracked one, the tracker follows it, see :meth:`retarget`.
+        """
+        while True:
+            current = directory() if directory is not None else None
+            if current is not None and Path(current) != self.directory:
+                self.retarget(current)
+            self.check()
+            time.sleep(self.interval)
+
+    def _notify(self, changed: list[str]) -> None:
+        if changed:
+            with self._lock:
+                for q in self._subscribers:
+                    q.put(changed)
+
+    def _digest(self, path: str) -> str | None:
+        digest = hashlib.sha256()
+        try:
+            with open(self.directory / path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    digest.update(chunk)
+        except OSError:
+            return None
+        return digest.hexdigest()
+
+
+class MountTable:
+    """Books mounted under URL prefixes, read from a JSON file.
+
+    The file maps prefixes (without slashes at either end) to directories, as
+    written by :meth:`teachbooks.serve.Server.mount`. The empty prefix mounts
+    the root of the server, replacing the directory it was started with, see
+    :meth:`teachbooks.serve.Server.set_servedir`. The file is re-read whenever
+    it is replaced, so books can be mounted and unmounted while the server
+    runs.
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self._stamp = None
+        self._mounts: list[tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def mounts(self) -> list[tuple[str, str]]:
+        """Prefixes and directories, longest prefix first."""
+        try:
+            st = os.stat(self.path)
+            stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stamp = None
+        with self._lock:
+            if stamp != self._stamp:
+                try:
+                    with open(self.path, encoding="utf8") as f:
+                        mounts = json.load(f)
+                except FileNotFoundError:
+                    mounts = {}
+                except ValueError:
+                    # Keep serving the previous mounts
+                    return self._mounts
+                self._mounts = sorted(mounts.items(), key=lambda item: -len(item[0]))
+                self._stamp = stamp
+            return self._mounts
+
+    @property
+    def root(self) -> str | None:
+        """Directory mounted at the root, if any."""
+        mounts = self.mounts
+        return mounts[-1][1] if mounts and mounts[-1][0] == "" else None
+
+    def resolve(self, url_path: str) -> tuple[str, str] | None:
+        """Directory serving a request path, and the path within it.
+
+        Returns None if the path is not below any mount.
+        """
+        path = re.split(r"[?#]", url_path, maxsplit=1)[0]
+        for prefix, directory in self.mounts:
+            if not prefix:
+                return directory, url_path
+            base = "/" + prefix
+            if path == base or path.startswith(base + "/"):
+                return directory, url_path[len(base):]
+        return None
+
+
+@lru_cache(maxsize=16384)
+def file_etag(path: str, dev: int, ino: int, mtime_ns: int, size: int) -> str:
+    """Strong ETag for a file, derived from its content.
+
+    Cached in memory on the file's identity and modification time, so each
+    version of a file is only hashed once.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return f'"{digest.hexdigest()}"'
+
+
+class BookRequestHandler(SimpleHTTPRequestHandler):
+    """Serve a book, optionally with a live-reload event stream."""
+    protocol_version = "HTTP/1.1"
+    # Headers and body are sent separately; avoid Nagle/delayed-ACK stalls
+    disable_nagle_algorithm = True
+    #: Seconds an idle keep-alive connection is kept open
+    timeout = 5
+    #: Set to enable live reload
+    tracker: ChangeTracker | None = None
+    #: Set to serve books under URL prefixes
+    mounts: MountTable | None = None
+    #: Seconds between keep-alive comments on the event stream
+    heartbeat = 15.0
+
+    def do_GET(self):
+        if self.tracker is not None and self.path == LIVERELOAD_PATH:
+            self._send_events()
+        else:
+            super().do_GET()
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.split("?", 1)[0].endswith("/"):
+            for index in "index.html", "index.htm":
+                if os.path.isfile(os.path.join(path, index)):
+                    path = os.path.join(path, index)
+                    break
+        if not os.path.isfile(path):
+            # Redirects, directory listings and errors
+            return super().send_head()
+
+        if self.tracker is not None and path.endswith((".html", ".htm")):
+            return self._send_html(path)
+        for encoding in negotiate(self.headers.get("Accept-Encoding")):
+            encoded_path = path + ENCODINGS[encoding]
+            try:
+                if is_fresh(os.stat(path), os.stat(encoded_path)):
+                    return self._send_file(encoded_path, self.guess_type(path), encoding)
+            except OSError:
+                # No precompressed sibling
+                continue
+        return self._send_file(path, self.guess_type(path))
+
+    def translate_path(self, path):
+        mount = self.mounts.resolve(path) if self.mounts is not None else None
+        if mount is None:
+            return super().translate_path(path)
+        # Handlers serve one request at a time; swap the directory for this one
+        directory, path = mount
+        root = self.directory
+        self.directory = directory
+        try:
+            return super().translate_path(path)
+        finally:
+            self.directory = root
+
+    def copyfile(self, source, outputfile):
+        """Copy a file to the client with sendfile where possible."""
+        if isinstance(source, io.BufferedReader):
+            # Headers are already flushed by end_headers
+            self.connection.sendfile(source)
+        else:
+            super().copyfile(source, outputfile)
+
+    def log_message(self, format, *args):
+        # Server discards stderr; skip formatting a log line per request
+        pass
+
+    def _send_file(self, path: str, content_type: str, encoding: str | None = None):
+        """Send headers for a file, or a 304 response if the client has it."""
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        try:
+            fs = os.fstat(f.fileno())
+            etag = file_etag(path, fs.st_dev, fs.st_ino, fs.st_mtime_ns, fs.st_size)
+            if not self._send_validators(etag, fs.st_mtime):
+                f.close()
+                return None
+            self.send_header("Content-Type", content_type)
+            if encoding is not None:
+                self.send_header("Content-Encoding", encoding)
+            self.send_header("Content-Length", str(fs.st_size))
+            self.end_headers()
+            return f
+        except:
+            f.close()
+            raise
+
+    def _send_html(self, path: str) -> io.BytesIO | None:
+        """Send headers for an HTML page with the live-reload client injected."""
+        with open(path, "rb") as f:
+            fs = os.fstat(f.fileno())
+            content = f.read()
+        # Differs from the file's own ETag: the bytes sent are different
+        etag = file_etag(path, fs.st_dev, fs.st_ino, fs.st_mtime_ns, fs.st_size)[:-1] + '-lr"'
+        if not self._send_validators(etag, fs.st_mtime):
+            return None
+
+        script = LIVERELOAD_SCRIPT.encode("utf8")
+        matches = list(_BODY_END.finditer(content))
+        if matches:
+            at = matches[-1].start()
+            content = content[:at] + script + content[at:]
+        else:
+            content += script
+
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        return io.BytesIO(content)
+
+    def _send_validators(self, etag: str, mtime: float) -> bool:
+        """Start a response with caching headers.
+
+        Sends a complete 304 response and returns False if the client's copy,
+        identified by If-None-Match or else If-Modified-Since, is current.
+        Otherwise sends the 200 status line and validators and returns True;
+        the caller adds the remaining headers.
+        """
+        if self._not_modified(etag, mtime):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._send_cache_headers(etag, mtime)
+            self.end_headers()
+            return False
+        self.send_response(HTTPStatus.OK)
+        self._send_cache_headers(etag, mtime)
+        return True
+
+    def _send_cache_headers(self, etag: str, mtime: float) -> None:
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.date_time_string(mtime))
+        self.send_header("Cache-Control", self._cache_control())
+        self.send_header("Vary", "Accept-Encoding")
+
+    def _not_modified(self, etag: str, mtime: float) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            # If-Modified-Since is ignored when If-None-Match is present
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=datetime.timezone.utc)
+            return int(mtime) <= since.timestamp()
+        return False
+
+    def _cache_control(self) -> str:
+        """Cache-Control for the current request.
+
+        Sphinx and its themes reference static assets with a content checksum
+        in the query string (``style.css?v=1a2b3c``, ``?digest=...``). Those
+        URLs never change content and may be cached indefinitely. Everything
+        else, including HTML pages, is revalidated on each use, which costs a
+        304 response when unchanged.
+        """
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        if HASH_PARAMETERS.intersection(query):
+            return CACHE_IMMUTABLE
+        return CACHE_REVALIDATE
+
+    def _send_events(self) -> None:
+        """Stream server-sent events with changed pages until the client leaves
+        or the server stops."""
+        q = self.tracker.subscribe()
+        if not self.server.open_event_stream(q):
+            self.tracker.unsubscribe(q)
+            self.send_error(HTTPStatus.SERVICE_UNAVAILABLE, "Too many live-reload clients")
+            return
+        try:
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            # Events are sparse: do not time out between heartbeats
+            self.connection.settimeout(None)
+
+            self.wfile.write(b": connected\n\n")
+            self.wfile.flush()
+            while not self.server.stopping.is_set():
+                try:
+                    pages = q.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    message = ": ping\n\n"
+                else:
+                    if pages is None:
+                        # Put by the server when it stops
+                        break
+                    message = "event: reload\ndata: %s\n\n" % json.dumps({"pages": pages})
+                self.wfile.write(message.encode("utf8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.server.close_event_stream(q)
+            self.tracker.unsubscribe(q)
+
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """HTTP server handling connections in a fixed-size pool of threads.
+
+    Each connection occupies a worker for as long as it is kept alive, so
+    ``max_connections`` bounds the number of simultaneous clients. Further
+    connections wait in a queue until a worker is free. Live-reload event
+    streams never end on their own, so at most half of the workers serve them;
+    further streams are refused. Workers are daemon threads and event streams
+    end when the server shuts down, so open browser tabs do not keep the
+    process alive.
+    """
+
+    def __init__(self, *args, max_connections: int = MAX_CONNECTIONS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.max_connections = max_connections
+        self.max_event_streams = max(1, max_connections // 2)
+        #: Set when the server shuts down
+        self.stopping = threading.Event()
+        self._requests = queue.SimpleQueue()
+        self._workers = []
+        self._idle = threading.Semaphore(0)
+        self._streams = set()
+        self._streams_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        self._requests.put((request, client_address))
+        if not self._idle.acquire(blocking=False) and len(self._workers) < self.max_connections:
+            worker = threading.Thread(target=self._work, daemon=True,
+                                      name=f"teachbooks-httpd-{len(self._workers)}")
+            self._workers.append(worker)
+            worker.start()
+
+    def open_event_stream(self, q: queue.Queue) -> bool:
+        """Register the queue of an event stream; False if there are too many."""
+        with self._streams_lock:
+            if self.stopping.is_set() or len(self._streams) >= self.max_event_streams:
+                return False
+            self._streams.add(q)
+            return True
+
+    def close_event_stream(self, q: queue.Queue) -> None:
+        with self._streams_lock:
+            self._streams.discard(q)
+
+    def shutdown(self):
+        self._stop()
+        super().shutdown()
+
+    def server_close(self):
+        self._stop()
+        super().server_close()
+        for _ in self._workers:
+            self._requests.put(None)
+
+    def _stop(self) -> None:
+        self.stopping.set()
+        with self._streams_lock:
+            for q in self._streams:
+                q.put(None)
+
+    def _work(self) -> None:
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            request, client_address = item
+            if self.stopping.is_set():
+                self.shutdown_request(request)
+            else:
+                self.process_request_thread(request, client_address)
+            self._idle.release()
+
+
+def make_server(port: int,
+                directory: Path | str = ".",
+                livereload: bool = False,
+                bind: str = "",
+                max_connections: int = MAX_CONNECTIONS,
+                fd: int | None = None,
+                mounts: Path | str | None = None) -> PooledHTTPServer:
+    """Create (but do not start) a server for a directory.
+
+    Parameters
+    ----------
+    port : int
+        Port to listen on; 0 picks a free port.
+    directory : Path | str, optional
+        Directory to serve, by default the current directory.
+    livereload : bool, optional
+        Inject a live-reload client into HTML pages and track changes, by
+        default False. The tracker is polled by a daemon thread.
+    bind : str, optional
+        Address to bind to, by default all interfaces, over IPv6 and IPv4
+        where the system supports it.
+    max_connections : int, optional
+        Number of connections handled concurrently, by default 64. Open
+        live-reload streams count as connections and may take up to half.
+    fd : int | None, optional
+        File descriptor of a bound, listening socket to serve on instead of
+        binding ``bind`` and ``port``, by default None. This lets a parent
+        process reserve the port and hand over the socket, without a window in
+        which another process can take the port.
+    mounts : Path | str | None, optional
+        JSON file with books to serve under URL prefixes, see
+        :class:`MountTable`, by default None. Live reload only covers
+        ``directory``, or the directory mounted at the root.
+
+    Returns
+    -------
+    PooledHTTPServer
+        Server ready for ``serve_forever``.
+    """
+    attrs = {}
+    if mounts is not None:
+        attrs["mounts"] = MountTable(mounts)
+    if livereload:
+        tracker = ChangeTracker(directory)
+        root = (lambda: attrs["mounts"].root) if mounts is not None else None
+        threading.Thread(target=tracker.run, args=(root,), daemon=True).start()
+        attrs["tracker"] = tracker
+    handler = type("Handler", (BookRequestHandler,), attrs)
+    if fd is None and not bind and socket.has_dualstack_ipv6():
+        # Like http.server, accept IPv6 and IPv4 clients on all interfaces
+        fd = socket.create_server(("", port), family=socket.AF_INET6,
+                                  dualstack_ipv6=True).detach()
+    server = PooledHTTPServer((bind, port),
+                              partial(handler, directory=os.fspath(directory)),
+                              max_connections=max_connections,
+                              bind_and_activate=fd is None)
+    if fd is not None:
+        server.socket.close()
+        server.socket = socket.socket(fileno=fd)
+        server.server_address = server.socket.getsockname()
+        host, port = server.server_address[:2]
+        server.server_name = socket.getfqdn(host)
+        server.server_port = port
+    return server
+
+
+def listen_fd(fd: int | None = None) -> int | None:
+    """File descriptor of an inherited listening socket, if any.
+
+    An explicit ``fd`` wins; otherwise the systemd socket activation protocol
+    is honoured: ``LISTEN_FDS`` sockets starting at file descriptor 3, passed
+    to the process with id ``LISTEN_PID``.
+    """
+    if fd is not None:
+        return fd
+    if (os.environ.get("LISTEN_PID") == str(os.getpid())
+            and int(os.environ.get("LISTEN_FDS", "0")) > 0):
+        return SD_LISTEN_FDS_START
+    return None
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m teachbooks.httpd",
+                                     description="Serve a book directory.")
+    parser.add_argument("port", type=int, nargs="?", default=0)
+    parser.add_argument("--directory", "-d", default=os.getcwd())
+    parser.add_argument("--bind", "-b", default="")
+    parser.add_argument("--livereload", action="store_true")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS)
+    parser.add_argument("--fd", type=int, default=None,
+                        help="serve on this inherited listening socket")
+    parser.add_argument("--mounts", default=None,
+                        help="JSON file mapping URL prefixes to directories")
+    args = parser.parse_args(argv)
+
+    with make_server(args.port, args.directory, args.livereload, args.bind,
+                     args.max_connections, fd=listen_fd(args.fd),
+                     mounts=args.mounts) as httpd:
+        # Readiness signal for Server.start, same as python -m http.server
+        host, port = httpd.socket.getsockname()[:2]
+        url_host = f"[{host}]" if ":" in host else host
+        print(f"Serving HTTP on {host} port {port} (http://{url_host}:{port}/) ...",
+              flush=True)
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
 # -*- coding:Utf-8 -*-
 from __future__ import unicode_literals
 
+import hashlib
+import os
+import pickle
 import re
+import tempfile
+from collections import OrderedDict
+
 import six
 
 from pybtex.plugin import find_plugin
+from pybtex.style import FormattedEntry
 from pybtex.style.formatting import BaseStyle, toplevel
 from pybtex.style.template import (
     field, first_of, href, join, optional, optional_field, sentence, tag,
@@ -16,6 +23,169 @@ from pybtex.richtext import Text, Symbol
 
 firstlast = find_plugin('pybtex.style.names', 'lastfirst')()
 
+
+class NameCache(object):
+    """
+    Bounded least-recently-used cache of formatted person names.
+
+    Names are keyed on the name style, the abbreviation flag and the parts
+    of the name, so the same author appearing in many entries is formatted
+    once per build. ``maxsize=0`` disables caching.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._names = OrderedDict()
+
+    def format(self, name_style, person, abbr=False):
+        """
+        Return the formatted name of a person as rich text.
+        """
+        key = (type(name_style), abbr,
+               tuple(person.first_names), tuple(person.middle_names),
+               tuple(person.prelast_names), tuple(person.last_names),
+               tuple(person.lineage_names))
+        try:
+            text = self._names[key]
+        except KeyError:
+            self.misses += 1
+            text = name_style.format(person, abbr).format()
+            if self.maxsize > 0:
+                self._names[key] = text
+                if len(self._names) > self.maxsize:
+                    self._names.popitem(last=False)
+        else:
+            self.hits += 1
+            self._names.move_to_end(key)
+        return text
+
+    def clear(self):
+        self._names.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+#: Shared by all entries and styles of a build
+name_cache = NameCache()
+
+
+def _plugin_version():
+    try:
+        from importlib.metadata import version
+        return version('teachbooks')
+    except Exception:
+        return 'unknown'
+
+
+class ReferenceCache(object):
+    """
+    Formatted references, keyed on everything that goes into formatting them.
+
+    The key of an entry covers its type, fields and persons, and the style
+    name, label style, name style, abbreviation flag and TeachBooks version.
+    An unchanged entry is therefore only formatted once, also across builds
+    when the cache is loaded from and saved to a file (see
+    :func:`teachbooks.bibliography.reference_cache`). Entries that
+    cross-reference others are not cached. At most ``maxsize`` references
+    are saved, those used since loading first; ``maxsize=0`` disables
+    caching.
+    """
+
+    #: Changes whenever the layout of the cache file changes
+    version = 1
+
+    def __init__(self, maxsize=20000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.changed = False
+        self._texts = {}
+        self._used = set()
+        self._plugin_version = _plugin_version()
+
+    def key(self, style, entry):
+        """
+        Return the cache key of an entry formatted with a style, or None if
+        the entry cannot be cached.
+        """
+        if 'crossref' in entry.fields:
+            return None
+        parts = [
+            self.version, self._plugin_version, style.name,
+            _plugin_name(style.label_style), _plugin_name(style.name_style),
+            style.abbreviate_names, entry.type,
+            sorted((name.lower(), value) for name, value in entry.fields.items()),
+            sorted((role.lower(), [six.text_type(person) for person in persons])
+                   for role, persons in entry.persons.items()),
+        ]
+        return hashlib.sha256(repr(parts).encode('utf8')).hexdigest()
+
+    def get(self, key):
+        try:
+            text = self._texts[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used.add(key)
+        return text
+
+    def put(self, key, text):
+        if self.maxsize <= 0:
+            return
+        self._texts[key] = text
+        self._used.add(key)
+        self.changed = True
+
+    def load(self, path):
+        """
+        Replace the cached references with those saved in a file. The cache
+        is emptied if the file cannot be read or was saved by another
+        version.
+        """
+        try:
+            with open(path, 'rb') as f:
+                version, texts = pickle.load(f)
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError,
+                AttributeError, ImportError):
+            version, texts = None, {}
+        if version != (self.version, self._plugin_version):
+            texts = {}
+        self._texts = texts
+        self._used = set()
+        self.changed = False
+
+    def save(self, path):
+        """
+        Write the cached references to a file, atomically.
+        """
+        keys = sorted(self._texts, key=lambda key: key not in self._used)
+        texts = dict((key, self._texts[key]) for key in keys[:self.maxsize])
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(((self.version, self._plugin_version), texts), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.changed = False
+
+
+def _plugin_name(plugin):
+    cls = type(plugin)
+    return '{}.{}'.format(cls.__module__, cls.__name__)
+
+
+#: Formatted references of all APA styles in this process
+reference_cache = ReferenceCache()
+
 if six.PY2:
     def format_pages(text):
         dash_re = re.compile(r'-+')
@@ -53,13 +223,13 @@ def apa_names(children, context, role, **kwargs):
 
     if len(persons) > 7:
         persons = persons[:6] + persons[-1:]
-        formatted_names = [style.format_name(
-            person, style.abbreviate_names) for person in persons]
+        formatted_names = [name_cache.format(
+            style.name_style, person, style.abbreviate_names) for person in persons]
         return join(sep=', ', last_sep=', … ')[
             formatted_names].format_data(context)
     else:
-        formatted_names = [style.format_name(
-            person, style.abbreviate_names) for person in persons]
+        formatted_names = [name_cache.format(
+            style.name_style, person, style.abbreviate_names) for person in persons]
         return join(sep=', ', sep2=', & ', last_sep=', & ')[
             formatted_names].format_data(context)
 
@@ -77,7 +247,7 @@ def editor_names(children, context, with_suffix=True, **kwargs):
         raise FieldIsMissing('editor', context['entry'])
 
     formatted_names = [
-        firstlast.format(editor, True) for editor in editors]
+        name_cache.format(firstlast, editor, True) for editor in editors]
 
     if with_suffix:
         return words[
@@ -99,6 +269,56 @@ class APAStyle(BaseStyle):
     def __init__(self, *args, **kwargs):
         super(APAStyle, self).__init__(*args, **kwargs)
         self.abbreviate_names = True
+        self._templates = {}
+
+    def format_entry(self, label, entry, bib_data=None):
+        """
+        Format an entry, or take it from the :data:`reference_cache`.
+
+        Entries are formatted with the template of their variant, built on
+        first use.
+        """
+        cache_key = reference_cache.key(self, entry)
+        text = reference_cache.get(cache_key) if cache_key else None
+        if text is None:
+            text = self._format_text(entry, bib_data)
+            if cache_key:
+                reference_cache.put(cache_key, text)
+        return FormattedEntry(entry.key, text, label)
+
+    def _format_text(self, entry, bib_data):
+        key = self.template_variant(entry)
+        try:
+            template = self._templates[key]
+        except KeyError:
+            get_template = getattr(
+                self, 'get_{}_template'.format(entry.type), None)
+            if get_template is None:
+                return super(APAStyle, self).format_entry(
+                    None, entry, bib_data=bib_data).text
+            template = self._templates[key] = get_template(entry)
+        context = {
+            'entry': entry,
+            'style': self,
+            'bib_data': bib_data,
+        }
+        return template.format_data(context)
+
+    def template_variant(self, e):
+        """
+        Return the key of the template for an entry.
+
+        Templates are reused for all entries with the same key, so it covers
+        everything the ``get_*_template`` methods look at besides fields
+        resolved by the template itself: the entry type, whether there are
+        authors and editors, and whether there is more than one editor.
+        """
+        return (
+            e.type,
+            'author' in e.persons,
+            'editor' in e.persons,
+            len(e.persons.get('editor', ())) > 1,
+        )
 
     def format_names(self, role, as_sentence=True):
         formatted_names = apa_names(role)
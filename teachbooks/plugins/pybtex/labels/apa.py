@@ -1,17 +1,19 @@
 # -*- coding:Utf-8 -*-
 from __future__ import unicode_literals
 
-from collections import Counter
 import re
 import unicodedata
+from functools import lru_cache
 
 from pybtex.style.labels import BaseLabelStyle
 
 
-_nonalnum_pattern = re.compile('[^A-Za-z0-9 \-]+', re.UNICODE)
+_nonalnum_pattern = re.compile(r'[^A-Za-z0-9 \-]+', re.UNICODE)
 
 
 def _strip_accents(s):
+    if s.isascii():
+        return s
     return "".join(
         (c for c in unicodedata.normalize('NFD', s)
             if not unicodedata.combining(c)))
@@ -27,17 +29,52 @@ def _strip_nonalnum(parts):
     return _nonalnum_pattern.sub("", _strip_accents(s))
 
 
+@lru_cache(maxsize=4096)
+def _surname(last_names):
+    """Normalized surname, cached as the same authors recur across entries.
+
+    >>> print(_surname(("Müller",)))
+    Muller
+    """
+    return _strip_nonalnum(last_names)
+
+
+def _suffix(label, index):
+    """Add the disambiguation suffix for the index-th entry with a label.
+
+    >>> print(_suffix("Smith, 2020", 1), _suffix("Smith, n.d.", 0), _suffix("Smith, 2020", 26))
+    Smith, 2020b Smith, n.d.-a Smith, 2020aa
+    """
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord('a') + rest) + letters
+    return label + ("-" if label.endswith("n.d.") else "") + letters
+
+
 class APALabelStyle(BaseLabelStyle):
     def format_labels(self, sorted_entries):
-        labels = [self.format_label(entry) for entry in sorted_entries]
-        count = Counter(labels)
-        counted = Counter()
-        for label in labels:
-            if count[label] == 1:
-                yield label
+        """Format the labels of entries in reference list order.
+
+        Entries with the same authors and year get APA suffixes in one pass:
+        when a label repeats, its first occurrence becomes "Smith, 2020a" and
+        later ones "Smith, 2020b", "Smith, 2020c", ...
+        """
+        labels = []
+        seen = {}
+        for entry in sorted_entries:
+            label = self.format_label(entry)
+            indices = seen.get(label)
+            if indices is None:
+                seen[label] = [len(labels)]
             else:
-                yield label # + chr(ord('a') + counted[label])
-                # counted.update([label])
+                if len(indices) == 1:
+                    labels[indices[0]] = _suffix(label, 0)
+                indices.append(len(labels))
+                label = _suffix(label, len(indices) - 1)
+            labels.append(label)
+        return labels
 
     def format_label(self, entry):
         label = "Anonymous"
@@ -56,12 +93,12 @@ class APALabelStyle(BaseLabelStyle):
             return "{}, n.d.".format(label)
 
     def format_author_or_editor_names(self, persons):
-        if len(persons) is 1:
-            return _strip_nonalnum(persons[0].last_names)
-        elif len(persons) is 2:
+        if len(persons) == 1:
+            return _surname(tuple(persons[0].last_names))
+        elif len(persons) == 2:
             return "{} & {}".format(
-                _strip_nonalnum(persons[0].last_names),
-                _strip_nonalnum(persons[1].last_names))
+                _surname(tuple(persons[0].last_names)),
+                _surname(tuple(persons[1].last_names)))
         else:
             return "{} et al.".format(
-                _strip_nonalnum(persons[0].last_names))
+                _surname(tuple(persons[0].last_names)))
@@ -0,0 +1,171 @@
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+#: Reports are written to this directory in the book's work directory
+PROFILE_DIR = "profile"
+#: Profilers that can capture call stacks of a build
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+@dataclass
+class BuildProfile:
+    """Timings of one build, collected by :func:`teachbooks.build.build_book`.
+
+    ``phases`` holds the wall time of each pipeline step in seconds, in the
+    order they ran. ``documents`` holds the seconds Sphinx spent reading
+    (parsing, including notebook execution) and writing each document. Only
+    serial Sphinx builds report documents; parallel workers run in separate
+    processes.
+    """
+    phases: dict[str, float] = field(default_factory=dict)
+    documents: dict[str, dict[str, float]] = field(default_factory=dict)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the body of the ``with`` block as phase ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    @contextmanager
+    def track_documents(self) -> Iterator[None]:
+        """Record per-document read and write times of Jupyter Book builds in
+        this context.
+
+        Like :func:`teachbooks.build.sphinx_jobs`, the Sphinx application
+        created by Jupyter Book is swapped for a subclass; its builder's
+        ``read_doc`` and ``write_doc`` are timed.
+        """
+        import jupyter_book.sphinx as jb_sphinx
+
+        original = jb_sphinx.Sphinx
+        profile = self
+
+        class ProfiledSphinx(original):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                builder = self.builder
+                builder.read_doc = profile._timed(builder.read_doc, "read")
+                builder.write_doc = profile._timed(builder.write_doc, "write")
+
+        jb_sphinx.Sphinx = ProfiledSphinx
+        try:
+            yield
+        finally:
+            jb_sphinx.Sphinx = original
+
+    def _timed(self, method, kind: str):
+        def timed(docname, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(docname, *args, **kwargs)
+            finally:
+                times = self.documents.setdefault(docname, {"read": 0.0, "write": 0.0})
+                times[kind] += time.perf_counter() - start
+        return timed
+
+    def slowest_documents(self, top: int = 10) -> list[tuple[str, float, float]]:
+        """Documents with the largest read plus write time.
+
+        Returns
+        -------
+        list[tuple[str, float, float]]
+            Document name, read seconds and write seconds, slowest first.
+        """
+        items = [(name, t["read"], t["write"]) for name, t in self.documents.items()]
+        return sorted(items, key=lambda item: -(item[1] + item[2]))[:top]
+
+    def save(self, directory: Path | str, path: Path | str | None = None) -> Path:
+        """Write the profile as JSON to a new, timestamped file in ``directory``.
+
+        Parameters
+        ----------
+        directory : Path | str
+            Directory of the reports.
+        path : Path | str | None, optional
+            Report file reserved earlier with :func:`report_path`, by default
+            a new one in ``directory``.
+
+        Returns
+        -------
+        Path
+            The written report.
+        """
+        path = Path(path) if path is not None else report_path(directory)
+        report = {
+            "created": time.time(),
+            "total": sum(self.phases.values()),
+            "phases": self.phases,
+            "documents": self.documents,
+        }
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(report, f, indent=2)
+        return path
+
+
+def report_path(directory: Path | str) -> Path:
+    """Reserve a new report file, ``profile-<date>-<time>.json`` in ``directory``.
+
+    The time has microseconds, and a counter is added if the file exists, so
+    builds never overwrite each other's reports. Files of profilers that
+    belong to the report can be named after it, see :func:`capture_calls`.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = datetime.now().strftime("profile-%Y%m%d-%H%M%S-%f")
+    for n in range(1000):
+        path = directory / (f"{stem}.json" if n == 0 else f"{stem}-{n}.json")
+        try:
+            open(path, "x").close()
+        except FileExistsError:
+            continue
+        return path
+    raise FileExistsError(f"Cannot create a new report in {directory}")
+
+
+@contextmanager
+def capture_calls(profiler: str, output: Path) -> Iterator[None]:
+    """Profile the calls made in this context with cProfile or pyinstrument.
+
+    cProfile statistics are written to ``output`` with suffix ``.prof`` (open
+    with ``python -m pstats`` or snakeviz); pyinstrument writes an ``.html``
+    report.
+
+    Raises
+    ------
+    ValueError
+        If the profiler is unknown.
+    ImportError
+        If pyinstrument is requested but not installed.
+    """
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if profiler == "cprofile":
+        import cProfile
+
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(output.with_suffix(".prof"))
+    elif profiler == "pyinstrument":
+        from pyinstrument import Profiler
+
+        prof = Profiler()
+        prof.start()
+        try:
+            yield
+        finally:
+            prof.stop()
+            output.with_suffix(".html").write_text(prof.output_html(), encoding="utf8")
+    else:
+        raise ValueError(f"Unknown profiler {profiler!r}, choose from {PROFILERS}")
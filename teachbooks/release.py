@@ -1,26 +1,73 @@
 import re
 import os
+import json
+import stat
+import shutil
+import hashlib
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterable, Iterator
+
+MANIFEST = "manifest.json"
+
+_START_MARKER = re.compile(r"# START REMOVE-FROM-(PUBLISH|RELEASE)")
+_END_MARKER = re.compile(r"# END REMOVE-FROM-(PUBLISH|RELEASE)")
+_SYNC_IGNORE = {"__pycache__"}
+
+
+class ReleaseMarkerError(ValueError):
+    """Unbalanced or nested REMOVE-FROM-PUBLISH/RELEASE markers"""
+    pass
 
 
 def make_release(sourcedir: Path) -> tuple[Path, Path]:
-    """Pre-process files in a Jupyter Book directory"""
+    """Pre-process files in a Jupyter Book directory
+
+    A manifest with content hashes is kept next to the cleaned-up files. Files
+    are only rewritten when their content changes, so unchanged files keep their
+    modification time and Sphinx can reuse its environment.
+    """
     # Make hidden directory that will contain the cleaned-up files
     workdir = sourcedir.joinpath(".teachbooks", "release")
 
     if not os.path.exists(workdir):
         os.makedirs(workdir)
 
+    manifest = _load_manifest(workdir)
+
     for file in ["_config.yml", "_toc.yml"]:
-        clean_yaml(
-            sourcedir.joinpath(file),
-            workdir.joinpath(file)
-        )
+        path_source = sourcedir.joinpath(file)
+        path_output = workdir.joinpath(file)
+        source_hash = _hash_file(path_source)
+
+        entry = manifest.get(file, {})
+        if (entry.get("source") == source_hash
+                and path_output.exists()
+                and _hash_file(path_output) == entry.get("output")):
+            continue
+
+        with open(path_source, mode="r", encoding="utf8") as f:
+            output_hash = _write_if_changed(
+                path_output,
+                remove_release_sections(f, source=str(path_source))
+            )
+
+        manifest[file] = {
+            "source": source_hash,
+            "output": output_hash,
+        }
+
+    _save_manifest(workdir, manifest)
 
     return workdir.joinpath("_config.yml"), workdir.joinpath("_toc.yml")
 
-def copy_ext(sourcedir: Path) -> None:
-    """Copy _ext/ to support APA in release [TEMPORARY]"""
+def copy_ext(sourcedir: Path, hardlink: bool = True) -> None:
+    """Copy _ext/ to support APA in release [TEMPORARY]
+
+    Only files that changed since the previous build are transferred, see
+    :func:`sync_tree`. Files are hardlinked where possible, unless ``hardlink``
+    is False.
+    """
     # Make hidden directory that will contain the cleaned-up files
     ext_dir = sourcedir.joinpath("_ext")
     workdir = sourcedir.joinpath(".teachbooks", "release")
@@ -29,18 +76,143 @@ def copy_ext(sourcedir: Path) -> None:
         os.makedirs(workdir)
 
     try:
-        for root, dirs, files in os.walk(ext_dir):
-            for dir in dirs:
-                os.makedirs(workdir.joinpath("_ext", Path(root).relative_to(ext_dir).joinpath(dir)), exist_ok=True)
-            for file in files:
-                src_file = Path(root).joinpath(file)
-                dest_file = workdir.joinpath("_ext", Path(root).relative_to(ext_dir).joinpath(file))
-                os.makedirs(dest_file.parent, exist_ok=True)
-                with open(src_file, 'rb') as fsrc, open(dest_file, 'wb') as fdst:
-                    fdst.write(fsrc.read())
-        print("Copied _ext/ directory successfully.")
-    except:
-        print("Error copying _ext/ directory.")
+        result = sync_tree(ext_dir, workdir.joinpath("_ext"), hardlink=hardlink)
+        print(f"Synced _ext/ directory successfully "
+              f"({result.copied} copied, {result.skipped} unchanged, {result.removed} removed).")
+    except OSError as exc:
+        print(f"Error copying _ext/ directory: {exc}")
+
+@dataclass
+class SyncResult:
+    """Number of files handled by :func:`sync_tree`"""
+    copied: int = 0
+    skipped: int = 0
+    removed: int = 0
+
+def sync_tree(source: Path, destination: Path, hardlink: bool = False) -> SyncResult:
+    """Make destination a mirror of source, transferring only changed files
+
+    A file is unchanged if size and modification time match. When only the
+    modification time differs, the contents are compared by hash before copying.
+    Changed files are hardlinked (if ``hardlink`` is set and the filesystem allows
+    it) or copied with ``os.copy_file_range``, which avoids moving the data
+    through Python and can create reflinks on filesystems that support them.
+    Files and directories no longer present in source are removed. ``__pycache__``
+    directories are left alone on both sides.
+
+    Parameters
+    ----------
+    source : Path
+        Directory to copy from.
+    destination : Path
+        Directory to copy to; created if it does not exist.
+    hardlink : bool, optional
+        Hardlink files instead of copying them, by default False.
+
+    Returns
+    -------
+    SyncResult
+        Number of copied, skipped and removed files.
+    """
+    source, destination = Path(source), Path(destination)
+    result = SyncResult()
+    seen = set()
+
+    for root, dirs, files in os.walk(source):
+        dirs[:] = [dir for dir in dirs if dir not in _SYNC_IGNORE]
+        rel_root = Path(root).relative_to(source)
+        dest_root = destination.joinpath(rel_root)
+        if dest_root.is_file() or dest_root.is_symlink():
+            os.remove(dest_root)
+        os.makedirs(dest_root, exist_ok=True)
+
+        seen.update(rel_root.joinpath(dir) for dir in dirs)
+        for file in files:
+            seen.add(rel_root.joinpath(file))
+            src_file = Path(root).joinpath(file)
+            dest_file = dest_root.joinpath(file)
+            if _is_unchanged(src_file, dest_file):
+                result.skipped += 1
+            else:
+                _transfer_file(src_file, dest_file, hardlink)
+                result.copied += 1
+
+    # Bottom-up, so directories are empty by the time they are checked
+    for root, dirs, files in os.walk(destination, topdown=False):
+        rel_root = Path(root).relative_to(destination)
+        if _SYNC_IGNORE.intersection(rel_root.parts):
+            continue
+        for file in files:
+            if rel_root.joinpath(file) not in seen:
+                os.remove(Path(root).joinpath(file))
+                result.removed += 1
+        for dir in dirs:
+            path_dir = Path(root).joinpath(dir)
+            if dir in _SYNC_IGNORE or rel_root.joinpath(dir) in seen:
+                continue
+            if path_dir.is_symlink():
+                os.remove(path_dir)
+            else:
+                os.rmdir(path_dir)
+
+    return result
+
+def _is_unchanged(src_file: Path, dest_file: Path) -> bool:
+    """Check if dest_file has the same contents as src_file"""
+    try:
+        dest_stat = os.stat(dest_file)
+    except FileNotFoundError:
+        return False
+    src_stat = os.stat(src_file)
+    if src_stat.st_size != dest_stat.st_size or not stat.S_ISREG(dest_stat.st_mode):
+        return False
+    if src_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+        return True
+    # Same size but touched: compare contents, and adopt the modification time
+    # if they match so the next comparison is cheap again.
+    if _hash_file(src_file) == _hash_file(dest_file):
+        os.utime(dest_file, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+        return True
+    return False
+
+def _transfer_file(src_file: Path, dest_file: Path, hardlink: bool) -> None:
+    """Hardlink or copy src_file to dest_file, preserving the modification time"""
+    # Never write through an existing file: it may be a hardlink to the source
+    if dest_file.is_dir() and not dest_file.is_symlink():
+        shutil.rmtree(dest_file)
+    elif os.path.lexists(dest_file):
+        os.remove(dest_file)
+
+    if hardlink:
+        try:
+            os.link(src_file, dest_file)
+            return
+        except OSError:
+            # e.g. across filesystems or not supported: fall back to copying
+            pass
+
+    src_stat = os.stat(src_file)
+    if not _copy_file_range(src_file, dest_file, src_stat.st_size):
+        # Uses sendfile (Linux) or fcopyfile (macOS) where available
+        shutil.copyfile(src_file, dest_file)
+    os.utime(dest_file, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+
+def _copy_file_range(src_file: Path, dest_file: Path, size: int) -> bool:
+    """Copy using os.copy_file_range, returning False if that is not possible"""
+    if not hasattr(os, "copy_file_range"):
+        return False
+    copied = 0
+    with open(src_file, "rb") as fsrc, open(dest_file, "wb") as fdst:
+        try:
+            while copied < size:
+                n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError:
+            # e.g. EXDEV on older kernels, ENOSYS or an unsupported filesystem
+            return False
+    return True
 
 def clean_yaml(path_source: str | Path, path_output: str | Path) -> None:
     """Removes sections marked with # <START|END> REMOVE-FROM-PUBLISH or REMOVE-FROM-RELEASE from a yaml file
@@ -61,17 +233,149 @@ def clean_yaml(path_source: str | Path, path_output: str | Path) -> None:
         # END REMOVE-FROM-RELEASE
         - file: subdirectory_2/intro_page
 
+    The file is processed line by line, see :func:`remove_release_sections`.
+    The output file is only written when its content changes.
+
+    Raises
+    ------
+    ReleaseMarkerError
+        If the START and END markers are unbalanced or nested.
     """
 
     with open(path_source, mode="r", encoding="utf8") as f:
-        yaml_source = f.read()
+        _write_if_changed(
+            Path(path_output),
+            remove_release_sections(f, source=str(path_source))
+        )
+
+def remove_release_sections(lines: Iterable[str],
+                            source: str = "<string>") -> Iterator[str]:
+    """Stream lines with REMOVE-FROM-PUBLISH and REMOVE-FROM-RELEASE sections removed
+
+    Everything from a ``# START REMOVE-FROM-...`` marker up to and including the
+    next ``# END REMOVE-FROM-...`` marker is dropped; text before the START marker
+    and after the END marker on the same lines is kept. Works in a single pass
+    over ``lines`` and never holds more than one line in memory.
+
+    Parameters
+    ----------
+    lines : Iterable[str]
+        Lines of the yaml file, including line endings (e.g. an open file).
+    source : str, optional
+        Name of the input used in error messages, by default "<string>".
+
+    Yields
+    ------
+    str
+        Remaining pieces of the input, to be concatenated as-is.
+
+    Raises
+    ------
+    ReleaseMarkerError
+        On an END marker without START, a START marker inside a section or a
+        section that is not closed at the end of the input.
+    """
+    start_lineno = None
+    lineno = 0
+    for lineno, line in enumerate(lines, start=1):
+        # Fast path for the vast majority of lines
+        if "REMOVE-FROM-" not in line:
+            if start_lineno is None:
+                yield line
+            continue
 
-    # Regex to remove both PUBLISH and RELEASE tags
-    yaml_output = re.sub(
-        r"# START REMOVE-FROM-(PUBLISH|RELEASE)(.|\n)*?# END REMOVE-FROM-(PUBLISH|RELEASE)",
-        "",
-        yaml_source
-    )
+        pos = 0
+        while True:
+            start = _START_MARKER.search(line, pos)
+            end = _END_MARKER.search(line, pos)
+            if start_lineno is None:
+                if end and (start is None or end.start() < start.start()):
+                    raise ReleaseMarkerError(
+                        f"{source}:{lineno}: END REMOVE-FROM-{end.group(1)} "
+                        "without matching START marker")
+                if start is None:
+                    if line[pos:]:
+                        yield line[pos:]
+                    break
+                if start.start() > pos:
+                    yield line[pos:start.start()]
+                start_lineno = lineno
+                pos = start.end()
+            else:
+                if start and (end is None or start.start() < end.start()):
+                    raise ReleaseMarkerError(
+                        f"{source}:{lineno}: nested START REMOVE-FROM-{start.group(1)} "
+                        f"inside section started on line {start_lineno}")
+                if end is None:
+                    break
+                start_lineno = None
+                pos = end.end()
+
+    if start_lineno is not None:
+        raise ReleaseMarkerError(
+            f"{source}:{start_lineno}: START marker is never closed "
+            f"(reached end of file on line {lineno})")
+
+def _hash_file(path: Path) -> str | None:
+    """Return the SHA-256 hex digest of a file, or None if it does not exist"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+def _write_if_changed(path: Path, chunks: Iterable[str]) -> str:
+    """Stream chunks of text to path unless the file already has this content
+
+    The text is written to a temporary file next to ``path``, which then either
+    replaces ``path`` or is discarded if the content is unchanged. A failure
+    while producing the chunks leaves ``path`` untouched.
+
+    Returns the SHA-256 hex digest of the encoded text.
+    """
+    digest = hashlib.sha256()
+    path_tmp = path.with_name(path.name + ".tmp")
+
+    def flush(f, buffer: list[str]) -> None:
+        data = "".join(buffer).encode("utf8")
+        digest.update(data)
+        f.write(data)
+        buffer.clear()
+
+    try:
+        with open(path_tmp, "wb") as f:
+            # Batch small chunks (usually lines) into larger writes
+            buffer, size = [], 0
+            for chunk in chunks:
+                buffer.append(chunk)
+                size += len(chunk)
+                if size >= 1 << 16:
+                    flush(f, buffer)
+                    size = 0
+            flush(f, buffer)
+        if _hash_file(path) == digest.hexdigest():
+            os.remove(path_tmp)
+        else:
+            os.replace(path_tmp, path)
+    except BaseException:
+        if os.path.exists(path_tmp):
+            os.remove(path_tmp)
+        raise
+    return digest.hexdigest()
+
+def _load_manifest(workdir: Path) -> dict:
+    """Load the release manifest, returning an empty one if missing or unreadable"""
+    try:
+        with open(workdir.joinpath(MANIFEST), mode="r", encoding="utf8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
 
-    with open(path_output, mode="w", encoding="utf8") as f:
-        f.write(yaml_output)
+def _save_manifest(workdir: Path, manifest: dict) -> None:
+    """Save the release manifest if it changed"""
+    _write_if_changed(workdir.joinpath(MANIFEST),
+                      [json.dumps(manifest, indent=2, sort_keys=True)])
@@ -1,20 +1,21 @@
-import pickle
+import json
+import re
 import sys
 import os
 import socket
-import platform
-from subprocess import DEVNULL
+import threading
+from subprocess import DEVNULL, PIPE
 from pathlib import Path
 from typing import TypeVar
-from time import sleep
 
-import psutil
+from teachbooks.state import StateRegistry
 
-STATUS = {
-    "Linux": "sleeping",
-    "Darwin": "running",
-    "Windows": "running"
-}
+BACKENDS = ("http.server", "teachbooks")
+
+# URL prefixes for mounted books: one or more path segments
+_PREFIX = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9._-]*(/[A-Za-z0-9_-][A-Za-z0-9._-]*)*")
+# Server names, used in file names
+_NAME = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9._-]*")
 
 Server_t = TypeVar("Server_t", bound="Server")
 
@@ -26,13 +27,18 @@ class ServerError(Exception):
 
 class Server:
     """Class for managing a Python webserver in the background."""
-    statefile = "state.pickle"
+    #: State file of earlier versions, migrated on load
+    legacy_statefile = "state.pickle"
 
     def __init__(self,
                  servedir: Path | str,
                  workdir: Path | str,
                  port: int | None = None,
                  stdout: int | None = None,
+                 livereload: bool = False,
+                 backend: str = "teachbooks",
+                 max_connections: int | None = None,
+                 name: str = "default",
                  ) -> None:
         """Construct Server object
 
@@ -49,27 +55,63 @@ class Server:
             Verbosity level, by default None (prints summary info).
             - int={0, 1, 2, 3} for use with cli.
             - int=0 is silent; None is mixed, int>0.
+        livereload : bool, optional
+            Reload open browser tabs when pages they show change, by default
+            False. Requires the "teachbooks" backend, which is then selected.
+        backend : str, optional
+            Webserver to run, by default "teachbooks":
+            - "teachbooks" runs :mod:`teachbooks.httpd`, which keeps
+              connections alive, uses ``sendfile`` and handles
+              ``max_connections`` connections concurrently. On POSIX systems
+              the port is bound by this process and the listening socket is
+              inherited by the server, so concurrent starts never race for a
+              port.
+            - "http.server" runs ``python -m http.server``.
+        max_connections : int | None, optional
+            Concurrent connections for the "teachbooks" backend, by default
+            None (the backend default).
+        name : str, optional
+            Name of the server in the registry of ``workdir``, by default
+            "default". Servers with different names run side by side.
         """
-        self.stdout = stdout
-        # Check if workdir already contains a statefile.
+        if not _NAME.fullmatch(name):
+            raise ValueError(f"Invalid server name: {name!r}")
+        # Check if the registry in workdir already holds this server.
         try:
-            old_instance = self.load(workdir)
+            old_instance = self.load(workdir, name)
             self.__dict__ = old_instance.__dict__
         except ServerError:
+            self.name = name
             self.servedir = Path(servedir)
             self.workdir = Path(workdir)
             self.port = port
+            self.livereload = livereload
+            self.backend = "teachbooks" if livereload else backend
+            self.max_connections = max_connections
+
+            if self.backend not in BACKENDS:
+                raise ValueError(f"Unknown backend {backend!r}, choose from {BACKENDS}")
 
             self._pid = None
-            self._statepath = self.workdir / self.statefile
+            self._fd = None
 
             if not os.path.exists(self.workdir):
                 os.makedirs(self.workdir)
+        self.stdout = stdout
 
 
-    def start(self, options: list[str] = None) -> bool:
+    def start(self, options: list[str] = None, timeout: float = 10.0) -> bool:
         """Start server.
 
+        Returns as soon as the server reports that it is listening.
+
+        Parameters
+        ----------
+        options : list[str], optional
+            Extra arguments shown in the printed server command.
+        timeout : float, optional
+            Seconds to wait for the server to start listening, by default 10.
+
         Raises
         ------
         RuntimeError
@@ -78,24 +120,39 @@ class Server:
         if not self.servedir.is_dir():
             raise NotADirectoryError(f"Directory does not exist: {self.servedir}")
 
+        # Hold the registry lock until the new server is recorded, so
+        # concurrent starts cannot both spawn a server under this name
+        with self._registry.update() as servers:
+            record = servers.get(self.name)
+            registered = self._from_record(self.workdir, self.name, record) if record else None
+            if registered is not None and registered.is_running:
+                # Possibly started by another process since this one was loaded
+                stdout = self.stdout
+                self.__dict__ = registered.__dict__
+                self.stdout = stdout
+            if self.is_running:
+                if self.stdout is None or self.stdout > 0:
+                    print(f"Server already running:")
+                    print(f"  Serving directory: {self.servedir}")
+                    print(f"  Accessible at url: {self.url}")
+                servers[self.name] = self._record()
+                return
+
+            sock = None
+            if self._inherits_socket:
+                sock = self._listen(self.port)
+                self.port = sock.getsockname()[1]
+                self._fd = sock.fileno()
+            elif self.port is None:
+                self.port = self._find_port()
 
-        if self.port is None:
-            self.port = self._find_port()
-        
-        if self.is_running:
-            if self.stdout is None or self.stdout > 0:
-                print(f"Server already running:")
-                print(f"  Serving directory: {self.servedir}")
-                print(f"  Accessible at url: {self.url}")
-            return
-        else:
             if self.stdout is None or self.stdout > 0:
                 print(f"Starting server:")
                 print(f"  Directory: {self.servedir}")
                 print(f"  Port:      {self.port}")
                 print(f"  At url:    {self.url}")
 
-            base_command = [sys.executable, "-u", "-m", "http.server", str(self.port)]
+            base_command = [sys.executable] + self._command()
             if options:
                 base_command.extend(options)
 
@@ -104,42 +161,185 @@ class Server:
                 print("Starting server with this command:\n",
                       "  ".join(base_command))
 
-            proc = psutil.Popen([sys.executable, "-u", "-m", "http.server", str(self.port)],
+            import psutil
+
+            proc = psutil.Popen([sys.executable] + self._command(),
                                 cwd=self.servedir,
                                 stderr=DEVNULL,
-                                stdout=DEVNULL)
+                                stdout=PIPE,
+                                pass_fds=(sock.fileno(),) if sock else ())
 
             self._pid = proc.pid
 
-            sleep(0.2)
+            try:
+                self._wait_until_ready(proc, timeout)
+            except RuntimeError:
+                if proc.poll() is None:
+                    proc.terminate()
+                self._pid = None
+                raise
+            finally:
+                proc.stdout.close()
+                # The server holds its own copy of the listening socket
+                if sock:
+                    sock.close()
 
-            # Check if the subprocess is still running
-            if not self.is_running:
-                proc.terminate()
-                raise RuntimeError("Error launching the server. Perhaps a server is already running on the selected port?")
-            else:
-                self._save()
+            servers[self.name] = self._record()
 
 
     def stop(self, options: list[str] = None) -> None:
         """Stop server and clean up.
         """
-        try:
-            psutil.Process(pid=self._pid).terminate()
-        except psutil.NoSuchProcess:
-            pass
+        if self._pid is not None:
+            import psutil
+
+            try:
+                psutil.Process(pid=self._pid).terminate()
+            except psutil.NoSuchProcess:
+                pass
 
-        if os.path.exists(self._statepath):
-            os.remove(self._statepath)
+        with self._registry.update() as servers:
+            servers.pop(self.name, None)
+            if os.path.exists(self._mountpath):
+                os.remove(self._mountpath)
 
         self._pid = None
 
 
+    def set_servedir(self, directory: Path | str) -> None:
+        """Serve another directory at the root of the running server.
+
+        The directory is mounted at the empty prefix, so the server picks it
+        up without restarting; books mounted under URL prefixes stay.
+
+        Raises
+        ------
+        ValueError
+            If the server does not use the "teachbooks" backend.
+        NotADirectoryError
+            If the directory does not exist.
+        """
+        if self.backend != "teachbooks":
+            raise ValueError("Changing the served directory requires the 'teachbooks' backend.")
+        directory = Path(directory)
+        if not directory.is_dir():
+            raise NotADirectoryError(f"Directory does not exist: {directory}")
+
+        with self._registry.lock():
+            mounts = self._read_mounts()
+            mounts[""] = directory.absolute()
+            self._save_mounts(mounts)
+        self.servedir = directory
+        self._save()
+
+    @property
+    def mounts(self) -> dict[str, Path]:
+        """Books served under URL prefixes, see :meth:`mount`."""
+        mounts = self._read_mounts()
+        mounts.pop("", None)
+        return mounts
+
+    def mount(self, prefix: str, directory: Path | str) -> str:
+        """Serve a directory under a URL prefix.
+
+        The running server picks up the change without restarting. Mounting to
+        a prefix that is in use replaces the directory served there.
+
+        Parameters
+        ----------
+        prefix : str
+            URL prefix, such as ``"book-a"`` or ``"book-a/draft"``.
+        directory : Path | str
+            Directory to serve, usually the ``_build/html`` of a book.
+
+        Returns
+        -------
+        str
+            The normalized prefix.
+
+        Raises
+        ------
+        ValueError
+            If the prefix is not a valid URL path, or the server does not use
+            the "teachbooks" backend.
+        NotADirectoryError
+            If the directory does not exist.
+        """
+        if self.backend != "teachbooks":
+            raise ValueError("Mounting books requires the 'teachbooks' backend.")
+        prefix = prefix.strip("/")
+        if not _PREFIX.fullmatch(prefix):
+            raise ValueError(f"Invalid URL prefix: {prefix!r}")
+        directory = Path(directory).absolute()
+        if not directory.is_dir():
+            raise NotADirectoryError(f"Directory does not exist: {directory}")
+
+        with self._registry.lock():
+            mounts = self._read_mounts()
+            mounts[prefix] = directory
+            self._save_mounts(mounts)
+        return prefix
+
+    def unmount(self, prefix: str) -> None:
+        """Stop serving the directory under a URL prefix.
+
+        Raises
+        ------
+        KeyError
+            If nothing is mounted under the prefix.
+        """
+        prefix = prefix.strip("/")
+        if not prefix:
+            raise KeyError(prefix)
+        with self._registry.lock():
+            mounts = self._read_mounts()
+            del mounts[prefix]
+            self._save_mounts(mounts)
+
+    @property
+    def _mountpath(self) -> Path:
+        return self.workdir / "mounts" / f"{self.name}.json"
+
+    def _read_mounts(self) -> dict[str, Path]:
+        """All mounts, including the root at the empty prefix."""
+        try:
+            with open(self._mountpath, encoding="utf8") as f:
+                return {prefix: Path(path) for prefix, path in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+
+    def _save_mounts(self, mounts: dict[str, Path]) -> None:
+        """Replace the mount file in one step, so the server never reads half of it."""
+        os.makedirs(self._mountpath.parent, exist_ok=True)
+        tmp = self._mountpath.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf8") as f:
+            json.dump({prefix: str(path) for prefix, path in mounts.items()}, f, indent=2)
+        os.replace(tmp, self._mountpath)
+
+    @property
+    def _registry(self) -> StateRegistry:
+        return StateRegistry(self.workdir)
+
+    @property
+    def _statepath(self) -> Path:
+        return self._registry.path
+
     def _save(self) -> None:
-        """Save current Server object as a pickle file.
+        """Save the state of the server in the registry.
         """
-        with open(self._statepath, "wb") as f:
-            pickle.dump(self, f)
+        self._registry.put(self.name, self._record())
+
+    def _record(self) -> dict:
+        """State of the server as JSON values."""
+        return {
+            "servedir": str(self.servedir),
+            "port": self.port,
+            "pid": self._pid,
+            "fd": self._fd,
+            "livereload": self.livereload,
+            "backend": self.backend,
+            "max_connections": self.max_connections,
+        }
 
     @property
     def is_running(self) -> bool:
@@ -150,15 +350,98 @@ class Server:
         bool
             True if the current process ID is running and is a webserver.
         """
+        if self._pid is None:
+            return False
+        import psutil
+
         # Make sure the process exists
         try:
             proc = psutil.Process(pid=self._pid)
         except psutil.NoSuchProcess:
             return False
-        isalive = proc.status() == STATUS[platform.system()]
-        isserver = proc.cmdline()[1:] == ["-u", "-m", "http.server", str(self.port)]
+        try:
+            isalive = proc.status() not in (psutil.STATUS_ZOMBIE, psutil.STATUS_DEAD)
+        except psutil.NoSuchProcess:
+            return False
+        isserver = proc.cmdline()[1:] == self._command()
         return isalive and isserver
 
+    @property
+    def options(self) -> tuple[bool, str, int | None]:
+        """Live reload, backend and maximum connections of the server."""
+        return self.livereload, self.backend, self.max_connections
+
+    @property
+    def _inherits_socket(self) -> bool:
+        """Whether the server process is handed a listening socket."""
+        return self.backend == "teachbooks" and os.name == "posix"
+
+    def _listen(self, port: int | None) -> socket.socket:
+        """Bind a listening socket for the server process to inherit.
+
+        Raises
+        ------
+        RuntimeError
+            If the port cannot be bound.
+        """
+        try:
+            if socket.has_dualstack_ipv6():
+                # Like http.server, accept IPv6 and IPv4 clients
+                sock = socket.create_server(("", port or 0), family=socket.AF_INET6,
+                                            dualstack_ipv6=True)
+            else:
+                sock = socket.create_server(("", port or 0))
+        except OSError as exc:
+            raise RuntimeError(f"Cannot listen on port {port}: {exc.strerror}. "
+                               "Perhaps a server is already running on it?") from exc
+        sock.set_inheritable(True)
+        return sock
+
+    def _wait_until_ready(self, proc: "psutil.Popen", timeout: float) -> None:
+        """Wait until the webserver process reports that it is listening.
+
+        Both backends print a line starting with "Serving HTTP" to stdout once
+        their socket is bound. The line is read in a thread so the wait is
+        bounded on every platform.
+
+        Raises
+        ------
+        RuntimeError
+            If the process exits or stays silent for ``timeout`` seconds.
+        """
+        lines = []
+        reader = threading.Thread(target=lambda: lines.append(proc.stdout.readline()),
+                                  daemon=True)
+        reader.start()
+        reader.join(timeout)
+
+        if not lines:
+            raise RuntimeError(f"Server did not start listening on port {self.port} "
+                               f"within {timeout} seconds.")
+        if not lines[0].startswith(b"Serving HTTP"):
+            import psutil
+
+            try:
+                returncode = proc.wait(timeout=1)
+            except psutil.TimeoutExpired:
+                returncode = None
+            raise RuntimeError(f"Error launching the server (exit code {returncode}). "
+                               f"Perhaps a server is already running on port {self.port}?")
+
+    def _command(self) -> list[str]:
+        """Arguments for the Python interpreter that runs the webserver."""
+        if self.backend == "teachbooks":
+            command = ["-u", "-m", "teachbooks.httpd", str(self.port)]
+            if self._fd is not None:
+                command.extend(["--fd", str(self._fd)])
+            command.extend(["--mounts", str(self._mountpath.absolute())])
+            if self.max_connections is not None:
+                command.extend(["--max-connections", str(self.max_connections)])
+            if self.livereload:
+                command.append("--livereload")
+            return command
+        return ["-u", "-m", "http.server", str(self.port)]
+
 
     @property
     def url(self) -> str:
@@ -176,6 +459,10 @@ class Server:
     def _find_port() -> int:
         """Find open port.
 
+        The port is released before the server binds it, so another process
+        may take it in between. Only used when the listening socket cannot be
+        inherited, see :attr:`_inherits_socket`.
+
         Returns
         -------
         int
@@ -188,27 +475,80 @@ class Server:
 
 
     @classmethod
-    def load(cls, workdir: Path | str) -> Server_t:
-        """Construct a Server object from an existing pickle file.
+    def load(cls, workdir: Path | str, name: str = "default") -> Server_t:
+        """Construct a Server object from the registry in a work directory.
+
+        Only reads a small JSON file; psutil is not imported until the
+        server's process is inspected.
 
         Parameters
         ----------
         workdir : Path | str
-            Directory containing the pickle file.
+            Directory containing the registry.
+        name : str, optional
+            Name of the server, by default "default".
 
         Returns
         -------
         Server
-            Server object reconstructed from pickle file.
+            Server object reconstructed from its record.
 
         Raises
         ------
         ServerError
-            If pickle file cannot be found.
+            If the server is not in the registry.
         """
+        workdir = Path(workdir)
         try:
-            with open(workdir / cls.statefile, "rb") as f:
-                server = pickle.load(f)
-        except FileNotFoundError as exc:
-            raise ServerError("Server information not found.") from exc
+            record = StateRegistry(workdir).get(name)
+        except ValueError as exc:
+            raise ServerError(str(exc)) from exc
+        if record is None:
+            record = cls._migrate(workdir, name)
+        return cls._from_record(workdir, name, record)
+
+    @classmethod
+    def _from_record(cls, workdir: Path, name: str, record: dict) -> Server_t:
+        """Construct a Server object from its record in the registry."""
+        server = cls.__new__(cls)
+        server.stdout = None
+        server.name = name
+        server.workdir = workdir
+        server.servedir = Path(record["servedir"])
+        server.port = record["port"]
+        server._pid = record["pid"]
+        server._fd = record["fd"]
+        server.livereload = record["livereload"]
+        server.backend = record["backend"]
+        server.max_connections = record["max_connections"]
         return server
+
+    @classmethod
+    def _migrate(cls, workdir: Path, name: str) -> dict:
+        """Move the state of the default server from a pickle file of an
+        earlier version into the registry.
+
+        Raises
+        ------
+        ServerError
+            If there is no such state.
+        """
+        path = workdir / cls.legacy_statefile
+        if name != "default" or not path.exists():
+            raise ServerError("Server information not found.")
+        import pickle
+
+        with open(path, "rb") as f:
+            state = pickle.load(f).__dict__
+        record = {
+            "servedir": str(state["servedir"]),
+            "port": state["port"],
+            "pid": state["_pid"],
+            "fd": state.get("_fd"),
+            "livereload": state.get("livereload", False),
+            "backend": state.get("backend", "http.server"),
+            "max_connections": state.get("max_connections"),
+        }
+        StateRegistry(workdir).put(name, record)
+        os.remove(path)
+        return record
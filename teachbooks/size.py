@@ -0,0 +1,127 @@
+import os
+import heapq
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Mapping
+
+
+@dataclass
+class SizeReport:
+    """Disk usage of a directory tree."""
+    total: int = 0
+    #: Size per top-level entry of the tree; files directly in the root are
+    #: grouped under "."
+    directories: dict[str, int] = field(default_factory=dict)
+    #: Largest files as (size, relative posix path), largest first
+    largest: list[tuple[int, str]] = field(default_factory=list)
+
+
+def scan_size(root: Path | str,
+              top: int = 10,
+              known_sizes: Mapping[str, int] | None = None,
+              max_workers: int | None = None) -> SizeReport:
+    """Compute the size of a directory tree.
+
+    Every directory of the tree is scanned with ``os.scandir`` as a separate
+    task of a thread pool, so the work is spread over the threads however
+    unevenly the files are distributed, for instance when ``html/`` holds
+    nearly all of them. This also avoids the ``Path`` objects and repeated
+    ``stat`` calls of ``Path.rglob``.
+
+    Parameters
+    ----------
+    root : Path | str
+        Directory to scan. A missing directory has size 0.
+    top : int, optional
+        Number of largest files to report, by default 10.
+    known_sizes : Mapping[str, int] | None, optional
+        Sizes of files the caller just wrote, such as the compressed copies
+        written by :func:`teachbooks.compress.precompress`, keyed on posix
+        paths relative to ``root``. These files are not ``stat``-ed again.
+    max_workers : int | None, optional
+        Number of threads, by default chosen by ``ThreadPoolExecutor``.
+
+    Returns
+    -------
+    SizeReport
+        Total size, size per top-level directory and the largest files.
+    """
+    root = Path(root)
+    known_sizes = known_sizes or {}
+    report = SizeReport()
+
+    try:
+        files, subdirs = _scan_directory(root, "", top, known_sizes)
+    except (FileNotFoundError, NotADirectoryError):
+        return report
+
+    report.total = files.total
+    largest = files.largest
+    if files.total or files.largest:
+        report.directories["."] = files.total
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Each pending directory is counted towards its top-level directory
+        pending = {}
+        for path, rel in subdirs:
+            report.directories[rel] = 0
+            pending[pool.submit(_scan_directory, path, rel, top, known_sizes)] = rel
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    partial, children = future.result()
+                except (FileNotFoundError, NotADirectoryError, PermissionError):
+                    # Removed while scanning or unreadable: skip
+                    continue
+                report.directories[name] += partial.total
+                report.total += partial.total
+                for item in partial.largest:
+                    _push(largest, item, top)
+                for path, rel in children:
+                    pending[pool.submit(_scan_directory, path, rel, top, known_sizes)] = name
+    report.largest = heapq.nlargest(top, largest)
+    return report
+
+
+def _scan_directory(path: Path | str, rel: str, top: int,
+                    known_sizes: Mapping[str, int]) -> tuple[SizeReport, list[tuple[str, str]]]:
+    """Sizes of the files directly in one directory, and its subdirectories as
+    (path, relative posix path)."""
+    report = SizeReport()
+    subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            rel_entry = f"{rel}/{entry.name}" if rel else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append((entry.path, rel_entry))
+            elif entry.is_file(follow_symlinks=False):
+                _add_file(report, entry, rel_entry, top, known_sizes)
+    return report, subdirs
+
+
+def _add_file(report: SizeReport, entry: os.DirEntry, rel: str, top: int,
+              known_sizes: Mapping[str, int]) -> None:
+    size = known_sizes.get(rel)
+    if size is None:
+        try:
+            size = entry.stat(follow_symlinks=False).st_size
+        except FileNotFoundError:
+            return
+    report.total += size
+    _push(report.largest, (size, rel), top)
+
+
+def _push(largest: list[tuple[int, str]], item: tuple[int, str], top: int) -> None:
+    """Add a file to a heap that keeps the ``top`` largest."""
+    if len(largest) < top:
+        heapq.heappush(largest, item)
+    elif top and item > largest[0]:
+        heapq.heapreplace(largest, item)
+
+
+def format_size(size: int) -> str:
+    """Format a number of bytes in MB, as used in build summaries."""
+    return f"{size / (1024 * 1024):.2f}MB"
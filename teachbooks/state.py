@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+#: Version of the registry layout, stored in the file
+SCHEMA_VERSION = 1
+
+
+class StateRegistry:
+    """Registry of servers, stored as a JSON file in a work directory.
+
+    The file holds one record (a dict of JSON values) per server name::
+
+        {"version": 1, "servers": {"default": {"port": 8000, ...}}}
+
+    Reading is lock-free: writers replace the file in one step, so readers see
+    either the old or the new registry. Writers hold an exclusive lock on a
+    separate lock file for their whole read-modify-write cycle, so concurrent
+    CLI calls do not lose each other's changes.
+    """
+    filename = "servers.json"
+    lockname = "servers.lock"
+
+    def __init__(self, workdir: Path | str) -> None:
+        self.workdir = Path(workdir)
+        self.path = self.workdir / self.filename
+
+    def read(self) -> dict[str, dict]:
+        """All server records, keyed on server name."""
+        try:
+            with open(self.path, encoding="utf8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        if data.get("version") != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported server registry version in {self.path}: "
+                             f"{data.get('version')!r}")
+        return data["servers"]
+
+    def get(self, name: str) -> dict | None:
+        """Record of one server, or None if it is not registered."""
+        return self.read().get(name)
+
+    def put(self, name: str, record: dict) -> None:
+        """Add or replace the record of a server."""
+        with self.update() as servers:
+            servers[name] = record
+
+    def remove(self, name: str) -> None:
+        """Remove the record of a server, if present."""
+        with self.update() as servers:
+            servers.pop(name, None)
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Hold the registry's exclusive lock."""
+        os.makedirs(self.workdir, exist_ok=True)
+        with open(self.workdir / self.lockname, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @contextmanager
+    def update(self) -> Iterator[dict[str, dict]]:
+        """Lock the registry and yield its records; changes are written on exit."""
+        with self.lock():
+            servers = self.read()
+            yield servers
+            self._write(servers)
+
+    def _write(self, servers: dict[str, dict]) -> None:
+        """Replace the registry file in one step."""
+        fd, tmp = tempfile.mkstemp(dir=self.workdir, prefix=self.filename, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf8") as f:
+                json.dump({"version": SCHEMA_VERSION, "servers": servers}, f, indent=2)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
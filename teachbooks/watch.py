@@ -0,0 +1,104 @@
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+# Directories that are written by builds or tools and never hold book sources
+IGNORE_DIRS = {"_build", "__pycache__", ".ipynb_checkpoints"}
+
+Snapshot = dict[str, tuple[int, int]]
+
+
+def snapshot(path_source: Path | str) -> Snapshot:
+    """Record modification time and size of every source file of a book.
+
+    Hidden directories (such as ``.teachbooks/`` and ``.git/``) and build output
+    are skipped.
+
+    Parameters
+    ----------
+    path_source : Path | str
+        Book directory.
+
+    Returns
+    -------
+    Snapshot
+        Mapping of posix paths relative to ``path_source`` to
+        ``(st_mtime_ns, st_size)``.
+    """
+    state = {}
+    stack = [(os.fspath(path_source), "")]
+    while stack:
+        directory, rel = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name.startswith("."):
+                        continue
+                    rel_entry = rel + entry.name
+                    if entry.is_dir():
+                        if entry.name not in IGNORE_DIRS:
+                            stack.append((entry.path, rel_entry + "/"))
+                    else:
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        state[rel_entry] = (stat.st_mtime_ns, stat.st_size)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+    return state
+
+
+def changed_paths(old: Snapshot, new: Snapshot) -> set[str]:
+    """Paths that were added, removed or modified between two snapshots."""
+    return {path for path in old.keys() | new.keys()
+            if old.get(path) != new.get(path)}
+
+
+def watch_book(path_source: Path | str,
+               on_change: Callable[[set[str]], None],
+               interval: float = 0.3,
+               debounce: float = 0.5,
+               should_stop: Callable[[], bool] = lambda: False) -> None:
+    """Call ``on_change`` whenever the sources of a book change.
+
+    The book is polled every ``interval`` seconds. Once a change is seen, polling
+    continues until nothing changed for ``debounce`` seconds, so a burst of saves
+    (or a ``git checkout``) results in a single call with all changed paths.
+    Changes made while ``on_change`` runs are picked up afterwards.
+
+    Parameters
+    ----------
+    path_source : Path | str
+        Book directory, see :func:`snapshot` for what is watched.
+    on_change : Callable[[set[str]], None]
+        Called with the changed paths, relative to ``path_source``.
+    interval : float, optional
+        Polling interval in seconds, by default 0.3.
+    debounce : float, optional
+        Quiet period in seconds before ``on_change`` is called, by default 0.5.
+    should_stop : Callable[[], bool], optional
+        Checked after every poll; watching ends when it returns True.
+    """
+    state = snapshot(path_source)
+    while not should_stop():
+        time.sleep(interval)
+        current = snapshot(path_source)
+        changes = changed_paths(state, current)
+        if not changes:
+            continue
+
+        # Wait for the burst of changes to settle
+        last_change = time.monotonic()
+        while time.monotonic() - last_change < debounce:
+            time.sleep(interval)
+            latest = snapshot(path_source)
+            if latest != current:
+                current = latest
+                last_change = time.monotonic()
+
+        changes = changed_paths(state, current)
+        state = current
+        if changes:
+            on_change(changes)
@@ -0,0 +1,92 @@
+import shutil
+from pathlib import Path
+
+from teachbooks.batch import discover_books, input_digest, build_books
+from teachbooks.build import build_book
+
+PATH_BOOKS = Path(__file__).parent.joinpath("books")
+
+
+def make_book(path: Path) -> Path:
+    path.mkdir(parents=True)
+    path.joinpath("_config.yml").write_text("title: Book\n")
+    path.joinpath("_toc.yml").write_text("format: jb-book\nroot: index\n")
+    path.joinpath("index.md").write_text("# Index\n")
+    return path
+
+def test_discover_books(tmp_path):
+    a = make_book(tmp_path / "a")
+    b = make_book(tmp_path / "courses" / "b")
+    # Not searched: inside books, hidden directories and build output
+    make_book(a / "nested")
+    make_book(tmp_path / ".cache" / "c")
+    make_book(tmp_path / "_build" / "d")
+    tmp_path.joinpath("e").mkdir()
+    tmp_path.joinpath("e", "_config.yml").write_text("title: Not a book\n")
+
+    assert discover_books(tmp_path) == [a, b]
+    assert discover_books(a) == [a]
+
+def test_input_digest(tmp_path):
+    book = make_book(tmp_path / "book")
+    digest = input_digest(book)
+
+    book.joinpath("_build").mkdir()
+    book.joinpath("_build", "index.html").write_text("<p>Index</p>")
+    book.joinpath(".teachbooks").mkdir()
+    book.joinpath(".teachbooks", "build.log").write_text("log")
+    assert input_digest(book) == digest
+
+    book.joinpath("index.md").write_text("# Index\n\nMore\n")
+    assert input_digest(book) != digest
+
+def test_build_books(tmp_path):
+    good = tmp_path / "good"
+    shutil.copytree(PATH_BOOKS / "01", good, ignore=shutil.ignore_patterns("_build", ".teachbooks"))
+    broken = make_book(tmp_path / "broken")
+    broken.joinpath("_toc.yml").write_text("format: jb-book\nroot: missing\n")
+
+    results = {r.path: r for r in build_books([good, broken], max_workers=2)}
+    assert results[good].status == "built"
+    assert good.joinpath("_build", "html", "index.html").exists()
+    assert results[broken].status == "failed"
+    assert results[broken].log.read_text()
+
+    # Unchanged books are skipped, changed ones are rebuilt
+    good.joinpath("index.md").write_text("# Changed\n")
+    results = {r.path: r for r in build_books([good, broken], max_workers=2)}
+    assert results[good].status == "built"
+    results = {r.path: r for r in build_books([good], max_workers=2)}
+    assert results[good].status == "skipped"
+
+    # Output of other builds is not that of the batch
+    build_book(good, release=True)
+    results = {r.path: r for r in build_books([good], max_workers=2)}
+    assert results[good].status == "built"
+
+def test_build_books_unwritable(tmp_path):
+    good = make_book(tmp_path / "good")
+    unwritable = make_book(tmp_path / "unwritable")
+    # The work directory cannot be created
+    unwritable.joinpath(".teachbooks").write_text("")
+
+    results = {r.path: r for r in build_books([unwritable, good], max_workers=2)}
+    assert results[unwritable].status == "failed"
+    assert "Error" in results[unwritable].error
+    assert results[good].status == "built"
+
+def test_build_books_worker_dies(tmp_path):
+    good = tmp_path / "good"
+    shutil.copytree(PATH_BOOKS / "01", good, ignore=shutil.ignore_patterns("_build", ".teachbooks"))
+    crash = make_book(tmp_path / "crash")
+    crash.joinpath("_config.yml").write_text(
+        "title: Book\nsphinx:\n  local_extensions:\n    crash: _ext\n")
+    crash.joinpath("_ext").mkdir()
+    crash.joinpath("_ext", "crash.py").write_text("import os\n\ndef setup(app):\n    os._exit(1)\n")
+    other = make_book(tmp_path / "other")
+
+    results = {r.path: r for r in build_books([good, crash, other], max_workers=3)}
+    assert results[crash].status == "failed"
+    assert results[crash].error == "build process died"
+    assert results[good].status == "built"
+    assert results[other].status == "built"
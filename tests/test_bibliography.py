@@ -0,0 +1,70 @@
+import pytest
+
+bibfile = pytest.importorskip("sphinxcontrib.bibtex.bibfile")
+
+from teachbooks.bibliography import BibliographyCache, bibliography_cache, reference_cache
+
+BIB = r"""
+@article{smith2020,
+  author = {Smith, John and van der Berg, Anna},
+  title = {A title},
+  journal = {Journal},
+  year = {2020},
+}
+"""
+
+
+def test_bibliography_cache(tmp_path, monkeypatch):
+    refs = tmp_path / "refs.bib"
+    refs.write_text(BIB, encoding="utf8")
+    more = tmp_path / "more.bib"
+    more.write_text("@book{doe2019, author = {Doe, Jane}, title = {Book}, year = {2019}}\n",
+                    encoding="utf8")
+
+    original = bibfile.parse_bibdata
+    with bibliography_cache(tmp_path / "cache"):
+        parsed = bibfile.parse_bibdata([refs, more], "utf-8-sig")
+        monkeypatch.setattr(bibfile, "Parser", None)  # loading must not parse
+        loaded = bibfile.parse_bibdata([refs, more], "utf-8-sig")
+    assert bibfile.parse_bibdata is original
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+    assert loaded.bibfiles == parsed.bibfiles
+    assert list(loaded.data.entries) == ["smith2020", "doe2019"]
+    person = loaded.data.entries["smith2020"].persons["author"][1]
+    assert person.prelast_names == ["van", "der"]
+
+def test_key(tmp_path):
+    cache = BibliographyCache(tmp_path)
+    refs = tmp_path / "refs.bib"
+    refs.write_text(BIB, encoding="utf8")
+    key = cache.key([refs], "utf-8")
+
+    assert cache.key([refs], "latin-1") != key
+    refs.write_text(BIB.replace("2020", "2021"), encoding="utf8")
+    assert cache.key([refs], "utf-8") != key
+    assert cache.key([tmp_path / "missing.bib"], "utf-8") is None
+
+def test_errors_not_cached(tmp_path):
+    refs = tmp_path / "refs.bib"
+    refs.write_text(BIB + BIB, encoding="utf8")
+
+    with bibliography_cache(tmp_path / "cache"):
+        bibfile.parse_bibdata([refs], "utf-8")
+    assert not (tmp_path / "cache").exists()
+
+def test_reference_cache(tmp_path, monkeypatch):
+    from pybtex.database import parse_string
+    from teachbooks.plugins.pybtex.formatting import apa
+
+    monkeypatch.setattr(apa, "reference_cache", apa.ReferenceCache())
+    entry = parse_string(BIB, "bibtex").entries["smith2020"]
+    path = tmp_path / "references.pickle"
+    with reference_cache(path):
+        text = apa.APAStyle().format_entry("label", entry).text
+    assert path.exists()
+
+    monkeypatch.setattr(apa, "reference_cache", apa.ReferenceCache())
+    with reference_cache(path):
+        assert apa.APAStyle().format_entry("label", entry).text == text
+        assert (apa.reference_cache.hits, apa.reference_cache.misses) == (1, 0)
@@ -0,0 +1,40 @@
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from teachbooks.build import resolve_jobs, parallel_unsafe_extensions, forget_book_modules
+
+
+def test_resolve_jobs():
+    assert resolve_jobs("4") == 4
+    assert resolve_jobs(2) == 2
+    assert resolve_jobs("auto") >= 1
+
+@pytest.mark.parametrize("jobs", ["0", "-1", "many", None])
+def test_resolve_jobs_invalid(jobs):
+    with pytest.raises(ValueError):
+        resolve_jobs(jobs)
+
+def test_parallel_unsafe_extensions():
+    def ext(read, write):
+        return SimpleNamespace(parallel_read_safe=read, parallel_write_safe=write)
+
+    app = SimpleNamespace(extensions={
+        "safe": ext(True, True),
+        "undeclared": ext(None, True),
+        "read_unsafe": ext(False, True),
+        "write_unsafe": ext(True, False),
+    })
+    assert parallel_unsafe_extensions(app) == ["read_unsafe", "undeclared", "write_unsafe"]
+    assert parallel_unsafe_extensions(app, "read") == ["read_unsafe", "undeclared"]
+    assert parallel_unsafe_extensions(app, "write") == ["write_unsafe"]
+
+def test_forget_book_modules(tmp_path, monkeypatch):
+    tmp_path.joinpath("_ext").mkdir()
+    tmp_path.joinpath("_ext", "book_extension.py").write_text("VALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path / "_ext"))
+    import book_extension
+
+    forget_book_modules(tmp_path)
+    assert "book_extension" not in sys.modules
@@ -25,6 +25,7 @@ def test_build(cli: CliRunner):
     _ = cli.invoke(commands.clean,
                    book.as_posix())
     assert not html.joinpath("index.html").exists()
+    assert not book.joinpath(".teachbooks", "cache").exists()
 
 def test_build_release(cli: CliRunner):
     book = PATH_BOOKS.joinpath("01")
@@ -82,4 +83,99 @@ def test_build_release_apa(cli: CliRunner):
     assert book.joinpath(".teachbooks","release","_ext","apastyle.py").exists()
     assert book.joinpath(".teachbooks","release","_ext","bracket_citation_style.py").exists()
     assert book.joinpath(".teachbooks","release","_ext","pybtexapastyle").exists()
-    assert book.joinpath(".teachbooks","release","_ext","pybtexapastyle","setup.py").exists()
\ No newline at end of file
+    assert book.joinpath(".teachbooks","release","_ext","pybtexapastyle","setup.py").exists()
+
+def test_build_jobs(cli: CliRunner):
+    book = PATH_BOOKS.joinpath("01")
+    build_result = cli.invoke(commands.build,
+                              ['--jobs', 'auto',
+                              book.as_posix()])
+    assert build_result.exit_code == 0, build_result.output
+    assert "Sphinx worker(s)" in build_result.output
+    html = book.joinpath("_build", "html")
+    assert html.joinpath("index.html").exists()
+    _ = cli.invoke(commands.clean,
+                   book.as_posix())
+
+def test_build_jobs_invalid(cli: CliRunner):
+    book = PATH_BOOKS.joinpath("01")
+    build_result = cli.invoke(commands.build,
+                              ['--jobs', '0',
+                              book.as_posix()])
+    assert build_result.exit_code != 0
+    assert "--jobs" in build_result.output
+
+def test_build_size_report(cli: CliRunner):
+    book = PATH_BOOKS.joinpath("01")
+    build_result = cli.invoke(commands.build,
+                              ['--size-report',
+                              book.as_posix()])
+    assert build_result.exit_code == 0, build_result.output
+    assert "html/" in build_result.output
+    assert "largest files:" in build_result.output
+    _ = cli.invoke(commands.clean,
+                   book.as_posix())
+
+def test_build_precompress(cli: CliRunner):
+    book = PATH_BOOKS.joinpath("01")
+    build_result = cli.invoke(commands.build,
+                              ['--precompress',
+                              book.as_posix()])
+    assert build_result.exit_code == 0, build_result.output
+    html = book.joinpath("_build", "html")
+    assert html.joinpath("index.html.gz").exists()
+    _ = cli.invoke(commands.clean,
+                   book.as_posix())
+
+def test_build_all(cli: CliRunner, tmp_path):
+    import shutil
+
+    books = tmp_path / "books"
+    shutil.copytree(PATH_BOOKS, books, ignore=shutil.ignore_patterns("_build", ".teachbooks"))
+    result = cli.invoke(commands.build_all, [books.as_posix(), "--force"])
+    assert result.exit_code == 0, result.output
+    assert "2 built, 0 skipped, 0 failed" in result.output
+
+    result = cli.invoke(commands.build_all, [books.as_posix()])
+    assert result.exit_code == 0, result.output
+    assert "0 built, 2 skipped, 0 failed" in result.output
+
+def test_build_profile(cli: CliRunner, tmp_path):
+    import json
+    import shutil
+
+    book = tmp_path / "01"
+    shutil.copytree(PATH_BOOKS / "01", book, ignore=shutil.ignore_patterns("_build", ".teachbooks"))
+    build_result = cli.invoke(commands.build, ["--profiler", "cprofile", book.as_posix()])
+    assert build_result.exit_code == 0, build_result.output
+    assert "slowest documents" in build_result.output
+
+    reports = sorted(book.joinpath(".teachbooks", "profile").glob("profile-*.json"))
+    assert len(reports) == 1
+    assert reports[0].with_suffix(".prof").exists()
+    report = json.loads(reports[0].read_text())
+    assert {"jupyter_book", "size_scan"} <= set(report["phases"])
+    assert report["documents"]["index"]["read"] > 0
+
+def test_build_watch_reloads_extensions(cli: CliRunner, tmp_path, monkeypatch):
+    import sys
+    import teachbooks.build
+    import teachbooks.watch
+
+    tmp_path.joinpath("_ext").mkdir()
+    tmp_path.joinpath("_ext", "watched_extension.py").write_text("VALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path / "_ext"))
+    imported = []
+
+    def build_book(path_source, **kwargs):
+        import watched_extension
+        imported.append(watched_extension.VALUE)
+        tmp_path.joinpath("_ext", "watched_extension.py").write_text("VALUE = 10\n")
+
+    monkeypatch.setattr(teachbooks.build, "build_book", build_book)
+    monkeypatch.setattr(teachbooks.watch, "watch_book",
+                        lambda path, on_change: on_change({"_ext/watched_extension.py"}))
+    result = cli.invoke(commands.build, ["--watch", "--no-daemon", tmp_path.as_posix()])
+    assert result.exit_code == 0, result.output
+    assert imported == [1, 10]
+    sys.modules.pop("watched_extension", None)
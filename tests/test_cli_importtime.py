@@ -0,0 +1,28 @@
+import subprocess
+import sys
+
+# Generous, to stay stable on slow CI machines; a cold import of
+# jupyter_book or numpy alone exceeds it.
+IMPORT_BUDGET_US = 400_000
+
+# Never needed to stop a server
+HEAVY_MODULES = {"jupyter_book", "sphinx", "numpy", "scipy", "pandas", "matplotlib", "psutil"}
+
+
+def test_serve_stop_import_time(tmp_path):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-m", "teachbooks.cli.main",
+                             "serve", "stop"],
+                            cwd=tmp_path, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+    total = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line.removeprefix("import time:").split("|")
+        total += int(self_us)
+        modules.add(name.strip().split(".")[0])
+
+    assert not modules & HEAVY_MODULES
+    assert total < IMPORT_BUDGET_US, f"importing took {total / 1000:.0f}ms"
@@ -60,4 +60,53 @@ def test_path_unavailable(cli: CliRunner):
     assert serve_result.exit_code == 0, serve_result.output
 
     stop_result = cli.invoke(commands.stop)
-    assert stop_result.exit_code == 0, stop_result.output
\ No newline at end of file
+    assert stop_result.exit_code == 0, stop_result.output
+
+def test_add_remove_list(cli: CliRunner):
+    """Serve two books from one server"""
+    book1 = PATH_BOOKS.joinpath("01")
+    book2 = PATH_BOOKS.joinpath("02")
+
+    path_result = cli.invoke(commands.serve, ['path', book1.as_posix()])
+    assert path_result.exit_code == 0, path_result.output
+
+    add_result = cli.invoke(commands.serve, ['add', book2.as_posix(), '--prefix', 'second'])
+    assert add_result.exit_code == 0, add_result.output
+
+    list_result = cli.invoke(commands.serve, ['list'])
+    assert list_result.exit_code == 0, list_result.output
+    assert "/second/" in list_result.output
+
+    remove_result = cli.invoke(commands.serve, ['remove', 'second'])
+    assert remove_result.exit_code == 0, remove_result.output
+    remove_result = cli.invoke(commands.serve, ['remove', 'second'])
+    assert remove_result.exit_code != 0
+
+    stop_result = cli.invoke(commands.stop)
+    assert stop_result.exit_code == 0, stop_result.output
+
+def test_path_keeps_server_and_mounts(cli: CliRunner, tmp_path):
+    """Changing the served directory does not restart the server"""
+    from teachbooks import SERVER_WORK_DIR
+    from teachbooks.serve import Server
+
+    book1 = tmp_path / "a"
+    book2 = tmp_path / "b"
+    book3 = tmp_path / "c"
+    for book in book1, book2, book3:
+        book.mkdir()
+
+    path_result = cli.invoke(commands.serve, ['path', book1.as_posix()])
+    assert path_result.exit_code == 0, path_result.output
+    port = Server.load(SERVER_WORK_DIR).port
+    add_result = cli.invoke(commands.serve, ['add', book2.as_posix(), '--prefix', 'bee'])
+    assert add_result.exit_code == 0, add_result.output
+
+    path_result = cli.invoke(commands.serve, ['path', book3.as_posix()])
+    assert path_result.exit_code == 0, path_result.output
+    list_result = cli.invoke(commands.serve, ['list'])
+    assert f"localhost:{port}/  {book3}" in list_result.output
+    assert f"localhost:{port}/bee/  {book2.absolute()}" in list_result.output
+
+    stop_result = cli.invoke(commands.stop)
+    assert stop_result.exit_code == 0, stop_result.output
@@ -0,0 +1,65 @@
+import gzip
+import os
+from pathlib import Path
+
+import pytest
+
+from teachbooks.compress import precompress, negotiate, available_encodings
+
+TEXT = "<p>" + "Lorem ipsum dolor sit amet. " * 100 + "</p>"
+
+
+@pytest.fixture
+def html(tmp_path: Path) -> Path:
+    tmp_path.joinpath("_static").mkdir()
+    tmp_path.joinpath("index.html").write_text(TEXT, encoding="utf8")
+    tmp_path.joinpath("_static", "searchindex.js").write_text(TEXT, encoding="utf8")
+    tmp_path.joinpath("_static", "small.css").write_text("p {}", encoding="utf8")
+    tmp_path.joinpath("_static", "logo.png").write_bytes(os.urandom(1000))
+    return tmp_path
+
+def test_precompress(html: Path):
+    result = precompress(html, encodings=["gzip"])
+    assert result.compressed == 2
+    assert set(result.sizes) == {"index.html.gz", "_static/searchindex.js.gz"}
+    assert gzip.decompress(html.joinpath("index.html.gz").read_bytes()).decode("utf8") == TEXT
+    assert not html.joinpath("_static", "small.css.gz").exists()
+    assert not html.joinpath("_static", "logo.png.gz").exists()
+
+def test_precompress_up_to_date(html: Path):
+    precompress(html, encodings=["gzip"])
+    result = precompress(html, encodings=["gzip"])
+    assert result.compressed == 0
+
+    # Rebuilt page is newer than its compressed copy
+    os.utime(html / "index.html.gz", ns=(0, 0))
+    result = precompress(html, encodings=["gzip"])
+    assert list(result.sizes) == ["index.html.gz"]
+
+    # Changed file copied with its original, older, modification time
+    html.joinpath("index.html").write_text(TEXT.upper(), encoding="utf8")
+    os.utime(html / "index.html", ns=(1, 1))
+    result = precompress(html, encodings=["gzip"])
+    assert list(result.sizes) == ["index.html.gz"]
+    assert gzip.decompress(html.joinpath("index.html.gz").read_bytes()).decode("utf8") == TEXT.upper()
+
+def test_precompress_unavailable(html: Path):
+    with pytest.raises(ValueError):
+        precompress(html, encodings=["zstd"])
+
+def test_available_encodings():
+    assert "gzip" in available_encodings()
+
+@pytest.mark.parametrize(
+    "header, expected", [
+        (None, []),
+        ("gzip, deflate, br", ["br", "gzip"]),
+        ("gzip", ["gzip"]),
+        ("br;q=0, gzip;q=0.5", ["gzip"]),
+        ("br;q=0.2, gzip;q=0.8", ["gzip", "br"]),
+        ("*", ["br", "gzip"]),
+        ("identity", []),
+    ]
+)
+def test_negotiate(header, expected):
+    assert negotiate(header) == expected
@@ -0,0 +1,112 @@
+import os
+import socket
+import threading
+
+import pytest
+
+import teachbooks.build
+from teachbooks import daemon
+from teachbooks.release import ReleaseMarkerError
+from teachbooks.size import SizeReport
+
+needs_unix = pytest.mark.skipif(not daemon.available(), reason="needs Unix sockets")
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    path = tmp_path / "daemon.sock"
+    thread = threading.Thread(target=daemon.serve, args=(path,), kwargs={"warm": False},
+                              daemon=True)
+    thread.start()
+    for _ in range(100):
+        if daemon.is_running(path):
+            break
+        thread.join(0.05)
+    yield path
+    daemon.stop(path)
+    thread.join(5)
+    assert not path.exists()
+
+def fake_build_book(path_source, echo=print, **kwargs):
+    if kwargs["release"]:
+        raise ReleaseMarkerError("unclosed marker")
+    if kwargs["process_only"]:
+        raise SystemExit(1)
+    echo(f"building {path_source}")
+    print("Running Sphinx")
+    return SizeReport(total=3, directories={"html": 3}, largest=[(3, "html/index.html")])
+
+@needs_unix
+def test_build(socket_path, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(teachbooks.build, "build_book", fake_build_book)
+    messages = []
+    report = daemon.build_book(tmp_path, echo=messages.append, path=socket_path)
+    assert report == SizeReport(total=3, directories={"html": 3}, largest=[(3, "html/index.html")])
+    assert messages == [f"building {tmp_path}"]
+    assert "Running Sphinx" in capsys.readouterr().out
+    assert daemon.status(socket_path)["builds"] == 1
+
+@needs_unix
+def test_build_errors(socket_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(teachbooks.build, "build_book", fake_build_book)
+    with pytest.raises(ReleaseMarkerError, match="unclosed marker"):
+        daemon.build_book(tmp_path, release=True, path=socket_path)
+    with pytest.raises(daemon.DaemonError):
+        daemon.build_book(tmp_path, process_only=True, path=socket_path)
+    # The daemon keeps serving after failed builds
+    assert daemon.is_running(socket_path)
+
+def test_not_running(tmp_path):
+    assert not daemon.is_running(tmp_path / "daemon.sock")
+    with pytest.raises(daemon.DaemonError):
+        daemon.status(tmp_path / "daemon.sock")
+
+def test_unavailable(monkeypatch):
+    monkeypatch.setattr(daemon, "available", lambda: False)
+    # Windows has no os.getuid
+    monkeypatch.delattr(os, "getuid", raising=False)
+    assert not daemon.is_running()
+    with pytest.raises(daemon.DaemonError):
+        daemon.status()
+
+@needs_unix
+def test_status_during_build(socket_path, tmp_path, monkeypatch):
+    started, finish = threading.Event(), threading.Event()
+
+    def slow_build_book(path_source, **kwargs):
+        started.set()
+        finish.wait(10)
+
+    monkeypatch.setattr(teachbooks.build, "build_book", slow_build_book)
+    build = threading.Thread(target=daemon.build_book, args=(tmp_path,),
+                             kwargs={"path": socket_path})
+    build.start()
+    try:
+        assert started.wait(5)
+        assert daemon.status(socket_path)["building"] == str(tmp_path)
+    finally:
+        finish.set()
+        build.join(5)
+    assert daemon.status(socket_path)["building"] is None
+
+@needs_unix
+def test_socket_private(socket_path):
+    assert os.stat(socket_path).st_mode & 0o777 == 0o600
+
+@needs_unix
+def test_request_timeout(tmp_path):
+    path = tmp_path / "silent.sock"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(os.fspath(path))
+        sock.listen()
+        with pytest.raises(daemon.DaemonError, match="did not answer"):
+            daemon.request({"command": "status"}, path=path, timeout=0.1)
+
+@needs_unix
+def test_runtime_dir_checked(tmp_path, monkeypatch):
+    runtime_dir = tmp_path / "teachbooks"
+    runtime_dir.mkdir(mode=0o755)
+    runtime_dir.chmod(0o755)
+    monkeypatch.setattr(daemon, "_runtime_dir", lambda: runtime_dir)
+    with pytest.raises(daemon.DaemonError, match="accessible to other users"):
+        daemon.serve(runtime_dir / "daemon.sock", warm=False)
@@ -0,0 +1,183 @@
+import os
+import shutil
+from pathlib import Path
+
+import nbformat
+import pytest
+from nbformat.v4 import new_code_cell, new_markdown_cell, new_notebook, new_output
+
+from teachbooks import execute
+from teachbooks.execute import ExecutionCache, execute_notebooks, toc_notebooks
+
+WORK_DIR = Path(__file__).parent / "books" / "01"
+
+
+def notebook(*sources):
+    nb = new_notebook(cells=[new_markdown_cell("# Title")]
+                      + [new_code_cell(source) for source in sources])
+    nb.metadata["kernelspec"] = {"name": "python3", "language": "python",
+                                 "display_name": "Python 3"}
+    return nb
+
+
+def test_key(tmp_path):
+    cache = ExecutionCache(tmp_path)
+    nb = notebook("x = 1", "print(x)")
+    key = cache.key(nb)
+
+    nb.cells[0].source = "# Other title"
+    assert cache.key(nb) == key
+    nb.cells[1].source = "x = 2"
+    assert cache.key(nb) != key
+    nb.cells[1].source = "x = 1"
+    nb.metadata["kernelspec"]["name"] = "other"
+    assert cache.key(nb) != key
+
+def test_key_dependencies(tmp_path):
+    cache = ExecutionCache(tmp_path / "cache")
+    path = tmp_path / "notebook.ipynb"
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "input.csv").write_text("1,2\n")
+    (tmp_path / "helpers.py").write_text("VALUE = 1\n")
+    (tmp_path / "package").mkdir()
+    (tmp_path / "package" / "__init__.py").write_text("")
+    (tmp_path / "package" / "module.py").write_text("VALUE = 1\n")
+    nb = notebook("import helpers", "open('data/input.csv').read()")
+    assert cache.dependencies(nb, path) == [
+        tmp_path / "data" / "input.csv", tmp_path / "helpers.py",
+        tmp_path / "package" / "__init__.py", tmp_path / "package" / "module.py"]
+    key = cache.key(nb, path)
+    assert cache.key(nb) != key
+
+    for name in ["helpers.py", "data/input.csv", "package/module.py"]:
+        original = (tmp_path / name).read_text()
+        (tmp_path / name).write_text(original + "# changed\n")
+        assert cache.key(nb, path) != key
+        (tmp_path / name).write_text(original)
+        assert cache.key(nb, path) == key
+    # Files that are not referenced do not count
+    (tmp_path / "data" / "other.csv").write_text("3\n")
+    assert cache.key(nb, path) == key
+
+def test_prune(tmp_path, monkeypatch):
+    monkeypatch.setattr(execute, "MAX_ENTRIES", 2)
+    cache = ExecutionCache(tmp_path)
+    keys = []
+    for i in range(3):
+        nb = notebook(f"print({i})")
+        keys.append(cache.key(nb))
+        cache.save(keys[-1], nb, 0.1)
+        os.utime(cache._path(keys[-1]), (i, i))
+    # Loading marks an entry as used
+    assert cache.load(keys[0], notebook("print(0)")) is not None
+    cache._prune()
+    assert sorted(tmp_path.glob("*/*.json")) == sorted([cache._path(keys[0]), cache._path(keys[2])])
+
+def test_save_load(tmp_path):
+    cache = ExecutionCache(tmp_path)
+    executed = notebook("print(1)")
+    key = cache.key(executed)
+    assert cache.load(key, notebook("print(1)")) is None
+
+    executed.cells[1].outputs = [new_output("stream", name="stdout", text="1\n")]
+    executed.cells[1].execution_count = 1
+    cache.save(key, executed, 0.5)
+
+    nb = notebook("print(1)")
+    assert cache.load(key, nb) == 0.5
+    assert nb.cells[1].outputs[0].text == "1\n"
+    assert nb.cells[1].execution_count == 1
+    nbformat.validate(nb)
+    assert (cache.stats.hits, cache.stats.executed) == (1, 1)
+
+def test_toc_notebooks(tmp_path):
+    for name in ["index.md", "intro.ipynb", "part/a.ipynb", "part/b.ipynb", "skip.ipynb"]:
+        tmp_path.joinpath(name).parent.mkdir(exist_ok=True)
+        tmp_path.joinpath(name).touch()
+    tmp_path.joinpath("_toc.yml").write_text(
+        "format: jb-book\nroot: index\nparts:\n"
+        "  - chapters:\n      - file: intro\n      - file: part/b.ipynb\n"
+        "        sections:\n          - file: part/a\n          - file: skip\n"
+        "          - file: missing\n")
+    assert toc_notebooks(tmp_path, exclude_patterns=["skip.*"]) == [
+        tmp_path / "intro.ipynb", tmp_path / "part" / "b.ipynb", tmp_path / "part" / "a.ipynb"]
+
+@pytest.mark.skipif(shutil.which("jupyter") is None, reason="needs a Jupyter kernel")
+def test_execute_notebooks(tmp_path):
+    notebooks = {
+        "ok": notebook("x = 1", "print(x)"),
+        "error": notebook("1 / 0"),
+        "slow": notebook("import time", "time.sleep(60)"),
+        "done": notebook(),
+    }
+    for name, nb in notebooks.items():
+        nbformat.write(nb, tmp_path / f"{name}.ipynb")
+    paths = [tmp_path / f"{name}.ipynb" for name in notebooks]
+
+    results = {result.path.stem: result for result in
+               execute_notebooks(paths, tmp_path / "cache", max_workers=2, timeout=5)}
+    assert {name: result.status for name, result in results.items()} == {
+        "ok": "executed", "error": "failed", "slow": "failed", "done": "skipped"}
+    assert "ZeroDivisionError" in results["error"].error
+    assert "timed out" in results["slow"].error
+
+    cache = ExecutionCache(tmp_path / "cache")
+    nb = notebooks["ok"]
+    assert cache.load(cache.key(nb, tmp_path / "ok.ipynb"), nb) is not None
+    assert nb.cells[2].outputs[0].text == "1\n"
+
+    results = list(execute_notebooks(paths[:1], tmp_path / "cache"))
+    assert results[0].status == "cached"
+
+@pytest.mark.skipif(shutil.which("jupyter") is None, reason="needs a Jupyter kernel")
+@pytest.mark.skipif(os.name != "posix", reason="memory limits need the resource module")
+def test_execute_notebooks_memory_limit(tmp_path):
+    nb = notebook("import resource", "print(resource.getrlimit(resource.RLIMIT_AS)[0])")
+    path = tmp_path / "limit.ipynb"
+    nbformat.write(nb, path)
+
+    limit = 4 * 1024 ** 3
+    results = list(execute_notebooks([path], tmp_path / "cache", memory_limit=limit))
+    assert results[0].status == "executed"
+
+    cache = ExecutionCache(tmp_path / "cache")
+    assert cache.load(cache.key(nb, path), nb) is not None
+    assert nb.cells[2].outputs[0].text == f"{limit}\n"
+
+@pytest.mark.skipif(shutil.which("jupyter") is None, reason="needs a Jupyter kernel")
+def test_build_reuses_execution(tmp_path):
+    from teachbooks.build import build_book
+
+    book = tmp_path / "book"
+    shutil.copytree(WORK_DIR, book, ignore=shutil.ignore_patterns("_build", ".teachbooks"))
+    nbformat.write(notebook("print('executed')"), book / "notebook.ipynb")
+    with open(book / "_toc.yml", "a", encoding="utf8") as f:
+        f.write("\n  - file: notebook\n")
+
+    messages = []
+    build_book(book, echo=messages.append)
+    assert "notebook execution cache: 0 restored, 1 executed" in messages
+
+    messages.clear()
+    build_book(book, release=True, echo=messages.append)
+    assert "notebook execution cache: 1 restored, 0 executed" in messages
+
+    messages.clear()
+    build_book(book, execution_cache=False, echo=messages.append)
+    assert not any(message.startswith("notebook execution cache") for message in messages)
+
+@pytest.mark.skipif(shutil.which("jupyter") is None, reason="needs a Jupyter kernel")
+def test_build_pre_execute(tmp_path):
+    from teachbooks.build import build_book
+
+    book = tmp_path / "book"
+    shutil.copytree(WORK_DIR, book, ignore=shutil.ignore_patterns("_build", ".teachbooks"))
+    nbformat.write(notebook("print('executed')"), book / "notebook.ipynb")
+    with open(book / "_toc.yml", "a", encoding="utf8") as f:
+        f.write("\n  - file: notebook\n")
+
+    messages = []
+    build_book(book, notebook_jobs=2, echo=messages.append)
+    assert "pre-executing 1 notebook(s) with 2 kernel(s)" in messages
+    assert "notebook execution cache: 1 restored, 0 executed" in messages
+    assert "executed" in (book / "_build" / "html" / "notebook.html").read_text()
@@ -0,0 +1,295 @@
+import json
+import os
+import socket
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from teachbooks.httpd import ChangeTracker, MountTable, make_server, listen_fd, LIVERELOAD_PATH
+
+
+@pytest.fixture
+def html(tmp_path: Path) -> Path:
+    tmp_path.joinpath("_static").mkdir()
+    tmp_path.joinpath("index.html").write_text("<html><body><p>Index</p></body></html>", encoding="utf8")
+    tmp_path.joinpath("chapter1.html").write_text("<html><body><p>One</p></body></html>", encoding="utf8")
+    tmp_path.joinpath("_static", "style.css").write_text("p {}", encoding="utf8")
+    return tmp_path
+
+@pytest.fixture
+def httpd(html: Path):
+    httpd = make_server(0, html, livereload=True, bind="127.0.0.1")
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def _url(httpd, path: str) -> str:
+    return f"http://127.0.0.1:{httpd.server_address[1]}{path}"
+
+def test_tracker_reports_changed_bytes_only(html: Path):
+    tracker = ChangeTracker(html)
+    assert tracker.check() == []
+    q = tracker.subscribe()
+
+    # Rewritten with identical content, as Sphinx does for static assets
+    html.joinpath("_static", "style.css").write_text("p {}", encoding="utf8")
+    os.utime(html / "_static" / "style.css", ns=(10**9, 10**9))
+    html.joinpath("chapter1.html").write_text("<html><body><p>Uno</p></body></html>", encoding="utf8")
+    assert tracker.check() == ["chapter1.html"]
+    assert q.get_nowait() == ["chapter1.html"]
+
+    tracker.unsubscribe(q)
+    html.joinpath("chapter1.html").unlink()
+    assert tracker.check() == ["chapter1.html"]
+
+def test_livereload_script_injected(httpd):
+    with urllib.request.urlopen(_url(httpd, "/")) as response:
+        body = response.read().decode("utf8")
+    assert LIVERELOAD_PATH in body
+    assert body.index(LIVERELOAD_PATH) < body.index("</body>")
+
+    with urllib.request.urlopen(_url(httpd, "/_static/style.css")) as response:
+        assert response.read() == b"p {}"
+
+def test_livereload_events(httpd, html: Path):
+    tracker = httpd.RequestHandlerClass.func.tracker
+    tracker.check()
+    with urllib.request.urlopen(_url(httpd, LIVERELOAD_PATH), timeout=5) as response:
+        assert response.headers["Content-Type"] == "text/event-stream"
+        assert response.readline() == b": connected\n"
+        response.readline()
+        html.joinpath("chapter1.html").write_text("<html><body>Changed</body></html>", encoding="utf8")
+        tracker.check()
+        assert response.readline() == b"event: reload\n"
+        assert response.readline() == b'data: {"pages": ["chapter1.html"]}\n'
+
+def test_shutdown_with_event_stream(httpd):
+    response = urllib.request.urlopen(_url(httpd, LIVERELOAD_PATH), timeout=5)
+    try:
+        assert response.readline() == b": connected\n"
+        response.readline()
+        httpd.shutdown()
+        httpd.server_close()
+        # The stream ends well before the next heartbeat
+        assert response.read() == b""
+    finally:
+        response.close()
+    assert httpd._workers and all(worker.daemon for worker in httpd._workers)
+
+def test_event_streams_limited(html: Path):
+    httpd = make_server(0, html, livereload=True, bind="127.0.0.1", max_connections=2)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with urllib.request.urlopen(_url(httpd, LIVERELOAD_PATH), timeout=5) as response:
+            assert response.readline() == b": connected\n"
+            with pytest.raises(urllib.error.HTTPError) as excinfo:
+                urllib.request.urlopen(_url(httpd, LIVERELOAD_PATH), timeout=5)
+            assert excinfo.value.code == 503
+            # Pages are still served
+            with urllib.request.urlopen(_url(httpd, "/_static/style.css"), timeout=5) as page:
+                assert page.read() == b"p {}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+def test_keep_alive(httpd):
+    import http.client
+
+    conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=5)
+    try:
+        conn.request("GET", "/_static/style.css")
+        response = conn.getresponse()
+        assert response.version == 11
+        assert response.read() == b"p {}"
+        sock = conn.sock
+
+        conn.request("GET", "/chapter1.html")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert b"One" in response.read()
+        # Second request reused the connection
+        assert conn.sock is sock
+    finally:
+        conn.close()
+
+def test_max_connections(html: Path):
+    httpd = make_server(0, html, bind="127.0.0.1", max_connections=3)
+    try:
+        assert httpd.max_connections == 3
+        assert httpd.max_event_streams == 1
+    finally:
+        httpd.server_close()
+
+@pytest.mark.skipif(not socket.has_dualstack_ipv6(), reason="needs dual-stack IPv6")
+def test_dualstack(html: Path):
+    httpd = make_server(0, html)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        port = httpd.server_address[1]
+        for host in "[::1]", "127.0.0.1":
+            with urllib.request.urlopen(f"http://{host}:{port}/_static/style.css", timeout=5) as response:
+                assert response.read() == b"p {}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+def test_precompressed(html: Path):
+    import gzip
+    from teachbooks.compress import precompress
+
+    html.joinpath("_static", "search.js").write_text("var index = 1;\n" * 100, encoding="utf8")
+    precompress(html, encodings=["gzip"])
+    httpd = make_server(0, html, bind="127.0.0.1")
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        request = urllib.request.Request(_url(httpd, "/_static/search.js"),
+                                         headers={"Accept-Encoding": "gzip"})
+        with urllib.request.urlopen(request) as response:
+            assert response.headers["Content-Encoding"] == "gzip"
+            assert response.headers["Content-Type"] == "text/javascript"
+            assert response.headers["Vary"] == "Accept-Encoding"
+            assert gzip.decompress(response.read()) == b"var index = 1;\n" * 100
+
+        with urllib.request.urlopen(_url(httpd, "/_static/search.js")) as response:
+            assert response.headers["Content-Encoding"] is None
+            assert response.read() == b"var index = 1;\n" * 100
+
+        # A rebuilt file is sent as is until it is compressed again
+        html.joinpath("_static", "search.js").write_text("var index = 2;\n" * 100, encoding="utf8")
+        os.utime(html / "_static" / "search.js", ns=(1, 1))
+        with urllib.request.urlopen(request) as response:
+            assert response.headers["Content-Encoding"] is None
+            assert response.read() == b"var index = 2;\n" * 100
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+def test_conditional_get(httpd, html: Path):
+    import http.client
+
+    conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=5)
+    try:
+        conn.request("GET", "/chapter1.html")
+        response = conn.getresponse()
+        response.read()
+        etag = response.headers["ETag"]
+        last_modified = response.headers["Last-Modified"]
+        assert etag.startswith('"')
+        assert response.headers["Cache-Control"] == "no-cache"
+
+        conn.request("GET", "/chapter1.html", headers={"If-None-Match": etag})
+        response = conn.getresponse()
+        assert response.status == 304
+        assert response.read() == b""
+
+        conn.request("GET", "/chapter1.html", headers={"If-Modified-Since": last_modified})
+        response = conn.getresponse()
+        assert response.status == 304
+        response.read()
+
+        html.joinpath("chapter1.html").write_text("<html><body>Changed</body></html>", encoding="utf8")
+        os.utime(html / "chapter1.html", ns=(4 * 10**18, 4 * 10**18))
+        conn.request("GET", "/chapter1.html", headers={"If-None-Match": etag})
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.headers["ETag"] != etag
+        assert b"Changed" in response.read()
+    finally:
+        conn.close()
+
+def test_cache_control_hashed_assets(httpd):
+    with urllib.request.urlopen(_url(httpd, "/_static/style.css?v=1a2b3c")) as response:
+        assert "immutable" in response.headers["Cache-Control"]
+    with urllib.request.urlopen(_url(httpd, "/_static/style.css")) as response:
+        assert response.headers["Cache-Control"] == "no-cache"
+
+def test_inherited_socket(html: Path):
+    sock = socket.create_server(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    httpd = make_server(0, html, fd=sock.detach())
+    assert httpd.server_address[1] == port
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        with urllib.request.urlopen(_url(httpd, "/chapter1.html")) as response:
+            assert b"One" in response.read()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+def test_listen_fd(monkeypatch):
+    monkeypatch.delenv("LISTEN_PID", raising=False)
+    assert listen_fd() is None
+    assert listen_fd(7) == 7
+    monkeypatch.setenv("LISTEN_FDS", "1")
+    monkeypatch.setenv("LISTEN_PID", str(os.getpid() + 1))
+    assert listen_fd() is None
+    monkeypatch.setenv("LISTEN_PID", str(os.getpid()))
+    assert listen_fd() == 3
+
+def test_tracker_retarget(html: Path, tmp_path_factory):
+    other = tmp_path_factory.mktemp("other")
+    other.joinpath("index.html").write_text("<p>Other</p>", encoding="utf8")
+    tracker = ChangeTracker(html)
+    assert tracker.check() == []
+    q = tracker.subscribe()
+
+    tracker.retarget(other)
+    assert q.get_nowait() == ["index.html"]
+    assert tracker.check() == []
+    other.joinpath("index.html").write_text("<p>Changed</p>", encoding="utf8")
+    assert tracker.check() == ["index.html"]
+
+def test_mount_table(tmp_path: Path):
+    mounts = MountTable(tmp_path / "mounts.json")
+    assert mounts.resolve("/a/index.html") is None
+
+    tmp_path.joinpath("mounts.json").write_text(json.dumps({"a": "/srv/a", "a/b": "/srv/ab"}))
+    assert mounts.resolve("/a/index.html") == ("/srv/a", "/index.html")
+    assert mounts.resolve("/a/b/?x=1") == ("/srv/ab", "/?x=1")
+    assert mounts.resolve("/a") == ("/srv/a", "")
+    assert mounts.resolve("/ab/index.html") is None
+    assert mounts.root is None
+
+    # The empty prefix replaces the root directory
+    tmp_path.joinpath("mounts.json").write_text(json.dumps({"": "/srv/root", "a": "/srv/a"}))
+    assert mounts.resolve("/a/index.html") == ("/srv/a", "/index.html")
+    assert mounts.resolve("/ab/index.html") == ("/srv/root", "/ab/index.html")
+    assert mounts.root == "/srv/root"
+
+def test_mounted_books(html: Path, tmp_path_factory):
+    other = tmp_path_factory.mktemp("other")
+    other.joinpath("index.html").write_text("<p>Other</p>", encoding="utf8")
+    mountfile = tmp_path_factory.mktemp("work") / "mounts.json"
+    httpd = make_server(0, html, bind="127.0.0.1", mounts=mountfile)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(_url(httpd, "/other/"))
+
+        # Mounted while the server runs
+        mountfile.write_text(json.dumps({"other": str(other)}))
+        with urllib.request.urlopen(_url(httpd, "/other")) as response:
+            assert response.url.endswith("/other/")
+            assert response.read() == b"<p>Other</p>"
+        with urllib.request.urlopen(_url(httpd, "/chapter1.html")) as response:
+            assert b"One" in response.read()
+
+        mountfile.write_text(json.dumps({}))
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(_url(httpd, "/other/"))
+
+        # The root is swapped while the server runs
+        mountfile.write_text(json.dumps({"": str(other)}))
+        with urllib.request.urlopen(_url(httpd, "/")) as response:
+            assert response.read() == b"<p>Other</p>"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
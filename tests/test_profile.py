@@ -0,0 +1,50 @@
+import json
+import pstats
+
+import pytest
+
+from teachbooks.profile import BuildProfile, capture_calls, report_path
+
+
+def test_phases():
+    profile = BuildProfile()
+    with profile.phase("a"):
+        pass
+    with profile.phase("b"):
+        pass
+    with pytest.raises(RuntimeError):
+        with profile.phase("a"):
+            raise RuntimeError
+    assert list(profile.phases) == ["a", "b"]
+    assert all(seconds >= 0 for seconds in profile.phases.values())
+
+def test_documents(tmp_path):
+    profile = BuildProfile()
+    read = profile._timed(lambda docname: docname.upper(), "read")
+    assert read("intro") == "INTRO"
+    profile.documents["slow"] = {"read": 2.0, "write": 1.0}
+    profile.documents["fast"] = {"read": 0.1, "write": 0.1}
+    assert [name for name, _, _ in profile.slowest_documents(top=2)] == ["slow", "fast"]
+    assert "intro" in profile.documents
+
+    report = json.loads(profile.save(tmp_path / "profile").read_text())
+    assert report["documents"]["slow"] == {"read": 2.0, "write": 1.0}
+
+def test_report_path(tmp_path):
+    paths = {report_path(tmp_path) for _ in range(5)}
+    assert len(paths) == 5
+    assert all(path.exists() and path.name.startswith("profile-") for path in paths)
+
+    profile = BuildProfile()
+    path = report_path(tmp_path)
+    assert profile.save(tmp_path, path) == path
+    assert json.loads(path.read_text())["phases"] == {}
+
+def test_capture_calls(tmp_path):
+    with capture_calls("cprofile", tmp_path / "calls"):
+        sum(range(1000))
+    assert pstats.Stats(str(tmp_path / "calls.prof")).total_calls > 0
+
+    with pytest.raises(ValueError):
+        with capture_calls("perf", tmp_path / "calls"):
+            pass
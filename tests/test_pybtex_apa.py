@@ -0,0 +1,151 @@
+import pytest
+from pybtex.database import Person, parse_string
+from pybtex.plugin import find_plugin
+from pybtex.style.formatting import BaseStyle
+
+from teachbooks.plugins.pybtex.formatting import apa
+
+BIB = r"""
+@article{smith2020,
+  author = {Smith, John and van der Berg, Anna},
+  title = {A title},
+  journal = {Journal},
+  volume = {3},
+  pages = {1--5},
+  year = {2020},
+}
+@inbook{doe2019,
+  author = {Doe, Jane},
+  editor = {Roe, R. and van der Berg, Anna},
+  title = {Chapter},
+  booktitle = {Book},
+  publisher = {Press},
+  year = {2019},
+}
+"""
+
+
+def render(bib_data):
+    backend = find_plugin("pybtex.backends", "text")()
+    return [entry.text.render(backend)
+            for entry in apa.APAStyle().format_bibliography(bib_data)]
+
+
+@pytest.fixture(autouse=True)
+def no_reference_cache(monkeypatch):
+    monkeypatch.setattr(apa, "reference_cache", apa.ReferenceCache(maxsize=0))
+
+@pytest.fixture
+def name_cache(monkeypatch):
+    cache = apa.NameCache()
+    monkeypatch.setattr(apa, "name_cache", cache)
+    return cache
+
+
+def test_name_cache(name_cache):
+    bib_data = parse_string(BIB, "bibtex")
+    uncached = apa.NameCache(maxsize=0)
+
+    assert render(bib_data) == [
+        "Doe, J. (2019). Chapter. In Roe, R., & van der Berg, A. (Eds.), Book. Press.",
+        "Smith, J., & van der Berg, A. (2020). A title. Journal, 3, 1–5.",
+    ]
+    # van der Berg is formatted once, as author and as editor
+    assert (name_cache.hits, name_cache.misses) == (1, 4)
+    cached = render(bib_data)
+    assert (name_cache.hits, name_cache.misses) == (6, 4)
+
+    apa.name_cache = uncached
+    assert render(bib_data) == cached
+    assert uncached.hits == 0
+
+def test_name_cache_evicts_least_recently_used():
+    cache = apa.NameCache(maxsize=2)
+    style = find_plugin("pybtex.style.names", "lastfirst")()
+    a, b, c = Person("Smith, John"), Person("Doe, Jane"), Person("Roe, Rick")
+
+    cache.format(style, a)
+    cache.format(style, b)
+    cache.format(style, a)
+    cache.format(style, c)
+    assert str(cache.format(style, a)) == "Smith, John"
+    assert cache.misses == 3
+    cache.format(style, b)
+    assert cache.misses == 4
+    # The abbreviation flag is part of the key
+    assert str(cache.format(style, c, True)) == "Roe, R."
+
+def test_templates_reused():
+    bib_data = parse_string(BIB + r"""
+@article{roe2021,
+  author = {Roe, Rick},
+  title = {Another title},
+  journal = {Journal},
+  year = {2021},
+}
+@book{edited2018,
+  editor = {Roe, Rick},
+  title = {Edited},
+  publisher = {Press},
+  year = {2018},
+}
+""", "bibtex")
+    style = apa.APAStyle()
+    backend = find_plugin("pybtex.backends", "text")()
+    for entry in bib_data.entries.values():
+        reused = style.format_entry("label", entry)
+        built = BaseStyle.format_entry(style, "label", entry)
+        assert reused.text.render(backend) == built.text.render(backend)
+    assert set(style._templates) == {
+        ("article", True, False, False),
+        ("inbook", True, True, True),
+        ("book", False, True, False),
+    }
+
+def test_reference_cache(tmp_path, monkeypatch):
+    bib_data = parse_string(BIB + r"""
+@misc{poe2018,
+  crossref = {doe2019},
+  author = {Poe, Pete},
+  title = {Cross-referenced},
+}
+""", "bibtex")
+    cache = apa.ReferenceCache()
+    monkeypatch.setattr(apa, "reference_cache", cache)
+    expected = render(bib_data)
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert render(bib_data) == expected
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    cache.save(tmp_path / "references.pickle")
+    loaded = apa.ReferenceCache()
+    loaded.load(tmp_path / "references.pickle")
+    monkeypatch.setattr(apa, "reference_cache", loaded)
+    bib_data.entries["smith2020"].fields["title"] = "Changed"
+    assert render(bib_data) == expected[:2] + [expected[2].replace("A title", "Changed")]
+    assert (loaded.hits, loaded.misses) == (1, 1)
+    assert loaded.changed
+
+    style = apa.APAStyle()
+    key = loaded.key(style, bib_data.entries["doe2019"])
+    assert loaded.key(apa.APAStyle(label_style="number"), bib_data.entries["doe2019"]) != key
+    style.abbreviate_names = False
+    assert loaded.key(style, bib_data.entries["doe2019"]) != key
+
+def test_labels():
+    from teachbooks.plugins.pybtex.labels.apa import APALabelStyle
+
+    bib_data = parse_string(r"""
+@article{a, author = {Müller, Jan}, title = {A}, year = {2020}}
+@article{b, author = {Müller, Jan}, title = {B}, year = {2020}}
+@article{c, author = {Müller, Jan}, title = {C}, year = {2021}}
+@article{d, author = {Müller, Jan and Smith, John}, title = {D}, year = {2020}}
+@article{e, author = {Müller, Jan}, title = {E}, year = {2020}}
+@misc{f, organization = {The Organization}, title = {F}}
+@misc{g, organization = {The Organization}, title = {G}}
+""", "bibtex")
+    labels = list(APALabelStyle().format_labels(bib_data.entries.values()))
+    assert labels == [
+        "Muller, 2020a", "Muller, 2020b", "Muller, 2021", "Muller & Smith, 2020",
+        "Muller, 2020c", "Organization, n.d.-a", "Organization, n.d.-b",
+    ]
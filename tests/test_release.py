@@ -0,0 +1,146 @@
+import os
+import re
+from io import StringIO
+from pathlib import Path
+
+import pytest
+
+from teachbooks.release import (
+    make_release, clean_yaml, remove_release_sections, ReleaseMarkerError,
+    sync_tree, SyncResult
+)
+
+TOC = """format: jb-book
+root: index
+chapters:
+  - file: chapter1
+  # START REMOVE-FROM-RELEASE
+  - file: chapter2
+  # END REMOVE-FROM-RELEASE
+"""
+
+@pytest.fixture
+def book(tmp_path: Path) -> Path:
+    tmp_path.joinpath("_config.yml").write_text("title: Test book\n", encoding="utf8")
+    tmp_path.joinpath("_toc.yml").write_text(TOC, encoding="utf8")
+    return tmp_path
+
+def test_make_release(book: Path):
+    path_conf, path_toc = make_release(book)
+    assert path_conf.read_text(encoding="utf8") == "title: Test book\n"
+    assert "chapter2" not in path_toc.read_text(encoding="utf8")
+    assert book.joinpath(".teachbooks", "release", "manifest.json").exists()
+
+def test_make_release_unchanged(book: Path):
+    path_conf, path_toc = make_release(book)
+    os.utime(path_conf, ns=(0, 0))
+    os.utime(path_toc, ns=(0, 0))
+
+    make_release(book)
+    assert path_conf.stat().st_mtime_ns == 0
+    assert path_toc.stat().st_mtime_ns == 0
+
+def test_make_release_changed(book: Path):
+    path_conf, path_toc = make_release(book)
+    os.utime(path_conf, ns=(0, 0))
+    os.utime(path_toc, ns=(0, 0))
+
+    book.joinpath("_toc.yml").write_text(TOC + "  - file: chapter3\n", encoding="utf8")
+    make_release(book)
+    assert path_conf.stat().st_mtime_ns == 0
+    assert path_toc.stat().st_mtime_ns != 0
+    assert "chapter3" in path_toc.read_text(encoding="utf8")
+
+
+def _regex_clean(yaml_source: str) -> str:
+    """Reference implementation used before the streaming scanner"""
+    return re.sub(
+        r"# START REMOVE-FROM-(PUBLISH|RELEASE)(.|\n)*?# END REMOVE-FROM-(PUBLISH|RELEASE)",
+        "",
+        yaml_source
+    )
+
+def _stream_clean(yaml_source: str) -> str:
+    return "".join(remove_release_sections(StringIO(yaml_source)))
+
+@pytest.mark.parametrize(
+    "yaml_source", [
+        TOC,
+        "",
+        "root: index\n",
+        "a: 1\n# START REMOVE-FROM-PUBLISH\nb: 2\n# END REMOVE-FROM-PUBLISH\nc: 3\n",
+        "a: 1  # START REMOVE-FROM-RELEASE b # END REMOVE-FROM-RELEASE c\n",
+        "# START REMOVE-FROM-PUBLISH\nb: 2\n# END REMOVE-FROM-RELEASE",
+        "x # START REMOVE-FROM-RELEASE\n# END REMOVE-FROM-RELEASE y # START REMOVE-FROM-PUBLISH\nz\n# END REMOVE-FROM-PUBLISH\n",
+    ]
+)
+def test_remove_release_sections(yaml_source: str):
+    assert _stream_clean(yaml_source) == _regex_clean(yaml_source)
+
+@pytest.mark.parametrize(
+    "yaml_source", [
+        "a: 1\n# END REMOVE-FROM-RELEASE\n",
+        "# START REMOVE-FROM-RELEASE\na: 1\n",
+        "# START REMOVE-FROM-RELEASE\n# START REMOVE-FROM-PUBLISH\n# END REMOVE-FROM-PUBLISH\n# END REMOVE-FROM-RELEASE\n",
+    ]
+)
+def test_remove_release_sections_invalid(yaml_source: str):
+    with pytest.raises(ReleaseMarkerError):
+        _stream_clean(yaml_source)
+
+def test_clean_yaml_invalid_keeps_output(tmp_path: Path):
+    path_source = tmp_path / "_toc.yml"
+    path_output = tmp_path / "_toc_release.yml"
+    path_output.write_text("previous\n", encoding="utf8")
+    path_source.write_text("# START REMOVE-FROM-RELEASE\n", encoding="utf8")
+    with pytest.raises(ReleaseMarkerError, match="line"):
+        clean_yaml(path_source, path_output)
+    assert path_output.read_text(encoding="utf8") == "previous\n"
+    assert not (tmp_path / "_toc_release.yml.tmp").exists()
+
+@pytest.fixture
+def ext(tmp_path: Path) -> Path:
+    source = tmp_path / "_ext"
+    source.joinpath("style", "formatting").mkdir(parents=True)
+    source.joinpath("apastyle.py").write_text("APA = True\n", encoding="utf8")
+    source.joinpath("style", "formatting", "apa.py").write_text("x = 1\n", encoding="utf8")
+    return source
+
+@pytest.mark.parametrize("hardlink", [False, True])
+def test_sync_tree(tmp_path: Path, ext: Path, hardlink: bool):
+    destination = tmp_path / "release" / "_ext"
+    result = sync_tree(ext, destination, hardlink=hardlink)
+    assert result == SyncResult(copied=2, skipped=0, removed=0)
+    assert destination.joinpath("style", "formatting", "apa.py").read_text(encoding="utf8") == "x = 1\n"
+
+    result = sync_tree(ext, destination, hardlink=hardlink)
+    assert result == SyncResult(copied=0, skipped=2, removed=0)
+
+def test_sync_tree_changed(tmp_path: Path, ext: Path):
+    destination = tmp_path / "_ext_copy"
+    sync_tree(ext, destination)
+    path_copy = destination / "apastyle.py"
+
+    # Same size, new mtime, same contents: not copied, mtime adopted
+    os.utime(ext / "apastyle.py", ns=(10**9, 10**9))
+    assert sync_tree(ext, destination).copied == 0
+    assert path_copy.stat().st_mtime_ns == 10**9
+
+    # Same size, different contents
+    ext.joinpath("apastyle.py").write_text("APA = 1!!\n", encoding="utf8")
+    assert sync_tree(ext, destination).copied == 1
+    assert path_copy.read_text(encoding="utf8") == "APA = 1!!\n"
+
+def test_sync_tree_removed(tmp_path: Path, ext: Path):
+    destination = tmp_path / "_ext_copy"
+    sync_tree(ext, destination)
+    destination.joinpath("__pycache__").mkdir()
+    destination.joinpath("__pycache__", "apastyle.pyc").write_bytes(b"")
+
+    ext.joinpath("style", "formatting", "apa.py").unlink()
+    ext.joinpath("style", "formatting").rmdir()
+    result = sync_tree(ext, destination)
+    assert result.removed == 1
+    assert not destination.joinpath("style", "formatting").exists()
+    assert destination.joinpath("style").is_dir()
+    assert destination.joinpath("__pycache__", "apastyle.pyc").exists()
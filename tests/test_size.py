@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import pytest
+
+from teachbooks.size import scan_size, format_size
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    tmp_path.joinpath("html", "_static").mkdir(parents=True)
+    tmp_path.joinpath(".doctrees").mkdir()
+    tmp_path.joinpath("html", "index.html").write_bytes(b"x" * 100)
+    tmp_path.joinpath("html", "_static", "searchindex.js").write_bytes(b"x" * 1000)
+    tmp_path.joinpath(".doctrees", "environment.pickle").write_bytes(b"x" * 500)
+    tmp_path.joinpath("build.log").write_bytes(b"x" * 10)
+    return tmp_path
+
+def test_scan_size(tree: Path):
+    report = scan_size(tree, top=2)
+    assert report.total == 1610
+    assert report.directories == {"html": 1100, ".doctrees": 500, ".": 10}
+    assert report.largest == [(1000, "html/_static/searchindex.js"),
+                              (500, ".doctrees/environment.pickle")]
+
+def test_scan_size_nested(tmp_path: Path):
+    for i in range(20):
+        directory = tmp_path.joinpath("html", f"part{i}", "deep")
+        directory.mkdir(parents=True)
+        directory.joinpath("page.html").write_bytes(b"x" * (i + 1))
+    report = scan_size(tmp_path, top=1, max_workers=4)
+    assert report.total == sum(range(1, 21))
+    assert report.directories == {"html": report.total}
+    assert report.largest == [(20, "html/part19/deep/page.html")]
+
+def test_scan_size_known_sizes(tree: Path):
+    report = scan_size(tree, known_sizes={"html/index.html": 5})
+    assert report.total == 1515
+    assert report.directories["html"] == 1005
+
+def test_scan_size_missing(tmp_path: Path):
+    report = scan_size(tmp_path / "_build")
+    assert report.total == 0
+    assert report.largest == []
+
+def test_format_size():
+    assert format_size(3 * 1024 * 1024) == "3.00MB"
@@ -0,0 +1,46 @@
+import json
+import threading
+
+import pytest
+
+from teachbooks.state import StateRegistry
+
+
+def test_put_get_remove(tmp_path):
+    registry = StateRegistry(tmp_path)
+    assert registry.read() == {}
+    assert registry.get("default") is None
+
+    registry.put("default", {"port": 8000})
+    registry.put("other", {"port": 8001})
+    assert registry.get("default") == {"port": 8000}
+    assert json.loads(registry.path.read_text()) == {
+        "version": 1,
+        "servers": {"default": {"port": 8000}, "other": {"port": 8001}},
+    }
+
+    registry.remove("default")
+    registry.remove("default")
+    assert registry.read() == {"other": {"port": 8001}}
+    # No temporary files are left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["servers.json", "servers.lock"]
+
+def test_concurrent_updates(tmp_path):
+    registry = StateRegistry(tmp_path)
+
+    def add(i):
+        for j in range(20):
+            with registry.update() as servers:
+                servers[f"{i}-{j}"] = {"port": j}
+
+    threads = [threading.Thread(target=add, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(registry.read()) == 80
+
+def test_unsupported_version(tmp_path):
+    (tmp_path / "servers.json").write_text(json.dumps({"version": 99, "servers": {}}))
+    with pytest.raises(ValueError):
+        StateRegistry(tmp_path).read()
@@ -0,0 +1,46 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from teachbooks.watch import snapshot, changed_paths, watch_book
+
+
+@pytest.fixture
+def book(tmp_path: Path) -> Path:
+    tmp_path.joinpath("_toc.yml").write_text("root: index\n", encoding="utf8")
+    tmp_path.joinpath("index.md").write_text("# Index\n", encoding="utf8")
+    tmp_path.joinpath("_build", "html").mkdir(parents=True)
+    tmp_path.joinpath("_build", "html", "index.html").write_text("", encoding="utf8")
+    tmp_path.joinpath(".teachbooks", "release").mkdir(parents=True)
+    tmp_path.joinpath(".teachbooks", "release", "_toc.yml").write_text("", encoding="utf8")
+    tmp_path.joinpath("chapter").mkdir()
+    tmp_path.joinpath("chapter", "page.ipynb").write_text("{}", encoding="utf8")
+    return tmp_path
+
+def test_snapshot(book: Path):
+    assert set(snapshot(book)) == {"_toc.yml", "index.md", "chapter/page.ipynb"}
+
+def test_changed_paths(book: Path):
+    old = snapshot(book)
+    book.joinpath("index.md").write_text("# Changed index\n", encoding="utf8")
+    book.joinpath("chapter", "page.ipynb").unlink()
+    book.joinpath("new.md").write_text("# New\n", encoding="utf8")
+    assert changed_paths(old, snapshot(book)) == {"index.md", "chapter/page.ipynb", "new.md"}
+
+def test_watch_book(book: Path):
+    calls = []
+
+    def edit():
+        for i in range(3):
+            time.sleep(0.05)
+            book.joinpath(f"page{i}.md").write_text("# Page\n", encoding="utf8")
+
+    thread = threading.Thread(target=edit)
+    thread.start()
+    watch_book(book, calls.append, interval=0.02, debounce=0.2,
+               should_stop=lambda: bool(calls))
+    thread.join()
+    # The burst of edits results in a single rebuild
+    assert calls == [{"page0.md", "page1.md", "page2.md"}]